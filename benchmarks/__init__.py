@@ -0,0 +1 @@
+# Benchmark harness: local stand-ins for the backend and Notion, and a load runner for the SSE app
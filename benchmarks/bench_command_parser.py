@@ -0,0 +1,130 @@
+"""
+Micro-benchmark: CommandProcessor's compiled parser against the previous per-call regex version
+
+Usage: python -m benchmarks.bench_command_parser [--commands 5000] [--repeat 5] [--output result.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from tools.CommandProcessor import CommandProcessor
+from tools.utils.command_parser import CREATE_CONTENT_POST
+
+
+def legacy_result(command: str) -> Dict[str, Any]:
+    """The regex implementation CommandProcessor used before the compiled parser (kept for comparison)."""
+    if not command.strip().startswith("/create-content-post"):
+        return {"error": "Invalid command. Only /create-content-post is supported", "status": "error"}
+    params_str = command.replace("/create-content-post", "").strip()
+    params = {}
+    pattern = r'(\w+):(?:"([^"]+)"|(\S+))'
+    for key, quoted_value, unquoted_value in re.findall(pattern, params_str):
+        value = quoted_value if quoted_value else unquoted_value
+        if value.lower() in ["true", "false"]:
+            value = value.lower() == "true"
+        params[key] = value
+    if "topic" not in params:
+        return {"error": "Missing required parameter: topic", "status": "error"}
+    params.setdefault("platform", "Twitter")
+    params.setdefault("tone", "professional")
+    params.setdefault("include_hashtags", True)
+    valid_platforms = ["Twitter", "LinkedIn", "Instagram"]
+    if params["platform"] not in valid_platforms:
+        return {"error": f"Invalid platform. Must be one of: {', '.join(valid_platforms)}", "status": "error"}
+    valid_tones = ["professional", "casual", "humorous", "educational"]
+    if params["tone"] not in valid_tones:
+        return {"error": f"Invalid tone. Must be one of: {', '.join(valid_tones)}", "status": "error"}
+    return {"status": "success", "command": "/create-content-post", "parameters": params,
+            "execution_mode": "instant"}
+
+
+def make_commands(count: int, seed: int) -> List[str]:
+    """Typical bulk-import commands (both implementations agree on these)."""
+    rng = random.Random(seed)
+    platforms = ["Twitter", "LinkedIn", "Instagram"]
+    tones = ["professional", "casual", "humorous", "educational"]
+    commands = []
+    for i in range(count):
+        parts = [f'topic:"Scheduled topic {i} about {rng.choice(["AI", "climate", "fintech", "health"])}"']
+        if rng.random() < 0.8:
+            parts.append(f"platform:{rng.choice(platforms)}")
+        if rng.random() < 0.6:
+            parts.append(f"tone:{rng.choice(tones)}")
+        if rng.random() < 0.3:
+            parts.append(f"include_hashtags:{rng.choice(['true', 'false'])}")
+        if rng.random() < 0.3:
+            parts.append('additional_context:"Mention the product launch next week"')
+        rng.shuffle(parts)
+        commands.append("/create-content-post " + " ".join(parts))
+    return commands
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the compiled command parser with the old regex parser")
+    parser.add_argument("--commands", type=int, default=5000, help="Commands per run (default: 5000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per implementation; the best is kept")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", "-o", help="Write the JSON result here (default: stdout)")
+    config = parser.parse_args()
+
+    commands = make_commands(config.commands, config.seed)
+    mismatches = sum(1 for command in commands if legacy_result(command) != CREATE_CONTENT_POST.result(command))
+
+    # name -> (seconds, the row it is compared against)
+    timings = {
+        # Parser only
+        "legacy_regex": (best_of(config.repeat, lambda: [legacy_result(command) for command in commands]),
+                         "legacy_regex"),
+        "compiled_single": (best_of(config.repeat, lambda: [CREATE_CONTENT_POST.result(command)
+                                                            for command in commands]), "legacy_regex"),
+        "compiled_batch": (best_of(config.repeat, lambda: CREATE_CONTENT_POST.parse_many(commands)),
+                           "legacy_regex"),
+        # Through the tool: one run (and JSON response) per command, or one run for the whole batch
+        "tool_per_command": (best_of(config.repeat, lambda: [CommandProcessor(raw_command=command).run()
+                                                             for command in commands]), "tool_per_command"),
+        "tool_batch": (best_of(config.repeat, lambda: CommandProcessor(raw_commands=commands).run()),
+                       "tool_per_command"),
+    }
+    report = {
+        "commands": config.commands,
+        "repeat": config.repeat,
+        "python": platform.python_version(),
+        "mismatches": mismatches,
+        "results": {
+            name: {
+                "total_ms": round(seconds * 1000, 3),
+                "per_command_us": round(seconds / config.commands * 1e6, 3),
+                "commands_per_s": round(config.commands / seconds),
+                "compared_to": baseline,
+                "speedup": round(timings[baseline][0] / seconds, 2),
+            }
+            for name, (seconds, baseline) in timings.items()
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if config.output:
+        with open(config.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Micro-benchmark: the fast JSON layer against stdlib json on large research payloads
+
+Usage: python -m benchmarks.bench_json [--sources 500] [--calls 50] [--repeat 5] [--output result.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+import httpx
+
+from tools.ResearchAgentProxy import RESEARCH_DEFAULTS
+from tools.utils import fast_json
+
+
+def make_research(sources: int, seed: int) -> Dict[str, Any]:
+    """A research backend response with `sources` sources, insights for every platform and fields the proxy drops."""
+    rng = random.Random(seed)
+    words = ["market", "growth", "AI", "adoption", "creator", "audience", "engagement", "report", "2026", "trend"]
+
+    def sentence(length: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(length))
+
+    return {
+        "summary": sentence(120),
+        "key_findings": [sentence(25) for _ in range(20)],
+        "sources": [
+            {"title": sentence(8), "url": f"https://example.com/articles/{i}", "snippet": sentence(60),
+             "published": f"2026-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}", "score": rng.random()}
+            for i in range(sources)
+        ],
+        "trends": [{"name": sentence(3), "momentum": rng.random(), "mentions": rng.randint(10, 10000)}
+                   for _ in range(50)],
+        "platform_insights": {
+            name: {"best_practices": [sentence(15) for _ in range(10)], "peak_hours": list(range(24)),
+                   "hashtags": [sentence(1) for _ in range(30)]}
+            for name in ("Twitter", "LinkedIn", "Instagram")
+        },
+        # Backend diagnostics the proxy never reads
+        "raw_documents": [sentence(200) for _ in range(sources // 5)],
+        "debug": {"model": "research-v2", "tokens": rng.randint(1000, 50000), "trace": [sentence(10) for _ in range(50)]},
+    }
+
+
+def legacy_decode(response: httpx.Response) -> Dict[str, Any]:
+    """How ResearchAgentProxy read the backend response before the fast JSON layer."""
+    research_data = response.json()
+    return {
+        "summary": research_data.get("summary", ""),
+        "key_findings": research_data.get("key_findings", []),
+        "sources": research_data.get("sources", []),
+        "trends": research_data.get("trends", []),
+        "platform_insights": research_data.get("platform_insights", {})
+    }
+
+
+def fast_decode(response: httpx.Response) -> Dict[str, Any]:
+    return {**RESEARCH_DEFAULTS, **fast_json.response_fields(response, RESEARCH_DEFAULTS)}
+
+
+def cpu_per_call(repeat: int, calls: int, fn: Callable[[], Any]) -> float:
+    """Best-of-`repeat` CPU seconds per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.process_time() - started) / calls)
+    return best
+
+
+def allocated_per_call(fn: Callable[[], Any]) -> int:
+    """Peak bytes allocated by Python during one call."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the fast JSON layer with stdlib json on research payloads")
+    parser.add_argument("--sources", type=int, default=500, help="Sources in the research payload (default: 500)")
+    parser.add_argument("--calls", type=int, default=50, help="Calls per run (default: 50)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per implementation; the best is kept")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", "-o", help="Write the JSON result here (default: stdout)")
+    config = parser.parse_args()
+
+    research = make_research(config.sources, config.seed)
+    body = json.dumps(research).encode("utf-8")
+    response = httpx.Response(200, content=body, headers={"Content-Type": "application/json"})
+    kept = legacy_decode(response)
+    tool_response = {"status": "success", "cached": False, "research_data": kept}
+    mismatches = int(legacy_decode(response) != fast_decode(response)) + int(
+        json.loads(fast_json.dumps(tool_response)) != tool_response
+    )
+
+    # name -> (stdlib implementation, fast implementation)
+    scenarios = {
+        # ResearchAgentProxy reading the backend response
+        "decode_research_response": (lambda: legacy_decode(response), lambda: fast_decode(response)),
+        # A tool response carrying the full research result
+        "encode_tool_response": (lambda: json.dumps(tool_response), lambda: fast_json.dumps(tool_response)),
+        # CopywriterAgentProxy's pre-encoded research body
+        "encode_copywriter_body": (lambda: json.dumps(kept).encode("utf-8"), lambda: fast_json.dumps_bytes(kept)),
+        # Research cache write and read back
+        "cache_round_trip": (lambda: json.loads(json.dumps(kept)), lambda: fast_json.loads(fast_json.dumps(kept))),
+    }
+
+    results = {}
+    for name, (legacy, fast) in scenarios.items():
+        legacy_cpu = cpu_per_call(config.repeat, config.calls, legacy)
+        fast_cpu = cpu_per_call(config.repeat, config.calls, fast)
+        legacy_alloc = allocated_per_call(legacy)
+        fast_alloc = allocated_per_call(fast)
+        results[name] = {
+            "stdlib_cpu_us": round(legacy_cpu * 1e6, 1),
+            "fast_cpu_us": round(fast_cpu * 1e6, 1),
+            "cpu_speedup": round(legacy_cpu / fast_cpu, 2),
+            "stdlib_peak_alloc_kb": round(legacy_alloc / 1024, 1),
+            "fast_peak_alloc_kb": round(fast_alloc / 1024, 1),
+            "alloc_saved_pct": round(100 * (1 - fast_alloc / legacy_alloc), 1) if legacy_alloc else 0.0,
+        }
+
+    report = {
+        "backend": fast_json.BACKEND,
+        "sources": config.sources,
+        "response_kb": round(len(body) / 1024, 1),
+        "calls": config.calls,
+        "repeat": config.repeat,
+        "python": platform.python_version(),
+        "mismatches": mismatches,
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if config.output:
+        with open(config.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+Fake upstreams - local stand-ins for the backend agent API and the Notion pages API
+with configurable latency, error rate and 429 behaviour
+"""
+
+import asyncio
+import itertools
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Task database schema the fake Notion reports (matches what NotionTaskManager writes)
+NOTION_SCHEMA = {
+    "Name": {"id": "title", "type": "title"},
+    "Status": {"id": "st", "type": "select"},
+    "Command Used": {"id": "cmd", "type": "rich_text"},
+    "Execution Mode": {"id": "mode", "type": "select"},
+    "Parameters": {"id": "par", "type": "rich_text"},
+    "Task Description": {"id": "desc", "type": "rich_text"},
+    "Webhook URL": {"id": "hook", "type": "url"},
+    "Content": {"id": "cont", "type": "rich_text"},
+    "Research Data": {"id": "res", "type": "rich_text"},
+    "Error": {"id": "err", "type": "rich_text"},
+}
+
+
+class FaultProfile:
+    """
+    How a fake upstream misbehaves: every request waits `latency` seconds
+    (plus up to `jitter`), then fails with a 500 at `error_rate` or answers
+    429 with Retry-After at `rate_limit_rate`.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+
+    def update(self, **fields: Any) -> None:
+        for name, value in fields.items():
+            if name in ("latency", "jitter", "error_rate", "rate_limit_rate", "retry_after"):
+                setattr(self, name, float(value))
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "retry_after": self.retry_after,
+        }
+
+    async def apply(self) -> Optional[JSONResponse]:
+        """Wait out the latency; returns the injected failure response, if any."""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse({"object": "error", "status": 429, "code": "rate_limited",
+                                 "message": "Rate limited"},
+                                status_code=429, headers={"Retry-After": f"{self.retry_after:g}"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"object": "error", "status": 500, "code": "internal_server_error",
+                                 "message": "Injected failure"}, status_code=500)
+        return None
+
+
+class UpstreamStats:
+    """Requests seen and failures injected by a fake upstream."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def count(self, response: Optional[JSONResponse]) -> None:
+        self.requests += 1
+        if response is not None and response.status_code == 429:
+            self.rate_limited += 1
+        elif response is not None:
+            self.errors += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"requests": self.requests, "errors": self.errors, "rate_limited": self.rate_limited}
+
+
+def _control_routes(profile: FaultProfile, stats: UpstreamStats) -> list:
+    """/_bench/config (GET, or POST fields to change the profile) and /_bench/stats."""
+
+    async def config(request: Request) -> JSONResponse:
+        if request.method == "POST":
+            profile.update(**(await request.json()))
+        return JSONResponse(profile.as_dict())
+
+    async def stats_view(request: Request) -> JSONResponse:
+        return JSONResponse(stats.as_dict())
+
+    return [
+        Route("/_bench/config", config, methods=["GET", "POST"]),
+        Route("/_bench/stats", stats_view, methods=["GET"]),
+    ]
+
+
+def backend_app(profile: FaultProfile) -> Starlette:
+    """Fake /api/v1/agents/research and /api/v1/agents/copywriter answering plain JSON."""
+    stats = UpstreamStats()
+
+    async def research(request: Request) -> JSONResponse:
+        body = await request.json()
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        topic = body.get("topic", "")
+        return JSONResponse({
+            "summary": f"Research summary for {topic}",
+            "key_findings": [f"Finding {i} about {topic}" for i in range(5)],
+            "sources": [f"https://example.com/{i}" for i in range(body.get("max_results", 10))],
+            "trends": ["trend one", "trend two"],
+            "platform_insights": {body.get("platform", "Twitter"): {"best_practices": ["be concise"]}},
+        })
+
+    async def copywriter(request: Request) -> JSONResponse:
+        body = await request.json()
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        platform = body.get("platform", "Twitter")
+        content = f"A {body.get('tone', 'professional')} post for {platform}."
+        return JSONResponse({
+            "content": content,
+            "hashtags": ["#benchmark"] if body.get("include_hashtags", True) else [],
+            "character_count": len(content),
+            "platform": platform,
+            "tone": body.get("tone"),
+        })
+
+    return Starlette(routes=[
+        Route("/api/v1/agents/research", research, methods=["POST"]),
+        Route("/api/v1/agents/copywriter", copywriter, methods=["POST"]),
+        *_control_routes(profile, stats),
+    ])
+
+
+def _property_value(prop: Dict[str, Any]) -> Any:
+    kind = next((key for key in ("title", "rich_text", "select", "url") if key in prop), None)
+    if kind in ("title", "rich_text"):
+        return "".join(part.get("text", {}).get("content", "") for part in prop[kind] or [])
+    if kind == "select":
+        return (prop["select"] or {}).get("name")
+    return prop.get(kind) if kind else None
+
+
+def _matches(page: Dict[str, Any], condition: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Notion filters the server sends: equals, timestamp on_or_after, and, or."""
+    if not condition:
+        return True
+    if "and" in condition:
+        return all(_matches(page, part) for part in condition["and"])
+    if "or" in condition:
+        return any(_matches(page, part) for part in condition["or"])
+    if "timestamp" in condition:
+        timestamp = condition["timestamp"]
+        since = condition[timestamp]["on_or_after"]
+        return datetime.fromisoformat(page[timestamp]) >= datetime.fromisoformat(since)
+    prop = page["properties"].get(condition["property"], {})
+    expected = next(value["equals"] for key, value in condition.items() if key != "property")
+    return _property_value(prop) == expected
+
+
+def notion_app(profile: FaultProfile) -> Starlette:
+    """Fake Notion: database schema, page create/retrieve/update and paginated queries, kept in memory."""
+    stats = UpstreamStats()
+    pages: Dict[str, Dict[str, Any]] = {}
+    ids = itertools.count(1)
+
+    def now() -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+    async def retrieve_database(request: Request) -> JSONResponse:
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        return JSONResponse({"object": "database", "id": request.path_params["database_id"],
+                             "properties": NOTION_SCHEMA})
+
+    async def create_page(request: Request) -> JSONResponse:
+        body = await request.json()
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        page_id = f"{next(ids):08x}-0000-4000-8000-000000000000"
+        pages[page_id] = {
+            "object": "page", "id": page_id, "url": f"https://notion.so/{page_id}",
+            "created_time": now(), "last_edited_time": now(), "properties": body.get("properties", {}),
+        }
+        return JSONResponse(pages[page_id])
+
+    async def query(request: Request) -> JSONResponse:
+        body = await request.json()
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        matching = [page_id for page_id, record in pages.items()
+                    if not record.get("archived") and _matches(record, body.get("filter"))]
+        for sort in reversed(body.get("sorts") or []):
+            matching.sort(key=lambda page_id: pages[page_id][sort["timestamp"]],
+                          reverse=sort.get("direction") == "descending")
+        start = matching.index(body["start_cursor"]) if body.get("start_cursor") in matching else 0
+        chunk = matching[start:start + min(int(body.get("page_size", 100)), 100)]
+        wanted = {NOTION_SCHEMA[name]["id"]: name for name in NOTION_SCHEMA}
+        only = [wanted[prop_id] for prop_id in request.query_params.getlist("filter_properties") if prop_id in wanted]
+        results = []
+        for page_id in chunk:
+            record = dict(pages[page_id])
+            if only:
+                record["properties"] = {name: value for name, value in record["properties"].items() if name in only}
+            results.append(record)
+        next_index = start + len(chunk)
+        return JSONResponse({
+            "object": "list", "results": results, "has_more": next_index < len(matching),
+            "next_cursor": matching[next_index] if next_index < len(matching) else None,
+        })
+
+    async def page(request: Request) -> JSONResponse:
+        body = await request.json() if request.method == "PATCH" else None
+        failure = await profile.apply()
+        stats.count(failure)
+        if failure is not None:
+            return failure
+        record = pages.get(request.path_params["page_id"])
+        if record is None:
+            return JSONResponse({"object": "error", "status": 404, "code": "object_not_found",
+                                 "message": "Page not found"}, status_code=404)
+        if body is not None:
+            record["properties"].update(body.get("properties", {}))
+            record["last_edited_time"] = now()
+            if "archived" in body or "in_trash" in body:
+                record["archived"] = bool(body.get("archived") or body.get("in_trash"))
+        return JSONResponse(record)
+
+    return Starlette(routes=[
+        Route("/v1/databases/{database_id}", retrieve_database, methods=["GET"]),
+        Route("/v1/databases/{database_id}/query", query, methods=["POST"]),
+        Route("/v1/data_sources/{data_source_id}/query", query, methods=["POST"]),
+        Route("/v1/pages", create_page, methods=["POST"]),
+        Route("/v1/pages/{page_id}", page, methods=["GET", "PATCH"]),
+        *_control_routes(profile, stats),
+    ])
+
+
+class BackgroundServer:
+    """Serves an ASGI app with uvicorn on its own thread and event loop."""
+
+    def __init__(self, app: Any, port: int, host: str = "127.0.0.1"):
+        self.url = f"http://{host}:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning",
+                                                     access_log=False))
+        self._thread = threading.Thread(target=self._server.run, name=f"fake-upstream-{port}", daemon=True)
+
+    def start(self, timeout: float = 10.0) -> "BackgroundServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Fake upstream on {self.url} failed to start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def stats_of(url: str) -> Dict[str, int]:
+    """Counters of a running fake upstream."""
+    return httpx.get(f"{url}/_bench/stats", timeout=5).json()
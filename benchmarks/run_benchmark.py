@@ -0,0 +1,395 @@
+"""
+Benchmark runner - drives the real SSE app against fake upstreams and reports per-tool
+latency percentiles, throughput and server memory as JSON
+
+Usage:
+    python -m benchmarks.run_benchmark --requests 200 --concurrency 20 --output bench.json
+    python -m benchmarks.run_benchmark --baseline previous.json --tolerance 0.15
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import BackgroundServer, FaultProfile, backend_app, notion_app, stats_of
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+REPORT_VERSION = 1
+
+# Tool name -> arguments for the i-th call. Topics are unique so research isn't served from cache.
+SCENARIOS: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    "TestTool": lambda i: {"message": f"ping {i}"},
+    "CommandProcessor": lambda i: {
+        "raw_command": f'/create-content-post topic:"Benchmark topic {i}" platform:LinkedIn tone:casual'
+    },
+    "NotionTaskManager": lambda i: {
+        "action": "create",
+        "task_data": {"title": f"Benchmark task {i}", "command": "/create-content-post", "execution_mode": "Instant"},
+    },
+    "ResearchAgentProxy": lambda i: {"topic": f"Benchmark topic {i}", "platform": "Twitter"},
+    "CopywriterAgentProxy": lambda i: {
+        "research_data": {"summary": f"Summary {i}", "key_findings": ["a", "b"], "trends": ["t"]},
+        "platform": "Twitter",
+        "tone": "professional",
+    },
+    "ContentPipeline": lambda i: {
+        "command": f'/create-content-post topic:"Pipeline topic {i}" platform:Twitter'
+    },
+}
+
+# Compared against a baseline: (metric path, True if higher is worse)
+REGRESSION_CHECKS = (
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("latency_ms", "p99"), True),
+    (("throughput_rps",), False),
+    (("memory_mb", "peak"), True),
+)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MiB (Linux /proc; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    """Samples a process's RSS on a thread while a scenario runs."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        while True:
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        value = rss_mb(self.pid)
+        if value is not None:
+            self.samples.append(value)
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        if not self.samples:
+            return None
+        return {
+            "start": round(self.samples[0], 1),
+            "peak": round(max(self.samples), 1),
+            "end": round(self.samples[-1], 1),
+        }
+
+
+class ServerProcess:
+    """The MCP server (setup_uvicorn_app) in a subprocess, so its memory is measured on its own."""
+
+    def __init__(self, port: int, env: Dict[str, str], log_path: str, server_args: List[str]):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.log_path = log_path
+        self._log = open(log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.serve_app", str(port), *server_args],
+            cwd=PROJECT_ROOT, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            with contextlib.suppress(httpx.HTTPError):
+                if httpx.get(f"{self.url}/stats", timeout=1).status_code == 200:
+                    return
+            time.sleep(0.2)
+        self.stop()
+        with open(self.log_path) as log:
+            tail = log.read()[-2000:]
+        raise RuntimeError(f"MCP server did not start on {self.url}:\n{tail}")
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+
+def result_status(result: Any) -> str:
+    """Tool outcome: the JSON 'status' field, 'success' for plain text, 'tool_error' if the call failed."""
+    if getattr(result, "is_error", False):
+        return "tool_error"
+    content = getattr(result, "content", None) or []
+    text = getattr(content[0], "text", "") if content else ""
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return "success"
+    return str(payload.get("status", "success")) if isinstance(payload, dict) else "success"
+
+
+async def run_scenario(url: str, tool: str, make_args: Callable[[int], Dict[str, Any]], requests: int,
+                       concurrency: int, warmup: int, offset: int) -> Dict[str, Any]:
+    """Run `requests` calls of one tool over `concurrency` SSE sessions, each calling back to back."""
+    from fastmcp import Client
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_call = iter(range(offset, offset + requests))
+
+    async with contextlib.AsyncExitStack() as stack:
+        sessions = await asyncio.gather(*(
+            stack.enter_async_context(Client(f"{url}/sse/", timeout=300)) for _ in range(concurrency)
+        ))
+        # Warm up first so one-off costs (lazy imports, schema fetch, connection setup) aren't measured
+        for i in range(warmup):
+            await sessions[i % concurrency].call_tool(tool, make_args(offset - 1 - i), raise_on_error=False)
+
+        async def session_loop(session: Any) -> None:
+            for i in next_call:
+                started = time.perf_counter()
+                try:
+                    status = result_status(await session.call_tool(tool, make_args(i), raise_on_error=False))
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(session_loop(session) for session in sessions))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = statuses.get("success", 0)
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "ok": ok,
+        "error_rate": round(1 - ok / len(latencies), 4) if latencies else 0.0,
+        "statuses": dict(statuses),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "min": round(latencies[0] * 1000, 2) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for tool, result in current["results"].items():
+        previous = baseline.get("results", {}).get(tool)
+        if previous is None:
+            continue
+        for path, higher_is_worse in REGRESSION_CHECKS:
+            old, new = previous, result
+            for key in path:
+                old = (old or {}).get(key)
+                new = (new or {}).get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append({
+                    "tool": tool, "metric": ".".join(path),
+                    "baseline": old, "current": new, "change": round(change, 4),
+                })
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_summary(report: Dict[str, Any]) -> None:
+    print(f"{'tool':<22} {'req':>6} {'err%':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak MiB':>9}",
+          file=sys.stderr)
+    for tool, result in report["results"].items():
+        latency = result["latency_ms"]
+        memory = (result.get("memory_mb") or {}).get("peak", "-")
+        print(f"{tool:<22} {result['requests']:>6} {result['error_rate'] * 100:>6.1f} {result['throughput_rps']:>8} "
+              f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {memory:>9}", file=sys.stderr)
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['tool']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})", file=sys.stderr)
+
+
+def get_config() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the MCP server's tools against local fake upstreams")
+    parser.add_argument("--tools", default=",".join(SCENARIOS),
+                        help=f"Comma-separated tools to benchmark (default: {','.join(SCENARIOS)})")
+    parser.add_argument("--requests", "-n", type=int, default=100, help="Measured calls per tool (default: 100)")
+    parser.add_argument("--concurrency", "-c", type=int, default=10,
+                        help="Concurrent SSE sessions per tool (default: 10)")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured calls per tool first (default: 5)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for injected latency jitter and failures")
+    for name, latency in (("backend", 0.2), ("notion", 0.05)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency,
+                            help=f"Seconds each fake {name} request takes (default: {latency})")
+        parser.add_argument(f"--{name}-jitter", type=float, default=0.0,
+                            help=f"Extra random latency up to this many seconds for {name}")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0,
+                            help=f"Fraction of {name} requests answered with a 500")
+        parser.add_argument(f"--{name}-429-rate", type=float, default=0.0,
+                            help=f"Fraction of {name} requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the MCP server (repeatable), e.g. NOTION_WRITE_BEHIND=false")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="Extra start_mcp option for the server (repeatable)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", "-o", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression vs the baseline (default: 0.2)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    config = get_config()
+    tools = [tool.strip() for tool in config.tools.split(",") if tool.strip()]
+    unknown = [tool for tool in tools if tool not in SCENARIOS]
+    if unknown:
+        print(f"Unknown tools: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    profiles = {
+        name: FaultProfile(
+            latency=getattr(config, f"{name}_latency"),
+            jitter=getattr(config, f"{name}_jitter"),
+            error_rate=getattr(config, f"{name}_error_rate"),
+            rate_limit_rate=getattr(config, f"{name}_429_rate"),
+            retry_after=config.retry_after,
+            seed=config.seed,
+        )
+        for name in ("backend", "notion")
+    }
+    backend = BackgroundServer(backend_app(profiles["backend"]), free_port()).start()
+    notion = BackgroundServer(notion_app(profiles["notion"]), free_port()).start()
+
+    with tempfile.TemporaryDirectory(prefix="mcp-bench-") as data_dir:
+        env = dict(os.environ)
+        env.update({
+            "BACKEND_API_URL": backend.url,
+            "NOTION_API_BASE_URL": notion.url,
+            "NOTION_TOKEN": "benchmark",
+            "NOTION_DATABASE_ID": "benchmark-db",
+            "MCP_DATA_DIR": data_dir,
+            "RESEARCH_CACHE_TTL": "0",
+            "PYTHONUNBUFFERED": "1",
+        })
+        env.pop("MCP_WORKERS", None)
+        env.update(item.split("=", 1) for item in config.env)
+
+        server = ServerProcess(free_port(), env, os.path.join(data_dir, "server.log"), config.server_arg)
+        try:
+            server.wait_ready(config.startup_timeout)
+            results = {}
+            for tool in tools:
+                with MemorySampler(server.process.pid) as sampler:
+                    result = asyncio.run(run_scenario(
+                        server.url, tool, SCENARIOS[tool], config.requests, config.concurrency,
+                        config.warmup, offset=(len(results) + 1) * 1_000_000,
+                    ))
+                result["memory_mb"] = sampler.summary()
+                results[tool] = result
+        finally:
+            server.stop()
+            upstreams = {"backend": stats_of(backend.url), "notion": stats_of(notion.url)}
+            backend.stop()
+            notion.stop()
+
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": config.requests,
+            "concurrency": config.concurrency,
+            "warmup": config.warmup,
+            "seed": config.seed,
+            "backend": profiles["backend"].as_dict(),
+            "notion": profiles["notion"].as_dict(),
+            "env": config.env,
+        },
+        "results": results,
+        "upstreams": upstreams,
+    }
+    if config.baseline:
+        with open(config.baseline) as handle:
+            report["regressions"] = compare(json.load(handle), report, config.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if config.output:
+        with open(config.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    print_summary(report)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+Serve the real SSE app built by setup_uvicorn_app; started as a subprocess by the benchmark runner
+
+Usage: python -m benchmarks.serve_app PORT [start_mcp options...]
+"""
+
+import os
+import sys
+
+import uvicorn
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "server"))
+
+import start_mcp  # noqa: E402
+
+
+def main() -> None:
+    port = int(sys.argv[1])
+    # setup_uvicorn_app reads its configuration from the command line
+    sys.argv = ["start_mcp.py", "--host", "127.0.0.1", "--port", str(port), *sys.argv[2:]]
+    app = start_mcp.setup_uvicorn_app()
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
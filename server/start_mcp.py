@@ -1,18 +1,33 @@
+import time
+_IMPORTS_STARTED = time.perf_counter()
+
 import uvicorn # noqa
 import argparse
 import os
 import sys
+import importlib.metadata
 import importlib.util
 import inspect
+import contextlib
+import asyncio
+import hashlib
+import json
+import threading
 from typing import List, Type
+from agents.tool import FunctionTool
 from agency_swarm.tools import BaseTool
-from agency_swarm.integrations.mcp_server import run_mcp
+from agency_swarm.integrations.mcp_server import _adapt_legacy_tool, run_mcp
+from urllib.parse import parse_qs
+from fastmcp.server.middleware import Middleware
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
 
 # Default configuration
 DEFAULT_TOOLS_DIR = "./tools"
 DEFAULT_HOST = "0.0.0.0"
 DEFAULT_PORT = 8000
 DEFAULT_INSTANCE_NAME = "mcp-server"
+PROJECT_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
 def get_config():
     """Get configuration from environment variables with CLI argument overrides"""
@@ -32,89 +47,787 @@ def get_config():
                         help=f"Host to bind server to (env: MCP_HOST, default: {DEFAULT_HOST})")
     parser.add_argument("--name", "-n", default=instance_name,
                         help="Instance name (env: MCP_INSTANCE_NAME, used for logging/identification)")
+    parser.add_argument("--reload-tools", action="store_true",
+                        help="Watch the tools directories and hot-reload changed tools (env: MCP_RELOAD_TOOLS)")
+    parser.add_argument("--workers", "-w", type=int, default=int(os.getenv("MCP_WORKERS", "1")),
+                        help="Number of worker processes (env: MCP_WORKERS, default: 1)")
     
     return parser.parse_args()
 
 def setup_python_path():
     """Set up the Python path to include the project root and tools directory"""
     # Add the project root to the Python path
-    project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-    if project_root not in sys.path:
-        sys.path.insert(0, project_root)
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
     
     # Add the tools directory to the Python path
-    tools_dir = os.path.join(project_root, "tools")
+    tools_dir = os.path.join(PROJECT_ROOT, "tools")
     if tools_dir not in sys.path:
         sys.path.insert(0, tools_dir)
 
-def load_tools_from_directory(directory, parent_only=False):
+class StartupTimer:
+    """Collects how long each startup stage took for the startup report"""
+
+    def __init__(self):
+        self.stages = [("imports", (time.perf_counter() - _IMPORTS_STARTED) * 1000)]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, (time.perf_counter() - started) * 1000))
+
+    def report(self):
+        total = sum(ms for _, ms in self.stages)
+        parts = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.stages)
+        return f"{parts} (total {total:.0f}ms)"
+
+# Modules loaded by path, so overlapping tool directories never import a file twice
+_loaded_modules = {}
+
+def _tool_files(directory, parent_only=False):
+    """Python files that may define tools, as real paths"""
+    if parent_only:
+        walker = [next(os.walk(directory))]
+    else:
+        walker = os.walk(directory)
+    for root, _, files in walker:
+        for file in sorted(files):
+            if file.endswith('.py') and not file.startswith('__'):
+                yield os.path.realpath(os.path.join(root, file))
+
+def _package_module_name(path):
+    """Dotted name for files inside the project's tools package, else None"""
+    package_dir = os.path.join(PROJECT_ROOT, "tools")
+    if os.path.commonpath([path, package_dir]) != package_dir:
+        return None
+    relative = os.path.splitext(os.path.relpath(path, PROJECT_ROOT))[0]
+    return relative.replace(os.sep, ".")
+
+def _load_module(path, reload=False):
+    """Import a tool file once. Files in the tools package are imported under their
+    package name so `from tools.X import Y` elsewhere shares the same module.
+    With reload, the file is executed into a fresh module object, so calls still
+    running on the previous version keep their module intact."""
+    module = _loaded_modules.get(path)
+    if module is None or reload:
+        package_name = _package_module_name(path)
+        if package_name and not reload:
+            module = importlib.import_module(package_name)
+        else:
+            module_name = package_name or os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            if not (spec and spec.loader):
+                raise ImportError(f"Cannot load {path}")
+            module = importlib.util.module_from_spec(spec)
+            previous = sys.modules.get(module_name)
+            if package_name:
+                sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                if package_name and previous is not None:
+                    sys.modules[module_name] = previous
+                raise
+        _loaded_modules[path] = module
+    return module
+
+def _tool_classes(module):
+    """All BaseTool subclasses defined in the module"""
+    return [obj for _, obj in inspect.getmembers(module)
+            if inspect.isclass(obj) and issubclass(obj, BaseTool) and obj.__module__ == module.__name__]
+
+def load_tools_from_directory(directory, parent_only=False, seen=None):
     """Load all tool classes from a directory
     
     Args:
         directory: Directory to load tools from
         parent_only: If True, only load tools from the parent directory, not subdirectories
+        seen: Set of file paths already loaded; those files are skipped (and new ones added)
     """
     tools = []
-    loaded_count = 0
+    seen = set() if seen is None else seen
     
     # Ensure directory exists
     if not os.path.exists(directory):
         print(f"Directory does not exist: {directory}")
         return tools
     
-    # Get Python files in the directory
-    if parent_only:
-        # Only get files in the parent directory
-        files = [f for f in os.listdir(directory) 
-                if os.path.isfile(os.path.join(directory, f)) 
-                and f.endswith('.py') 
-                and not f.startswith('__')]
-        
-        for file in files:
-            file_path = os.path.join(directory, file)
+    for path in _tool_files(directory, parent_only):
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            tools.extend(_tool_classes(_load_module(path)))
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+    
+    print(f"Loaded {len(tools)} tools from {directory}")
+    return tools
+
+def describe_tool(tool_class):
+    """Tool name, description and input schema exactly as run_mcp would register them"""
+    function_tool = _adapt_legacy_tool(tool_class)
+    return {
+        "class_name": tool_class.__name__,
+        "name": function_tool.name,
+        "description": function_tool.description,
+        "params_json_schema": function_tool.params_json_schema,
+        "strict": function_tool.strict_json_schema,
+    }
+
+class ToolManifest:
+    """
+    Cached tool descriptions per file, so schemas can be registered without
+    importing the tools. An entry is reused while the file's mtime and size are
+    unchanged, or while its content hash matches (e.g. after a fresh checkout).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._header = {"version": self.VERSION, "agency_swarm": _agency_swarm_version()}
+        self._files = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("header") == self._header:
+                self._files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, path):
+        """Cached tool descriptions for the file, or None if it changed"""
+        entry = self._files.get(path)
+        stat = os.stat(path)
+        if entry and (entry["mtime_ns"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+            if entry["sha256"] == _file_hash(path):
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                self._dirty = True
+            else:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["tools"]
+
+    def record(self, path, tools):
+        stat = os.stat(path)
+        self._files[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                             "sha256": _file_hash(path), "tools": tools}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"header": self._header, "files": self._files}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _agency_swarm_version():
+    try:
+        return importlib.metadata.version("agency-swarm")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+class LazyTool:
+    """A tool registered from its manifest entry; its module is imported on the first call"""
+
+    def __init__(self, path, spec, tool_class=None):
+        self.path = path
+        self.spec = spec
+        self.tool_class = None
+        self._invoke = None
+        self._lock = threading.Lock()
+        if tool_class is not None:
+            self._bind(tool_class)
+
+    def _bind(self, tool_class):
+        self.tool_class = tool_class
+        self._invoke = _adapt_legacy_tool(tool_class).on_invoke_tool
+
+    def load(self):
+        with self._lock:
+            if self._invoke is None:
+                self._bind(getattr(_load_module(self.path), self.spec["class_name"]))
+        return self.tool_class
+
+    async def invoke(self, ctx, input_json):
+        if self._invoke is None:
+            # Import off the event loop so other sessions keep being served
+            await asyncio.to_thread(self.load)
+        return await self._invoke(ctx, input_json)
+
+    def function_tool(self):
+        return FunctionTool(
+            name=self.spec["name"],
+            description=self.spec["description"],
+            params_json_schema=self.spec["params_json_schema"],
+            on_invoke_tool=self.invoke,
+            strict_json_schema=self.spec["strict"],
+        )
+
+def discover_tools(directory, manifest, parent_only=False, seen=None):
+    """Like load_tools_from_directory, but returns LazyTools built from the manifest;
+    only files missing from (or changed since) the manifest are imported"""
+    tools = []
+    seen = set() if seen is None else seen
+    
+    if not os.path.exists(directory):
+        print(f"Directory does not exist: {directory}")
+        return tools
+    
+    for path in _tool_files(directory, parent_only):
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            specs = manifest.lookup(path)
+            if specs is not None:
+                tools.extend(LazyTool(path, spec) for spec in specs)
+                continue
+            classes = _tool_classes(_load_module(path))
+            manifest.record(path, [describe_tool(cls) for cls in classes])
+            tools.extend(LazyTool(path, describe_tool(cls), cls) for cls in classes)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+    
+    print(f"Discovered {len(tools)} tools in {directory}")
+    return tools
+
+def lazy_tools_enabled():
+    return os.getenv("MCP_LAZY_TOOLS", "true").lower() not in ("0", "false", "no")
+
+def tool_sources(config):
+    """(directory, parent_only) pairs tools are loaded from: the parent level of
+    DEFAULT_TOOLS_DIR, then --tools-dir when it differs"""
+    sources = [(DEFAULT_TOOLS_DIR, True)]
+    if config.tools_dir != DEFAULT_TOOLS_DIR and os.path.exists(config.tools_dir):
+        sources.append((config.tools_dir, False))
+    return sources
+
+def collect_tools(config, timer):
+    """Base tools plus tools from --tools-dir, each file once"""
+    seen = set()
+    loaded = []
+    with timer.stage("discovery"):
+        if lazy_tools_enabled():
+            from tools.utils.storage import data_path
+            manifest = ToolManifest(os.getenv("MCP_TOOL_MANIFEST") or data_path("tool_manifest.json"))
+            for directory, parent_only in tool_sources(config):
+                loaded.append(discover_tools(directory, manifest, parent_only=parent_only, seen=seen))
+            manifest.save()
+            print(f"Tool manifest: {manifest.hits} cached, {manifest.misses} imported")
+        else:
+            for directory, parent_only in tool_sources(config):
+                loaded.append(load_tools_from_directory(directory, parent_only=parent_only, seen=seen))
+    base_tools = loaded[0]
+    specified_tools = loaded[1] if len(loaded) > 1 else []
+    return base_tools, specified_tools
+
+def _tool_path(tool):
+    if isinstance(tool, LazyTool):
+        return tool.path
+    # Files outside the tools package are not in sys.modules, so inspect can't place them
+    for path, module in _loaded_modules.items():
+        if getattr(module, tool.__name__, None) is tool:
+            return path
+    return os.path.realpath(inspect.getfile(tool))
+
+class ToolReloader:
+    """
+    Watches the tool directories and, when files change, re-imports only those
+    files and swaps the app's tools through FastMCP's add_tool/remove_tool in
+    one synchronous step, so no call on the event loop sees a half-updated set.
+    A call already running holds its own tool object (and module), so it
+    finishes on the old version while new calls get the new one; open SSE
+    sessions stay connected.
+    """
+
+    def __init__(self, mcp, sources, tools, interval):
+        self.mcp = mcp
+        self.sources = sources
+        self.tools = list(tools)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for directory, parent_only in self.sources:
+            if not os.path.exists(directory):
+                continue
+            for path in _tool_files(directory, parent_only):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot.setdefault(path, (stat.st_mtime_ns, stat.st_size))
+        return snapshot
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
             try:
-                # Load the module
-                module_name = os.path.splitext(file)[0]
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                if spec and spec.loader:
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-                    
-                    # Find all BaseTool subclasses in the module
-                    for name, obj in inspect.getmembers(module):
-                        if (inspect.isclass(obj) and 
-                            issubclass(obj, BaseTool) and 
-                            obj.__module__ == module.__name__):
-                            tools.append(obj)
-                            loaded_count += 1
+                await self.check()
             except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-    else:
-        # Walk through the directory and subdirectories
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.py') and not file.startswith('__'):
-                    file_path = os.path.join(root, file)
-                    try:
-                        # Load the module
-                        module_name = os.path.splitext(file)[0]
-                        spec = importlib.util.spec_from_file_location(module_name, file_path)
-                        if spec and spec.loader:
-                            module = importlib.util.module_from_spec(spec)
-                            spec.loader.exec_module(module)
-                            
-                            # Find all BaseTool subclasses in the module
-                            for name, obj in inspect.getmembers(module):
-                                if (inspect.isclass(obj) and 
-                                    issubclass(obj, BaseTool) and 
-                                    obj.__module__ == module.__name__):
-                                    tools.append(obj)
-                                    loaded_count += 1
-                    except Exception as e:
-                        print(f"Error loading {file_path}: {e}")
-    
-    print(f"Loaded {loaded_count} tools from {directory}")
-    return tools
+                print(f"Tool reload failed: {e}")
+
+    async def check(self):
+        """Reload changed/added files and drop removed ones; returns the changed paths"""
+        snapshot = self._scan()
+        changed = [path for path, stamp in snapshot.items() if self._snapshot.get(path) != stamp]
+        removed = [path for path in self._snapshot if path not in snapshot]
+        if not changed and not removed:
+            return []
+
+        # Placed before reloading, while _loaded_modules still holds the current modules
+        owners = [(tool, _tool_path(tool)) for tool in self.tools]
+        replaced = {}
+        failed = []
+        for path in changed:
+            try:
+                classes = _tool_classes(_load_module(path, reload=True))
+                replaced[path] = [LazyTool(path, describe_tool(cls), cls) for cls in classes]
+            except Exception as e:
+                # Keep serving the previous version until the file imports cleanly
+                print(f"Error reloading {path}: {e}")
+                failed.append(path)
+        # A file that failed is retried on its next change, not on every scan
+        changed = [path for path in changed if path not in failed]
+        if not changed and not removed:
+            self._snapshot = snapshot
+            return []
+        for path in removed:
+            _loaded_modules.pop(path, None)
+            replaced[path] = []
+
+        tools = []
+        for tool, path in owners:
+            if path in replaced:
+                tools.extend(replaced.pop(path))
+            else:
+                tools.append(tool)
+        for new_tools in replaced.values():
+            tools.extend(new_tools)
+
+        # Convert the tools the same way run_mcp does at startup, then swap them in
+        # without awaiting in between
+        fresh = await run_mcp(tools=registrable(tools), return_app=True).get_tools()
+        current = await self.mcp.get_tools()
+        for key in current.keys() - fresh.keys():
+            self.mcp.remove_tool(key)
+        for key, tool in fresh.items():
+            if key in current:
+                # remove first: add_tool on an existing name logs a duplicate warning
+                self.mcp.remove_tool(key)
+            self.mcp.add_tool(tool)
+        self.tools = tools
+        self._snapshot = snapshot
+        print(f"Reloaded tools: {', '.join(os.path.basename(p) for p in changed + removed)} "
+              f"({len(tools)} tools registered)")
+        return changed + removed
+
+def reload_tools_enabled(config):
+    return config.reload_tools or os.getenv("MCP_RELOAD_TOOLS", "false").lower() in ("1", "true", "yes")
+
+def registrable(tools):
+    """What run_mcp accepts: tool classes, or FunctionTools for lazily loaded tools"""
+    return [tool.function_tool() if isinstance(tool, LazyTool) else tool for tool in tools]
+
+def start_background_workers(tools):
+    """Start the Notion write-behind flusher, the Notion mirror's poller and the scheduler, and resume unfinished jobs so journaled work replays right away"""
+    from tools.utils.jobs import get_job_runner
+    from tools.utils.notion_mirror import get_notion_mirror
+    from tools.utils.notion_writer import get_write_queue, write_behind_enabled
+    from tools.utils.scheduler import get_scheduler
+    if write_behind_enabled() and os.getenv("NOTION_TOKEN"):
+        get_write_queue()
+    get_notion_mirror()
+    runner = get_job_runner()
+    scheduler = get_scheduler()
+    if runner.store.unfinished() or scheduler.store.next_run_at() is not None:
+        # Job kinds and scheduled command handlers are registered by their tool modules, which may not be imported yet
+        for tool in tools:
+            if isinstance(tool, LazyTool):
+                tool.load()
+    resumed = runner.resume_unfinished()
+    if resumed:
+        print(f"Resumed {resumed} unfinished background job(s)")
+    requeued = scheduler.start()
+    if requeued:
+        print(f"Re-queued {requeued} interrupted scheduled command(s)")
+
+async def shutdown_resources():
+    """Stop the scheduler and background jobs, drain queued Notion writes, stop the Notion mirror and release pooled backend/Notion connections on server stop"""
+    from tools.utils.backend_client import aclose_backend_client
+    from tools.utils.jobs import get_job_runner
+    from tools.utils.notion_api import close_notion_client
+    from tools.utils.notion_mirror import stop_notion_mirror
+    from tools.utils.notion_writer import stop_write_queue
+    from tools.utils.scheduler import get_scheduler
+    await get_scheduler().stop()
+    await get_job_runner().stop()
+    await aclose_backend_client()
+    await asyncio.to_thread(stop_write_queue)
+    await asyncio.to_thread(stop_notion_mirror)
+    close_notion_client()
+
+def attach_lifecycle(app, tools, reloader=None, affinity=None):
+    """Start background workers (and the tool watcher) with the app and release resources after its lifespan exits"""
+    inner_lifespan = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        start_background_workers(tools)
+        watcher = asyncio.create_task(reloader.watch()) if reloader else None
+        if affinity:
+            await affinity.start()
+        try:
+            async with inner_lifespan(app) as state:
+                yield state
+        finally:
+            if watcher:
+                watcher.cancel()
+            if affinity:
+                await affinity.stop()
+            await shutdown_resources()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+async def stats_endpoint(request):
+    """Runtime counters: retries/circuit state per upstream host, queued Notion writes, background jobs
+    and admitted/queued tool calls"""
+    from tools.utils.retry import get_retry_engine
+    from tools.utils import admission, jobs, notion_writer
+    queue = notion_writer._write_queue
+    runner = jobs._job_runner
+    controller = admission._admission
+    return JSONResponse({
+        "retries": get_retry_engine().snapshot(),
+        "notion_write_queue": {"pending": queue.pending_count if queue else 0},
+        "jobs": {"active": runner.active if runner else 0, "max_workers": runner.max_workers if runner else None},
+        "admission": controller.snapshot() if controller else None,
+    })
+
+class ToolMetrics(Middleware):
+    """Counts, times and classifies every tool call for /metrics"""
+
+    async def on_call_tool(self, context, call_next):
+        from tools.utils.metrics import TOOL_CALLS, TOOL_DURATION, TOOL_ERRORS, TOOL_IN_FLIGHT
+        tool = context.message.name
+        with TOOL_IN_FLIGHT.track(tool=tool), TOOL_DURATION.time(tool=tool):
+            try:
+                result = await call_next(context)
+            except Exception as e:
+                TOOL_CALLS.inc(tool=tool, status="exception")
+                TOOL_ERRORS.inc(tool=tool, error_class=type(e).__name__)
+                raise
+        payload = _result_payload(result)
+        status = payload.get("status", "unknown")
+        TOOL_CALLS.inc(tool=tool, status=status)
+        if status in ("error", "partial"):
+            TOOL_ERRORS.inc(tool=tool, error_class=payload.get("error_type") or "ToolError")
+        return result
+
+class ToolTracing(Middleware):
+    """Opens a span per tool call; a traceparent in the request's _meta continues the caller's trace"""
+
+    async def on_call_tool(self, context, call_next):
+        from tools.utils.tracing import tool_span
+        traceparent = _request_meta(context).get("traceparent")
+        with tool_span(context.message.name, context.message.arguments, traceparent) as span:
+            result = await call_next(context)
+            payload = _result_payload(result)
+            span.set_attribute("tool.status", payload.get("status"))
+            span.set_attribute("job.id", payload.get("job_id"))
+            # Creates (and the pipeline) only learn their Notion task ID from the result
+            span.set_attribute("task_id", payload.get("task_id"))
+            if payload.get("status") == "error":
+                span.set_status("ERROR", str(payload.get("error", ""))[:200])
+            return result
+
+class CallDeadline(Middleware):
+    """Runs each tool call under its client's deadline (_meta timeout/deadline, or TOOL_CALL_TIMEOUT) and
+    abandons it as soon as the deadline passes or the client disconnects"""
+
+    async def on_call_tool(self, context, call_next):
+        from tools.utils.deadline import ClientGone, deadline_from_meta, deadline_scope, run_for_client
+        seconds = deadline_from_meta(_request_meta(context))
+        if seconds is None:
+            seconds = float(os.getenv("TOOL_CALL_TIMEOUT", "0")) or None
+        with deadline_scope(seconds):
+            try:
+                return await run_for_client(call_next(context))
+            except ClientGone as e:
+                # After a disconnect nobody reads this; it is for metrics and traces
+                if e.reason == "disconnected":
+                    return _error_result({"status": "error", "error": "The client disconnected",
+                                          "error_type": "ClientDisconnected"})
+                return _error_result({"status": "error", "error": "The call's deadline passed before it finished",
+                                      "error_type": "DeadlineExceeded"})
+
+class ClientDisconnect:
+    """ASGI middleware: gives every tool call of an SSE connection an event that is set once its client disconnects"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        from tools.utils.deadline import bind_connection, unbind_connection
+        disconnected = asyncio.Event()
+
+        async def watched_receive():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            return message
+
+        # Tool calls run in tasks started from this request, so they see the event
+        token = bind_connection(disconnected)
+        try:
+            await self.app(scope, watched_receive, send)
+        finally:
+            disconnected.set()
+            unbind_connection(token)
+
+class Idempotency(Middleware):
+    """Duplicate tool calls (same task_id and arguments, or the same _meta idempotency_key) attach to the call
+    in flight or get its stored result instead of running again"""
+
+    async def on_call_tool(self, context, call_next):
+        from tools.utils.idempotency import IDEMPOTENT_CALLS, REPLAYED_STATUSES, get_idempotency_store, idempotency_key
+        store = get_idempotency_store()
+        tool = context.message.name
+        arguments = context.message.arguments or {}
+        key = idempotency_key(tool, arguments, _request_meta(context).get("idempotency_key"))
+        if store is None or key is None:
+            return await call_next(context)
+
+        def replayable(result):
+            content = getattr(result, "content", None) or []
+            text = getattr(content[0], "text", None) if content else None
+            return text if _result_payload(result).get("status") in REPLAYED_STATUSES else None
+
+        result, text, outcome = await store.run(key, lambda: call_next(context), replayable,
+                                                task_id=arguments.get("task_id"))
+        IDEMPOTENT_CALLS.inc(tool=tool, outcome=outcome)
+        return result if result is not None else _text_result(text)
+
+class Admission(Middleware):
+    """Per-tool and per-client concurrency limits; calls past the wait queue are turned away with a retry hint.
+    Status polls and Notion reads are not limited"""
+
+    async def on_call_tool(self, context, call_next):
+        from tools.utils.admission import AdmissionRejected, get_admission_controller, is_exempt
+        controller = get_admission_controller()
+        if controller is None or is_exempt(context.message.name, context.message.arguments or {}):
+            return await call_next(context)
+        try:
+            async with controller.admit(context.message.name, _client_key(context)):
+                return await call_next(context)
+        except AdmissionRejected as e:
+            return _error_result(e.response())
+
+def _client_key(context):
+    """Who a tool call counts against: its MCP session, or its bearer token with ADMISSION_CLIENT_KEY=token"""
+    from fastmcp.server.dependencies import get_http_headers
+    headers = get_http_headers(include_all=True)
+    if os.getenv("ADMISSION_CLIENT_KEY", "session") == "token":
+        return "token:" + hashlib.sha256(headers.get("authorization", "").encode()).hexdigest()[:16]
+    if headers.get("mcp-session-id"):
+        return "session:" + headers["mcp-session-id"]
+    # SSE sessions have no header; each one is its own ServerSession
+    try:
+        return f"session:{id(context.fastmcp_context.session)}"
+    except (AttributeError, ValueError):
+        return "anonymous"
+
+def _request_meta(context):
+    """Extra fields of the tool call's _meta. FastMCP passes the middleware only name and arguments, so the
+    request's own _meta is read from the MCP request context"""
+    meta = getattr(context.message, "meta", None)
+    if meta is None:
+        try:
+            meta = context.fastmcp_context.request_context.meta
+        except (AttributeError, ValueError):
+            meta = None
+    return getattr(meta, "model_extra", None) or {}
+
+def _text_result(text):
+    """A tool result with one text block, for calls the middleware answers itself"""
+    from fastmcp.tools.tool import ToolResult
+    from mcp.types import TextContent
+    return ToolResult(content=[TextContent(type="text", text=text)])
+
+def _error_result(payload):
+    """A tool result carrying a JSON error payload"""
+    from tools.utils.fast_json import dumps
+    return _text_result(dumps(payload))
+
+def _result_payload(result):
+    """The JSON object a tool returned as its first text block, or {}"""
+    from tools.utils.fast_json import loads
+    content = getattr(result, "content", None) or []
+    text = getattr(content[0], "text", None) if content else None
+    try:
+        payload = loads(text) if text else {}
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+async def metrics_endpoint(request):
+    """Prometheus metrics. Under --workers every worker's series are gathered, labelled by worker"""
+    from tools.utils.metrics import REGISTRY, render
+    from tools.utils.shared_state import worker_count, worker_slot
+    slot = worker_slot()
+    families = REGISTRY.collect({"worker": str(slot)} if slot is not None else None)
+    if request.query_params.get("format") == "json":
+        return JSONResponse(families)
+    if slot is not None and request.query_params.get("scope") != "local":
+        import httpx
+        base_port = int(os.environ["MCP_WORKER_BASE_PORT"])
+        async with httpx.AsyncClient(timeout=5) as client:
+            async def fetch(sibling):
+                try:
+                    response = await client.get(f"http://127.0.0.1:{base_port + sibling}/metrics",
+                                                params={"scope": "local", "format": "json"})
+                    return response.json()
+                except (httpx.HTTPError, ValueError):
+                    # A restarting worker just misses this scrape
+                    return []
+            siblings = await asyncio.gather(*(fetch(i) for i in range(worker_count()) if i != slot))
+        for sibling_families in siblings:
+            families.extend(sibling_families)
+    return PlainTextResponse(render(families), media_type="text/plain; version=0.0.4")
+
+async def traces_endpoint(request):
+    """Recent spans kept by the in-memory trace exporter (TRACING_EXPORTER=memory), optionally for one trace_id"""
+    from tools.utils.tracing import MemoryExporter, get_tracer
+    exporter = get_tracer().exporter
+    if not isinstance(exporter, MemoryExporter):
+        return JSONResponse({"error": "In-memory tracing is not enabled (set TRACING_EXPORTER=memory)"}, status_code=404)
+    return JSONResponse({"spans": exporter.spans(request.query_params.get("trace_id"))})
+
+class WorkerAffinity:
+    """
+    ASGI wrapper that keeps each SSE session on the worker holding its stream.
+    The message endpoint announced on /sse is tagged with this worker's slot;
+    a message POSTed to a different worker is forwarded to the owning worker's
+    loopback port (MCP_WORKER_BASE_PORT + slot), which this wrapper also serves.
+    """
+
+    def __init__(self, app, slot, base_port):
+        self.app = app
+        self.slot = slot
+        self.base_port = base_port
+        self._server = None
+        self._client = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/sse"):
+            return await self.app(scope, receive, self._tag_endpoint(send))
+        if scope["type"] == "http" and scope["path"].startswith("/messages"):
+            target = parse_qs(scope["query_string"].decode()).get("worker", [None])[0]
+            if target is not None and target.isdigit() and int(target) != self.slot:
+                return await self._forward(int(target), scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    def _tag_endpoint(self, send):
+        tagged = False
+        marker = b"?session_id="
+
+        async def tagging_send(message):
+            nonlocal tagged
+            if not tagged and message["type"] == "http.response.body" and marker in message.get("body", b""):
+                message = dict(message, body=message["body"].replace(
+                    marker, f"?worker={self.slot}&session_id=".encode(), 1))
+                tagged = True
+            await send(message)
+
+        return tagging_send
+
+    async def _forward(self, target, scope, receive, send):
+        import httpx
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = [(k.decode(), v.decode()) for k, v in scope["headers"]
+                   if k not in (b"host", b"content-length")]
+        url = f"http://127.0.0.1:{self.base_port + target}{scope['path']}?{scope['query_string'].decode()}"
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30)
+        try:
+            response = await self._client.request(scope["method"], url, headers=headers, content=body)
+            status, content = response.status_code, response.content
+            content_type = response.headers.get("content-type", "text/plain")
+        except httpx.HTTPError:
+            # The owning worker is gone, and its sessions with it
+            status, content, content_type = 404, b"Could not find session", "text/plain"
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode())]})
+        await send({"type": "http.response.body", "body": content})
+
+    async def start(self):
+        """Serve this worker on its loopback port so siblings can forward messages to it"""
+        config = uvicorn.Config(self, host="127.0.0.1", port=self.base_port + self.slot,
+                                lifespan="off", log_level="warning")
+        config.load()
+        self._server = uvicorn.Server(config)
+        self._server.lifespan = config.lifespan_class(config)
+        await self._server.startup()
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.shutdown()
+        if self._client is not None:
+            await self._client.aclose()
+
+def create_app(tools, reload_sources=None):
+    """Build the SSE app; async tool runs are awaited directly on its event loop.
+    With reload_sources, those tool directories are watched and hot-reloaded.
+    Under --workers, the app is wrapped so sessions stick to their worker."""
+    from tools.utils.shared_state import worker_slot
+    fastmcp = run_mcp(tools=registrable(tools), return_app=True)
+    fastmcp.add_middleware(ToolMetrics())
+    fastmcp.add_middleware(ToolTracing())
+    fastmcp.add_middleware(CallDeadline())
+    fastmcp.add_middleware(Idempotency())
+    fastmcp.add_middleware(Admission())
+    app = fastmcp.http_app(stateless_http=True, transport="sse")
+    app.add_middleware(ClientDisconnect)
+    app.router.routes.append(Route("/stats", stats_endpoint, methods=["GET"]))
+    app.router.routes.append(Route("/metrics", metrics_endpoint, methods=["GET"]))
+    app.router.routes.append(Route("/traces", traces_endpoint, methods=["GET"]))
+    reloader = None
+    if reload_sources:
+        interval = float(os.getenv("MCP_RELOAD_INTERVAL", "1"))
+        reloader = ToolReloader(fastmcp, reload_sources, tools, interval)
+    slot = worker_slot()
+    if slot is None:
+        return attach_lifecycle(app, tools, reloader)
+    affinity = WorkerAffinity(app, slot, int(os.environ["MCP_WORKER_BASE_PORT"]))
+    attach_lifecycle(app, tools, reloader, affinity)
+    return affinity
 
 # Alternative way of running the app with uvicorn
 def setup_uvicorn_app():
@@ -122,24 +835,19 @@ def setup_uvicorn_app():
     setup_python_path()
     
     config = get_config()
+    timer = StartupTimer()
     
-    # Load tools from base directory (parent level only)
-    base_tools = load_tools_from_directory(DEFAULT_TOOLS_DIR, parent_only=True)
-    
-    # Load tools from specified directory (if different from base)
-    specified_tools = []
-    if config.tools_dir != DEFAULT_TOOLS_DIR and os.path.exists(config.tools_dir):
-        specified_tools = load_tools_from_directory(config.tools_dir)
-    
-    # Combine all tools
+    base_tools, specified_tools = collect_tools(config, timer)
     all_tools = base_tools + specified_tools
     
     if not all_tools:
         print("Error: No tools found in the specified directories")
         sys.exit(1)
     
-    fastmcp = run_mcp(tools=all_tools, return_app=True)
-    app = fastmcp.http_app(stateless_http=True, transport="sse")
+    reload_sources = tool_sources(config) if reload_tools_enabled(config) else None
+    with timer.stage("app"):
+        app = create_app(all_tools, reload_sources)
+    print(f"  Startup: {timer.report()}")
     return app
 
 # app = setup_uvicorn_app()
@@ -149,26 +857,24 @@ if __name__ == "__main__":
     setup_python_path()
     
     config = get_config()
+    timer = StartupTimer()
     
     # Override port with MCP_PORT env var if set
     if 'MCP_PORT' in os.environ:
         config.port = int(os.environ['MCP_PORT'])
     
-    # Load tools from base directory (parent level only)
-    base_tools = load_tools_from_directory(DEFAULT_TOOLS_DIR, parent_only=True)
-    
-    # Load tools from specified directory (if different from base)
-    specified_tools = []
-    if config.tools_dir != DEFAULT_TOOLS_DIR and os.path.exists(config.tools_dir):
-        specified_tools = load_tools_from_directory(config.tools_dir)
-    
-    # Combine all tools
+    base_tools, specified_tools = collect_tools(config, timer)
     all_tools = base_tools + specified_tools
     
     if not all_tools:
         print("Error: No tools found in the specified directories")
         sys.exit(1)
     
+    reload_sources = tool_sources(config) if reload_tools_enabled(config) else None
+    if config.workers <= 1:
+        with timer.stage("app"):
+            app = create_app(all_tools, reload_sources)
+    
     print(f"Starting MCP server [{config.name}]")
     print(f"  Base tools: {len(base_tools)} tools from {DEFAULT_TOOLS_DIR} (parent level only)")
     if specified_tools:
@@ -176,7 +882,20 @@ if __name__ == "__main__":
     print(f"  Total tools loaded: {len(all_tools)}")
     print(f"  Host: {config.host}")
     print(f"  Port: {config.port}")
+    if reload_sources:
+        print(f"  Hot reload: watching {', '.join(d for d, _ in reload_sources)}")
     print(f"  Configuration source: ENV vars + CLI args")
+    print(f"  Startup: {timer.report()}")
     
-    # Run MCP with all tool classes
-    run_mcp(tools=all_tools, transport="sse", host=config.host, port=config.port)
\ No newline at end of file
+    if config.workers > 1:
+        # Workers build their own app from the (now warm) tool manifest; they share
+        # the Notion rate limit, caches and job store through SHARED_STATE_URL
+        os.environ["MCP_WORKERS"] = str(config.workers)
+        os.environ.setdefault("MCP_WORKER_BASE_PORT", str(config.port + 1000))
+        print(f"  Workers: {config.workers} (shared state: {os.getenv('SHARED_STATE_URL', 'sqlite')})")
+        uvicorn.run("start_mcp:setup_uvicorn_app", factory=True, host=config.host, port=config.port,
+                    workers=config.workers)
+    else:
+        # Serve the same SSE app as setup_uvicorn_app so async tools share one event
+        # loop and pooled connections are closed in its lifespan
+        uvicorn.run(app, host=config.host, port=config.port)
@@ -0,0 +1,57 @@
+"""
+MCP Tool: AgentJobStatus - Polls background research/copywriting jobs
+"""
+
+from agency_swarm import BaseTool
+from pydantic import Field
+import os
+
+from tools.utils.fast_json import dumps
+from tools.utils.jobs import get_job_runner, job_view
+
+
+class AgentJobStatus(BaseTool):
+    """
+    Returns the status and, once finished, the result of a job started with
+    run_as_job on ResearchAgentProxy or CopywriterAgentProxy.
+    Set wait_seconds to long-poll until the job finishes.
+    """
+
+    job_id: str = Field(
+        ...,
+        description="Job ID returned by the proxy tool"
+    )
+
+    wait_seconds: float = Field(
+        default=0,
+        description="Wait up to this many seconds for the job to finish before returning (long-poll)"
+    )
+
+    async def run(self) -> str:
+        """
+        Look up the job.
+
+        Returns:
+            JSON string with the job status and result or error
+        """
+        try:
+            max_wait = float(os.getenv("JOB_MAX_WAIT", "55"))
+            wait = min(max(self.wait_seconds, 0), max_wait)
+
+            job = await get_job_runner().wait(self.job_id, wait)
+            if job is None:
+                return dumps({
+                    "status": "error",
+                    "error": f"Unknown job: {self.job_id}"
+                })
+
+            return dumps({
+                "status": "success",
+                **job_view(job)
+            })
+
+        except Exception as e:
+            return dumps({
+                "status": "error",
+                "error": f"Failed to read job status: {str(e)}"
+            })
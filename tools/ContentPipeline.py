@@ -0,0 +1,192 @@
+"""
+MCP Tool: ContentPipeline - Runs the whole /create-content-post flow server-side in one call
+"""
+
+from agency_swarm import BaseTool
+from pydantic import Field
+from typing import Optional, Dict, Any, Tuple
+import asyncio
+import contextlib
+import time
+
+from tools.CommandProcessor import CommandProcessor
+from tools.CopywriterAgentProxy import CopywriterAgentProxy
+from tools.NotionTaskManager import NotionTaskManager
+from tools.ResearchAgentProxy import ResearchAgentProxy
+from tools.utils.command_parser import parse_time
+from tools.utils.fast_json import dumps, loads
+from tools.utils.scheduler import get_scheduler, item_view, register_command_handler
+from tools.utils.tracing import tool_span
+
+
+class ContentPipeline(BaseTool):
+    """
+    Runs a /create-content-post command end to end: parses it, tracks it in
+    Notion, researches the topic and writes the post, returning the final
+    content in a single call. Notion writes run alongside the backend calls.
+    A command with a future schedule:<time> is queued with the scheduler
+    instead and runs at that time.
+    """
+
+    command: str = Field(
+        ...,
+        description="The raw command, e.g. '/create-content-post topic:\"AI trends\" platform:Twitter'"
+    )
+
+    track_in_notion: bool = Field(
+        default=True,
+        description="Whether to create and update a Notion task for this post"
+    )
+
+    async def run(self) -> str:
+        """
+        Execute the pipeline.
+
+        Returns:
+            JSON string with the generated content, Notion task ID and per-stage timings
+        """
+        return await self._run(defer_scheduled=True)
+
+    async def _run(self, defer_scheduled: bool) -> str:
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        notion_errors = []
+
+        try:
+            # Parse and validate the command
+            parsed, timings["parse_ms"] = await self._timed(
+                self._run_tool(CommandProcessor(raw_command=self.command))
+            )
+            if parsed.get("status") != "success":
+                return dumps(parsed)
+            params = parsed["parameters"]
+
+            # Not due yet: hand it to the scheduler, which runs this same command at its time
+            run_at = parse_time(parsed["scheduled_for"]).timestamp() if parsed["execution_mode"] == "scheduled" else 0
+            if defer_scheduled and run_at > time.time():
+                item = get_scheduler().schedule([(self.command, run_at)],
+                                                {"track_in_notion": self.track_in_notion})[0]
+                return dumps({
+                    "status": "accepted",
+                    "execution_mode": "scheduled",
+                    **item_view(item),
+                    "message": "Scheduled. List it with ContentScheduler (action 'list')."
+                })
+
+            # Create the Notion task while research is already running
+            async def research_stage() -> Tuple[Dict[str, Any], float]:
+                return await self._timed(self._run_tool(ResearchAgentProxy(
+                    topic=params["topic"],
+                    platform=params["platform"],
+                    additional_context=params.get("additional_context"),
+                    include_research_data=self.track_in_notion
+                )))
+
+            research_task = asyncio.create_task(research_stage())
+
+            try:
+                task_id = None
+                if self.track_in_notion:
+                    created, timings["notion_create_ms"] = await self._timed(self._notion("create", task_data={
+                        "title": f"{params['topic']} ({params['platform']})",
+                        "command": self.command,
+                        "parameters": params,
+                        "execution_mode": parsed["execution_mode"].title()
+                    }))
+                    if created.get("status") == "success":
+                        task_id = created["task_id"]
+                        notion_errors += await self._update_status(task_id, "Researching")
+                    else:
+                        notion_errors.append(created.get("error"))
+
+                research, timings["research_ms"] = await research_task
+                if research.get("status") != "success":
+                    notion_errors += await self._update_status(task_id, "Failed", error=research.get("error", ""))
+                    return self._result("error", timings, started, task_id, notion_errors, error=research.get("error"),
+                                        details=research.get("details"), failed_stage="research")
+
+                # Write the post while Notion records progress
+                copy_coro = self._timed(self._run_tool(CopywriterAgentProxy(
+                    research_handle=research["research_handle"],
+                    platform=params["platform"],
+                    tone=params["tone"],
+                    include_hashtags=params["include_hashtags"],
+                    additional_requirements=params.get("additional_requirements")
+                )))
+                (content, timings["copywriting_ms"]), status_errors = await asyncio.gather(
+                    copy_coro,
+                    self._update_status(task_id, "Writing", research_data=research.get("research_data"))
+                )
+                notion_errors += status_errors
+
+                if content.get("status") != "success":
+                    notion_errors += await self._update_status(task_id, "Failed", error=content.get("error", ""))
+                    return self._result("error", timings, started, task_id, notion_errors, error=content.get("error"),
+                                        details=content.get("details"), failed_stage="copywriting")
+
+                if task_id:
+                    done_errors, timings["notion_finalize_ms"] = await self._timed(
+                        self._update_status(task_id, "Done",
+                                            content=content.get("formatted_content") or content["content"])
+                    )
+                    notion_errors += done_errors
+
+                return self._result("success", timings, started, task_id, notion_errors, parameters=params,
+                                    content=content, research_summary=research["summary"])
+            finally:
+                # A failed Notion step or a cancelled pipeline must not leave the research call running
+                if not research_task.done():
+                    research_task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await research_task
+
+        except Exception as e:
+            return self._result("error", timings, started, None, notion_errors,
+                                error=f"Content pipeline failed: {str(e)}")
+
+    async def _run_tool(self, tool: BaseTool) -> Dict[str, Any]:
+        """Run another tool in-process (in its own child span) and decode its JSON response."""
+        with tool_span(type(tool).__name__, vars(tool)) as span:
+            if asyncio.iscoroutinefunction(tool.run):
+                raw = await tool.run()
+            else:
+                raw = await asyncio.to_thread(tool.run)
+            result = loads(raw)
+            span.set_attribute("tool.status", result.get("status"))
+            span.set_attribute("task_id", result.get("task_id"))
+        return result
+
+    async def _notion(self, action: str, task_id: Optional[str] = None,
+                      task_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._run_tool(NotionTaskManager(action=action, task_id=task_id, task_data=task_data))
+
+    async def _update_status(self, task_id: Optional[str], status: str, **fields: Any) -> list:
+        """Update the task status; returns a list with the error message, if any."""
+        if not task_id:
+            return []
+        result = await self._notion("update", task_id=task_id, task_data={"status": status, **fields})
+        return [] if result.get("status") == "success" else [result.get("error")]
+
+    @staticmethod
+    async def _timed(coro) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        result = await coro
+        return result, round((time.perf_counter() - start) * 1000, 1)
+
+    @staticmethod
+    def _result(status: str, timings: Dict[str, float], started: float, task_id: Optional[str],
+                notion_errors: list, **fields: Any) -> str:
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        response = {"status": status, "task_id": task_id, **fields, "timings": timings}
+        if notion_errors:
+            response["notion_errors"] = notion_errors
+        return dumps(response)
+
+
+async def _run_scheduled(command: str, options: Dict[str, Any]) -> str:
+    # Due now, even if a relative schedule (e.g. +2h) in the command still reads as later
+    pipeline = ContentPipeline(command=command, track_in_notion=options.get("track_in_notion", True))
+    return await pipeline._run(defer_scheduled=False)
+
+
+register_command_handler("/create-content-post", _run_scheduled)
@@ -0,0 +1,163 @@
+"""
+MCP Tool: ContentScheduler - Schedules batches of /create-content-post commands to run later
+"""
+
+from agency_swarm import BaseTool
+from pydantic import Field
+from typing import List, Optional
+from datetime import datetime, timezone
+import os
+
+# Importing the pipeline registers how scheduled /create-content-post commands run
+from tools.ContentPipeline import ContentPipeline  # noqa: F401
+from tools.utils.command_parser import CREATE_CONTENT_POST, format_time, parse_time
+from tools.utils.fast_json import dumps
+from tools.utils.scheduler import get_scheduler, item_view
+
+
+class ContentScheduler(BaseTool):
+    """
+    Queues a batch of /create-content-post commands on the server and runs
+    each through the content pipeline at its scheduled time. Commands with
+    their own schedule:<time> keep it; the rest start at start_at and are
+    spread spread_seconds apart. The server paces runs so the backend and
+    Notion see a steady load. Also lists and cancels scheduled commands.
+    """
+
+    action: str = Field(
+        ...,
+        description="Action to perform: 'schedule', 'list', or 'cancel'"
+    )
+
+    commands: Optional[List[str]] = Field(
+        default=None,
+        description="Commands to schedule, e.g. '/create-content-post topic:\"AI trends\" schedule:+2h'"
+    )
+
+    start_at: Optional[str] = Field(
+        default=None,
+        description="When the first command without its own schedule runs: ISO 8601 (UTC if no offset) or +30m / +2h / +1d. Defaults to now"
+    )
+
+    spread_seconds: Optional[float] = Field(
+        default=None,
+        description="Seconds between consecutive commands without their own schedule (defaults to the server's minimum interval)"
+    )
+
+    track_in_notion: bool = Field(
+        default=True,
+        description="Whether each run creates and updates a Notion task"
+    )
+
+    batch_id: Optional[str] = Field(
+        default=None,
+        description="Batch to list or cancel"
+    )
+
+    item_ids: Optional[List[str]] = Field(
+        default=None,
+        description="Scheduled items to cancel"
+    )
+
+    status: Optional[str] = Field(
+        default=None,
+        description="Only list items in this state: 'scheduled', 'running', 'succeeded', 'failed' or 'cancelled'"
+    )
+
+    def run(self) -> str:
+        """
+        Execute the scheduler action.
+
+        Returns:
+            JSON string with the scheduled items or the error
+        """
+        try:
+            if self.action == "schedule":
+                return self._schedule()
+            elif self.action == "list":
+                items = get_scheduler().store.list(self.batch_id, self.status,
+                                                   limit=int(os.getenv("SCHEDULER_LIST_LIMIT", "100")))
+                return dumps({
+                    "status": "success",
+                    "count": len(items),
+                    "items": [item_view(item) for item in items]
+                })
+            elif self.action == "cancel":
+                if not self.batch_id and not self.item_ids:
+                    return dumps({
+                        "error": "Provide batch_id or item_ids to cancel",
+                        "status": "error"
+                    })
+                cancelled = get_scheduler().store.cancel(self.item_ids, self.batch_id)
+                return dumps({
+                    "status": "success",
+                    "cancelled": cancelled
+                })
+            else:
+                return dumps({
+                    "error": f"Invalid action: {self.action}",
+                    "status": "error"
+                })
+
+        except Exception as e:
+            return dumps({
+                "error": f"Scheduler operation failed: {str(e)}",
+                "status": "error"
+            })
+
+    def _schedule(self) -> str:
+        """Validate the batch and queue every valid command."""
+        if not self.commands:
+            return dumps({
+                "error": "Commands required for schedule action",
+                "status": "error"
+            })
+        max_batch = int(os.getenv("SCHEDULER_MAX_BATCH", "500"))
+        if len(self.commands) > max_batch:
+            return dumps({
+                "error": f"Too many commands ({len(self.commands)}); the limit is {max_batch} per batch",
+                "status": "error"
+            })
+
+        start = parse_time(self.start_at) if self.start_at else datetime.now(timezone.utc)
+        if start is None:
+            return dumps({
+                "error": "Invalid start_at. Use an ISO 8601 time or +30m / +2h / +1d",
+                "status": "error"
+            })
+        scheduler = get_scheduler()
+        spread = scheduler.min_interval if self.spread_seconds is None else max(self.spread_seconds, 0)
+
+        # Lay out commands without their own time evenly from start_at; the time is
+        # written into the stored command so the run (and Notion) see it as scheduled
+        items, rejected = [], []
+        next_at = start.timestamp()
+        for index, (command, parsed) in enumerate(zip(self.commands, CREATE_CONTENT_POST.parse_many(self.commands))):
+            if parsed["status"] != "success":
+                rejected.append({"index": index, "command": command, "error": parsed["error"]})
+            elif parsed["execution_mode"] == "scheduled":
+                items.append((command, parse_time(parsed["scheduled_for"]).timestamp()))
+            else:
+                run_at = next_at
+                next_at += spread
+                items.append((f"{command.rstrip()} schedule:{format_time(datetime.fromtimestamp(run_at, timezone.utc))}",
+                              run_at))
+
+        if not items:
+            return dumps({
+                "status": "error",
+                "error": "No valid commands to schedule",
+                "rejected": rejected
+            })
+
+        records = scheduler.schedule(items, {"track_in_notion": self.track_in_notion})
+        run_times = [record["run_at"] for record in records]
+        return dumps({
+            "status": "partial" if rejected else "success",
+            "batch_id": records[0]["batch_id"],
+            "scheduled": len(records),
+            "rejected": rejected,
+            "first_run_at": format_time(datetime.fromtimestamp(min(run_times), timezone.utc)),
+            "last_run_at": format_time(datetime.fromtimestamp(max(run_times), timezone.utc)),
+            "items": [item_view(record) for record in records]
+        })
@@ -5,20 +5,46 @@ MCP Tool: CopywriterAgentProxy - Calls backend Copywriter Agent via API
 from agency_swarm import BaseTool
 from pydantic import Field
 from typing import Optional, Dict, Any, List
-import json
+import asyncio
 import httpx
-import os
+
+from tools.NotionTaskManager import NotionTaskManager
+from tools.utils.backend_client import get_backend_client
+from tools.utils.deadline import DeadlineExceeded
+from tools.utils.fast_json import dumps, dumps_bytes, loads, response_fields
+from tools.utils.jobs import register_job_kind, submit_tool_job
+from tools.utils.mcp_context import ProgressForwarder
+from tools.utils.notion_writer import is_pending_id, resolve_task_id
+from tools.utils.research_cache import load_research, project_research
+from tools.utils.retry import CircuitOpenError
+
+
+# Fields of the backend's copywriter response that the tool reads
+COPYWRITER_FIELDS = ("content", "hashtags", "character_count", "platform", "tone", "optimized_for",
+                     "includes_cta", "alternatives")
+
+
+class ResearchHandleError(Exception):
+    """The research handle is unknown here or its stored result has expired."""
 
 
 class CopywriterAgentProxy(BaseTool):
     """
     Proxy tool that calls the backend Copywriter Agent API.
     Generates optimized content based on research data.
+    Research is taken as a research_handle from ResearchAgentProxy (looked up
+    on the server) or inline, and only the target platform's insights are
+    sent to the backend.
     """
     
-    research_data: Dict[str, Any] = Field(
-        ...,
-        description="Research data containing summary, key findings, and trends"
+    research_handle: Optional[str] = Field(
+        default=None,
+        description="research_handle returned by ResearchAgentProxy (preferred over passing research_data)"
+    )
+    
+    research_data: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Inline research data containing summary, key findings, and trends (when there is no handle)"
     )
     
     platform: str = Field(
@@ -41,101 +67,191 @@ class CopywriterAgentProxy(BaseTool):
         description="Any additional requirements for content generation"
     )
     
+    platforms: Optional[List[str]] = Field(
+        default=None,
+        description="Generate one variant per platform (e.g. ['Twitter', 'LinkedIn', 'Instagram']); overrides platform"
+    )
+    
+    tones: Optional[List[str]] = Field(
+        default=None,
+        description="Generate one variant per tone; overrides tone"
+    )
+    
     task_id: Optional[str] = Field(
         default=None,
         description="Notion task ID for tracking"
     )
+    
+    run_as_job: bool = Field(
+        default=False,
+        description="Return a job_id immediately and generate in the background; "
+                    "poll AgentJobStatus for the result (also saved to the Notion task when task_id is set)"
+    )
 
-    def run(self) -> str:
+    async def run(self) -> str:
         """
         Call the Copywriter Agent API and return generated content.
+        With `platforms` and/or `tones`, one variant is generated per combination
+        and the backend calls run concurrently.
         
         Returns:
-            JSON string with generated content or error
+            JSON string with generated content (or variants) or error (or a job handle in job mode)
         """
+        if self.task_id:
+            # The backend and the job's Notion hook need the page ID, not a provisional one
+            self.task_id = await resolve_task_id(self.task_id)
+        
+        if self.run_as_job:
+            return dumps(submit_tool_job("copywriter", self))
+        
         try:
-            # Get backend configuration
-            backend_url = os.getenv("BACKEND_API_URL", "http://localhost:8000")
-            api_key = os.getenv("BACKEND_API_KEY", "")
-            
-            # Prepare request
-            endpoint = f"{backend_url}/api/v1/agents/copywriter"
+            research_data = self._resolve_research()
             
-            payload = {
-                "research_data": self.research_data,
-                "platform": self.platform,
-                "tone": self.tone,
-                "include_hashtags": self.include_hashtags
+            # Serialize each platform's projection of the research once for all its requests
+            research_json = {
+                platform: dumps_bytes(project_research(research_data, platform))
+                for platform in set(self.platforms or [self.platform])
             }
             
-            if self.additional_requirements:
-                payload["additional_requirements"] = self.additional_requirements
-            
-            if self.task_id:
-                payload["task_id"] = self.task_id
+            if self.platforms or self.tones:
+                return dumps(await self._fan_out(research_json))
             
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
+            return dumps(await self._generate(research_json[self.platform], self.platform, self.tone))
+        except Exception as e:
+            return dumps(self._error_response(e))
+    
+    def _resolve_research(self) -> Dict[str, Any]:
+        """The research to write from: the stored result behind the handle, or the inline data."""
+        handle = self.research_handle
+        # A whole ResearchAgentProxy response passed as research_data carries its handle
+        if handle is None and self.research_data and "research_handle" in self.research_data:
+            handle = self.research_data["research_handle"]
+        if handle is None:
+            if self.research_data is None:
+                raise ValueError("Provide research_handle or research_data")
+            return self.research_data
+        research_data = load_research(handle)
+        if research_data is None:
+            raise ResearchHandleError(handle)
+        return research_data
+    
+    async def _fan_out(self, research_json: Dict[str, bytes]) -> Dict[str, Any]:
+        """Generate every platform/tone combination concurrently."""
+        combinations = [
+            (platform, tone)
+            for platform in (self.platforms or [self.platform])
+            for tone in (self.tones or [self.tone])
+        ]
+        
+        async def generate_variant(platform: str, tone: str) -> Dict[str, Any]:
+            try:
+                variant = await self._generate(research_json[platform], platform, tone)
+            except Exception as e:
+                variant = self._error_response(e)
+            return {"platform": platform, "tone": tone, **variant}
+        
+        variants = await asyncio.gather(*(generate_variant(p, t) for p, t in combinations))
+        succeeded = sum(1 for v in variants if v["status"] == "success")
+        
+        return {
+            "status": "success" if succeeded == len(variants) else ("partial" if succeeded else "error"),
+            "variants": variants
+        }
+    
+    async def _generate(self, research_json: bytes, platform: str, tone: str) -> Dict[str, Any]:
+        """Call the backend for one platform/tone and format the result."""
+        # Prepare request
+        payload = {
+            "platform": platform,
+            "tone": tone,
+            "include_hashtags": self.include_hashtags
+        }
+        
+        if self.additional_requirements:
+            payload["additional_requirements"] = self.additional_requirements
+        
+        if self.task_id and not is_pending_id(self.task_id):
+            payload["task_id"] = self.task_id
+        
+        # Splice the pre-encoded research data in rather than re-encoding it per request
+        body = b'{"research_data":' + research_json + b"," + dumps_bytes(payload)[1:]
+        
+        # Await the backend on the server's event loop (Agency Swarm awaits
+        # async run() directly), so no worker thread is held for the call.
+        # Partial content is relayed to the client as the backend streams it.
+        response = await get_backend_client().astream(
+            "copywriter", content=body, on_event=ProgressForwarder(f"{platform} copy")
+        )
+        
+        if response.status_code != 200:
+            return {
+                "status": "error",
+                "error": f"Copywriter API error: {response.status_code}",
+                "error_type": "CopywriterAPIError",
+                "details": response.text
             }
-            
-            # Make synchronous request
-            response = httpx.post(
-                endpoint,
-                json=payload,
-                headers=headers,
-                timeout=45.0  # 45 second timeout
-            )
-            
-            if response.status_code == 200:
-                content_data = response.json()
-                
-                # Format response
-                formatted_response = {
-                    "status": "success",
-                    "content": content_data.get("content", ""),
-                    "hashtags": content_data.get("hashtags", []),
-                    "character_count": content_data.get("character_count", 0),
-                    "platform": content_data.get("platform", self.platform),
-                    "metadata": {
-                        "tone": content_data.get("tone", self.tone),
-                        "optimized_for": content_data.get("optimized_for", self.platform),
-                        "includes_cta": content_data.get("includes_cta", False)
-                    }
-                }
-                
-                # Add alternatives if available
-                if content_data.get("alternatives"):
-                    formatted_response["alternatives"] = content_data["alternatives"]
-                
-                # Add platform-specific formatting
-                formatted_response["formatted_content"] = self._format_for_platform(
-                    content_data.get("content", ""),
-                    content_data.get("hashtags", [])
-                )
-                
-                return json.dumps(formatted_response)
-            else:
-                return json.dumps({
-                    "status": "error",
-                    "error": f"Copywriter API error: {response.status_code}",
-                    "details": response.text
-                })
-                
-        except httpx.TimeoutException:
-            return json.dumps({
+        
+        content_data = response_fields(response, COPYWRITER_FIELDS)
+        
+        # Format response
+        formatted_response = {
+            "status": "success",
+            "content": content_data.get("content", ""),
+            "hashtags": content_data.get("hashtags", []),
+            "character_count": content_data.get("character_count", 0),
+            "platform": content_data.get("platform", platform),
+            "metadata": {
+                "tone": content_data.get("tone", tone),
+                "optimized_for": content_data.get("optimized_for", platform),
+                "includes_cta": content_data.get("includes_cta", False)
+            }
+        }
+        
+        # Add alternatives if available
+        if content_data.get("alternatives"):
+            formatted_response["alternatives"] = content_data["alternatives"]
+        
+        # Add platform-specific formatting
+        formatted_response["formatted_content"] = self._format_for_platform(
+            content_data.get("content", ""),
+            content_data.get("hashtags", []),
+            platform
+        )
+        
+        return formatted_response
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        """Map a failed backend call to the tool's error payload."""
+        if isinstance(error, ResearchHandleError):
+            return {
                 "status": "error",
-                "error": "Content generation timed out. Please try again."
-            })
-        except Exception as e:
-            return json.dumps({
+                "error": f"Research handle {error} is unknown or has expired. Run ResearchAgentProxy again.",
+                "error_type": "ResearchHandleError"
+            }
+        if isinstance(error, CircuitOpenError):
+            return {
                 "status": "error",
-                "error": f"Failed to call Copywriter Agent: {str(e)}"
-            })
+                "error": "Copywriter backend is temporarily unavailable. Please retry later.",
+                "error_type": "CircuitOpenError",
+                "retry_after": round(error.retry_after, 1)
+            }
+        if isinstance(error, (httpx.TimeoutException, DeadlineExceeded)):
+            return {
+                "status": "error",
+                "error": "Content generation timed out. Please try again.",
+                "error_type": type(error).__name__
+            }
+        return {
+            "status": "error",
+            "error": f"Failed to call Copywriter Agent: {str(error)}",
+            "error_type": type(error).__name__
+        }
     
-    def _format_for_platform(self, content: str, hashtags: List[str]) -> str:
+    def _format_for_platform(self, content: str, hashtags: List[str], platform: Optional[str] = None) -> str:
         """Format content appropriately for the platform."""
-        if self.platform == "Twitter":
+        platform = platform or self.platform
+        
+        if platform == "Twitter":
             # Ensure content + hashtags fit in 280 characters
             hashtag_text = " ".join(f"#{tag}" for tag in hashtags) if self.include_hashtags else ""
             
@@ -149,7 +265,7 @@ class CopywriterAgentProxy(BaseTool):
                     content = content[:277] + "..."
                 return content
         
-        elif self.platform == "LinkedIn":
+        elif platform == "LinkedIn":
             # LinkedIn allows up to 1300 characters
             hashtag_text = " ".join(f"#{tag}" for tag in hashtags) if self.include_hashtags else ""
             
@@ -166,7 +282,7 @@ class CopywriterAgentProxy(BaseTool):
                     content = content[:1297] + "..."
                 return content
         
-        elif self.platform == "Instagram":
+        elif platform == "Instagram":
             # Instagram allows up to 2200 characters
             hashtag_text = " ".join(f"#{tag}" for tag in hashtags) if self.include_hashtags else ""
             
@@ -182,4 +298,28 @@ class CopywriterAgentProxy(BaseTool):
                     content = content[:2197] + "..."
                 return content
         
-        return content
\ No newline at end of file
+        return content
+
+
+async def _save_content_to_notion(job: Dict[str, Any]) -> None:
+    """Record a finished copywriting job on its Notion task."""
+    result = loads(job["result"]) if job["result"] else {}
+    if job["status"] != "succeeded":
+        task_data = {"status": "Failed", "error": result.get("error") or job["error"] or "Copywriting job failed"}
+    elif "variants" in result:
+        task_data = {"status": "Done", "content": "\n\n---\n\n".join(
+            f"[{v['platform']} / {v['tone']}]\n{v['formatted_content']}"
+            for v in result["variants"] if v["status"] == "success"
+        )}
+    else:
+        task_data = {"status": "Done", "content": result.get("formatted_content") or result["content"]}
+    await asyncio.to_thread(
+        NotionTaskManager(action="update", task_id=job["task_id"], task_data=task_data).run
+    )
+
+
+register_job_kind(
+    "copywriter",
+    lambda params: CopywriterAgentProxy(**params).run(),
+    on_complete=_save_content_to_notion
+)
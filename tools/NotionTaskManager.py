@@ -4,23 +4,47 @@ MCP Tool: NotionTaskManager - Creates and manages tasks in Notion
 
 from agency_swarm import BaseTool
 from pydantic import Field
-from typing import Optional, Dict, Any
-import json
+from typing import Optional, Dict, Any, List, Callable
 import os
 from notion_client import Client
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from datetime import datetime
 import asyncio
 
+from tools.utils.fast_json import dumps
+from tools.utils.notion_api import (
+    TASK_FIELDS,
+    NotionSchemaError,
+    call_notion,
+    get_database_id,
+    get_database_schema,
+    get_notion_client,
+    iter_database_query,
+    property_value,
+    rich_text,
+)
+from tools.utils.notion_mirror import get_notion_mirror, record_written
+from tools.utils.notion_writer import get_write_queue, is_pending_id, write_behind_enabled
+from tools.utils.retry import CircuitOpenError
+
+# Fields the get action returns
+GET_FIELDS = ["status", "title", "command", "parameters", "content", "error"]
+
+DEFAULT_QUERY_FIELDS = ["title", "status", "execution_mode"]
+
 
 class NotionTaskManager(BaseTool):
     """
     Creates and updates tasks in Notion database.
     Manages the entire lifecycle of content creation tasks.
+    Bulk actions create or update many tasks in one call, and query lists
+    tasks by status or execution mode.
     """
     
     action: str = Field(
         ...,
-        description="Action to perform: 'create', 'update', or 'get'"
+        description="Action to perform: 'create', 'update', 'get', 'bulk_create', 'bulk_update', or 'query'"
     )
     
     task_data: Optional[Dict[str, Any]] = Field(
@@ -32,6 +56,31 @@ class NotionTaskManager(BaseTool):
         default=None,
         description="Notion page ID for update/get operations"
     )
+    
+    tasks: Optional[List[Dict[str, Any]]] = Field(
+        default=None,
+        description="Task data objects for bulk_create; for bulk_update each also carries its task_id"
+    )
+    
+    query_filter: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Filter for query, e.g. {\"status\": \"Waiting\"} or {\"execution_mode\": [\"Scheduled\"]}; a list matches any value"
+    )
+    
+    properties: Optional[List[str]] = Field(
+        default=None,
+        description=f"Task fields query returns (default: {', '.join(DEFAULT_QUERY_FIELDS)}); any of {', '.join(TASK_FIELDS)}"
+    )
+    
+    limit: int = Field(
+        default=100,
+        description="Most tasks query returns"
+    )
+    
+    cursor: Optional[str] = Field(
+        default=None,
+        description="next_cursor from a previous query, to fetch the tasks after it"
+    )
 
     def run(self) -> str:
         """
@@ -41,9 +90,9 @@ class NotionTaskManager(BaseTool):
             JSON string with operation result
         """
         try:
-            # Initialize Notion client
-            notion = Client(auth=os.getenv("NOTION_TOKEN"))
-            database_id = os.getenv("NOTION_DATABASE_ID")
+            # Reuse the process-wide Notion client
+            notion = get_notion_client()
+            database_id = get_database_id()
             
             if self.action == "create":
                 return self._create_task(notion, database_id)
@@ -51,139 +100,357 @@ class NotionTaskManager(BaseTool):
                 return self._update_task(notion)
             elif self.action == "get":
                 return self._get_task(notion)
+            elif self.action == "bulk_create":
+                return self._bulk_create(notion, database_id)
+            elif self.action == "bulk_update":
+                return self._bulk_update(notion)
+            elif self.action == "query":
+                return self._query_tasks(notion, database_id)
             else:
-                return json.dumps({
+                return dumps({
                     "error": f"Invalid action: {self.action}",
                     "status": "error"
                 })
                 
+        except CircuitOpenError as e:
+            return dumps({
+                "error": f"Notion is temporarily unavailable: {str(e)}",
+                "retry_after": round(e.retry_after, 1),
+                "error_type": "CircuitOpenError",
+                "status": "error"
+            })
+        except NotionSchemaError as e:
+            return dumps({
+                "error": f"Invalid task properties: {str(e)}",
+                "error_type": "NotionSchemaError",
+                "status": "error"
+            })
         except Exception as e:
-            return json.dumps({
+            return dumps({
                 "error": f"Notion operation failed: {str(e)}",
+                "error_type": type(e).__name__,
                 "status": "error"
             })
     
     def _create_task(self, notion: Client, database_id: str) -> str:
         """Create a new task in Notion."""
         if not self.task_data:
-            return json.dumps({
+            return dumps({
                 "error": "Task data required for create action",
                 "status": "error"
             })
         
-        # Build properties
+        return dumps(self._create_page(notion, database_id, self.task_data))
+    
+    def _create_page(self, notion: Client, database_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create one task page; returns the action result."""
+        properties = self._create_properties(task_data)
+        
+        # Fail fast on properties the database doesn't have
+        self._validate_properties(properties)
+        
+        if write_behind_enabled():
+            # Queue the create and hand back a provisional ID right away (the queue updates the mirror)
+            task_id = get_write_queue().enqueue_create(database_id, properties)
+            return {
+                "status": "success",
+                "task_id": task_id,
+                "queued": True,
+                "url": "",
+                "created_time": datetime.utcnow().isoformat() + "Z"
+            }
+        
+        # Create the page (not retried once Notion may have made it)
+        response = call_notion(
+            notion.pages.create,
+            parent={"database_id": database_id},
+            properties=properties,
+            idempotent=False
+        )
+        record_written(response)
+        
+        return {
+            "status": "success",
+            "task_id": response["id"],
+            "url": response.get("url", ""),
+            "created_time": response.get("created_time", "")
+        }
+    
+    def _create_properties(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Notion properties for a new task."""
         properties = {
             "Name": {
                 "title": [{
-                    "text": {"content": self.task_data.get("title", "New Content Post")}
+                    "text": {"content": task_data.get("title", "New Content Post")}
                 }]
             },
             "Status": {
                 "select": {"name": "Waiting"}
             },
             "Command Used": {
-                "rich_text": [{
-                    "text": {"content": self.task_data.get("command", "/create-content-post")}
-                }]
+                "rich_text": rich_text(task_data.get("command", "/create-content-post"))
             },
             "Execution Mode": {
-                "select": {"name": self.task_data.get("execution_mode", "Instant")}
+                "select": {"name": task_data.get("execution_mode", "Instant")}
             }
         }
         
         # Add optional fields
-        if "parameters" in self.task_data:
+        if "parameters" in task_data:
             properties["Parameters"] = {
-                "rich_text": [{
-                    "text": {"content": json.dumps(self.task_data["parameters"])}
-                }]
+                "rich_text": rich_text(dumps(task_data["parameters"]))
             }
         
-        if "description" in self.task_data:
+        if "description" in task_data:
             properties["Task Description"] = {
-                "rich_text": [{
-                    "text": {"content": self.task_data["description"][:2000]}
-                }]
+                "rich_text": rich_text(task_data["description"])
             }
         
-        if "webhook_url" in self.task_data:
+        if "webhook_url" in task_data:
             properties["Webhook URL"] = {
-                "url": self.task_data["webhook_url"]
+                "url": task_data["webhook_url"]
             }
         
-        # Create the page
-        response = notion.pages.create(
-            parent={"database_id": database_id},
-            properties=properties
-        )
-        
-        return json.dumps({
-            "status": "success",
-            "task_id": response["id"],
-            "url": response.get("url", ""),
-            "created_time": response.get("created_time", "")
-        })
+        return properties
     
     def _update_task(self, notion: Client) -> str:
         """Update an existing task."""
         if not self.task_id or not self.task_data:
-            return json.dumps({
+            return dumps({
                 "error": "Task ID and data required for update",
                 "status": "error"
             })
         
-        # Build update properties
+        return dumps(self._update_page(notion, self.task_id, self.task_data))
+    
+    def _update_page(self, notion: Client, task_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update one task page; returns the action result."""
+        properties = self._update_properties(task_data)
+        self._validate_properties(properties)
+        
+        if write_behind_enabled():
+            # Merged with other queued updates for this page and flushed in the background
+            task_id = get_write_queue().enqueue_update(task_id, properties)
+            return {
+                "status": "success",
+                "task_id": task_id,
+                "queued": True,
+                "last_edited_time": ""
+            }
+        
+        # Update the page
+        response = call_notion(
+            notion.pages.update,
+            page_id=task_id,
+            properties=properties
+        )
+        record_written(response)
+        
+        return {
+            "status": "success",
+            "task_id": response["id"],
+            "last_edited_time": response.get("last_edited_time", "")
+        }
+    
+    def _update_properties(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Notion properties for the fields being updated."""
         properties = {}
         
-        if "status" in self.task_data:
+        if "status" in task_data:
             properties["Status"] = {
-                "select": {"name": self.task_data["status"]}
+                "select": {"name": task_data["status"]}
             }
         
-        if "content" in self.task_data:
+        if "content" in task_data:
+            # Long values are split across rich_text parts instead of truncated
             properties["Content"] = {
-                "rich_text": [{
-                    "text": {"content": self.task_data["content"][:2000]}
-                }]
+                "rich_text": rich_text(task_data["content"])
             }
         
-        if "research_data" in self.task_data:
+        if "research_data" in task_data:
             properties["Research Data"] = {
-                "rich_text": [{
-                    "text": {"content": json.dumps(self.task_data["research_data"])[:2000]}
-                }]
+                "rich_text": rich_text(dumps(task_data["research_data"]))
             }
         
-        if "error" in self.task_data:
+        if "error" in task_data:
             properties["Error"] = {
-                "rich_text": [{
-                    "text": {"content": self.task_data["error"][:2000]}
-                }]
+                "rich_text": rich_text(task_data["error"])
             }
         
-        # Update the page
-        response = notion.pages.update(
-            page_id=self.task_id,
-            properties=properties
-        )
+        return properties
+    
+    def _bulk_create(self, notion: Client, database_id: str) -> str:
+        """Create many tasks; one failing task doesn't stop the others."""
+        if not self.tasks:
+            return dumps({
+                "error": "Tasks required for bulk_create action",
+                "status": "error"
+            })
+        
+        return self._bulk(lambda task: self._create_page(notion, database_id, task))
+    
+    def _bulk_update(self, notion: Client) -> str:
+        """Update many tasks; each entry carries its task_id and the fields to change."""
+        if not self.tasks:
+            return dumps({
+                "error": "Tasks required for bulk_update action",
+                "status": "error"
+            })
+        
+        def update(task: Dict[str, Any]) -> Dict[str, Any]:
+            fields = {name: value for name, value in task.items() if name != "task_id"}
+            if not task.get("task_id") or not fields:
+                return {"error": "Task ID and data required for update", "status": "error"}
+            return self._update_page(notion, task["task_id"], fields)
+        
+        return self._bulk(update)
+    
+    def _bulk(self, write: Callable[[Dict[str, Any]], Dict[str, Any]]) -> str:
+        """
+        Run one write per task with bounded parallelism. Every Notion call still
+        takes a token from the shared rate limiter, so the batch never exceeds
+        the Notion budget; with write-behind the writes are only queued.
+        """
+        max_tasks = int(os.getenv("NOTION_BULK_MAX_TASKS", "100"))
+        if len(self.tasks) > max_tasks:
+            return dumps({
+                "error": f"Too many tasks ({len(self.tasks)}); the limit is {max_tasks} per call",
+                "status": "error"
+            })
+        
+        def guarded(task: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return write(task)
+            except Exception as e:
+                return {"error": str(e), "error_type": type(e).__name__, "status": "error"}
+        
+        if write_behind_enabled():
+            results = [guarded(task) for task in self.tasks]
+        else:
+            workers = min(int(os.getenv("NOTION_BULK_CONCURRENCY", "3")), len(self.tasks))
+            # Each write keeps the caller's trace context in its pool thread
+            contexts = [contextvars.copy_context() for _ in self.tasks]
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notion-bulk") as pool:
+                results = list(pool.map(lambda context, task: context.run(guarded, task), contexts, self.tasks))
+        
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        return dumps({
+            "status": "success" if succeeded == len(results) else ("partial" if succeeded else "error"),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        })
+    
+    def _query_tasks(self, notion: Client, database_id: str) -> str:
+        """List tasks matching query_filter, projected to the requested fields."""
+        fields = self.properties or DEFAULT_QUERY_FIELDS
+        unknown = [name for name in [*fields, *(self.query_filter or {})] if name not in TASK_FIELDS]
+        if unknown:
+            return dumps({
+                "error": f"Unknown task fields: {', '.join(unknown)}. Use any of: {', '.join(TASK_FIELDS)}",
+                "status": "error"
+            })
+        
+        limit = min(max(self.limit, 1), int(os.getenv("NOTION_QUERY_MAX_RESULTS", "1000")))
+        
+        mirror = get_notion_mirror()
+        # A cursor is Notion's, so paging past the first results always goes to Notion
+        if mirror is not None and mirror.ready and not self.cursor:
+            # Served from the local mirror, which already holds our own writes
+            filters = {name: values if isinstance(values, list) else [values]
+                       for name, values in (self.query_filter or {}).items()}
+            rows, has_more = mirror.query(filters, fields, limit)
+            return dumps({
+                "status": "success",
+                "count": len(rows),
+                "has_more": has_more,
+                "next_cursor": None,
+                "source": "mirror",
+                "tasks": [{"task_id": row.pop("page_id"), **row} for row in rows]
+            })
+        
+        if write_behind_enabled():
+            # Let our own queued writes land before reading the database
+            get_write_queue().flush(timeout=float(os.getenv("NOTION_WRITE_WAIT", "30")))
         
-        return json.dumps({
+        # Ask Notion for only the projected properties when their IDs are known
+        schema = get_database_schema()
+        filter_properties = schema.property_ids(TASK_FIELDS[name][0] for name in fields) if schema else None
+        
+        pages = iter_database_query(notion, database_id, filter=self._notion_filter(),
+                                    filter_properties=filter_properties, start_cursor=self.cursor, limit=limit)
+        
+        # Project each page as it streams in; only the compact rows are kept
+        tasks = [self._project(page, fields) for page in pages]
+        return dumps({
             "status": "success",
-            "task_id": response["id"],
-            "last_edited_time": response.get("last_edited_time", "")
+            "count": len(tasks),
+            "has_more": pages.has_more,
+            "next_cursor": pages.next_cursor if pages.has_more else None,
+            "source": "notion",
+            "tasks": tasks
         })
     
+    def _notion_filter(self) -> Optional[Dict[str, Any]]:
+        """Notion filter for query_filter: values of one field are OR-ed, fields are AND-ed."""
+        clauses = []
+        for name, values in (self.query_filter or {}).items():
+            prop, kind = TASK_FIELDS[name]
+            matches = [{"property": prop, kind: {"equals": value}}
+                       for value in (values if isinstance(values, list) else [values])]
+            clauses.append(matches[0] if len(matches) == 1 else {"or": matches})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"and": clauses}
+    
+    def _project(self, page: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        """Compact view of a page holding only the requested fields."""
+        props = page.get("properties", {})
+        row = {"task_id": page["id"], "last_edited_time": page.get("last_edited_time", "")}
+        for name in fields:
+            row[name] = property_value(props.get(TASK_FIELDS[name][0]))
+        return row
+    
     def _get_task(self, notion: Client) -> str:
         """Get task details."""
         if not self.task_id:
-            return json.dumps({
+            return dumps({
                 "error": "Task ID required for get action",
                 "status": "error"
             })
         
-        response = notion.pages.retrieve(page_id=self.task_id)
+        page_id = self.task_id
+        mirror = get_notion_mirror()
+        if mirror is not None and mirror.ready:
+            # Served locally: the mirror is polled and already holds our own (even queued) writes
+            row = mirror.get(page_id)
+            if row is None and write_behind_enabled() and is_pending_id(page_id):
+                row = mirror.get(get_write_queue().resolve(page_id))
+            if row is not None:
+                return dumps({
+                    "status": "success",
+                    "task_id": row["page_id"],
+                    "created_time": row["created_time"] or "",
+                    "last_edited_time": row["last_edited_time"] or "",
+                    "source": "mirror",
+                    "data": {name: row[name] or "" for name in GET_FIELDS}
+                })
         
-        # Extract properties
+        if write_behind_enabled():
+            # Read our own queued writes: wait for them to reach Notion first
+            queue = get_write_queue()
+            queue.wait_for(page_id, timeout=float(os.getenv("NOTION_WRITE_WAIT", "30")))
+            page_id = queue.resolve(page_id)
+            if is_pending_id(page_id):
+                return dumps({
+                    "error": "Task is still being created in Notion. Please try again shortly.",
+                    "status": "error"
+                })
+        
+        response = call_notion(notion.pages.retrieve, page_id=page_id)
+        record_written(response)
+        
+        # Extract properties (rich text joined across all its parts)
         props = response.get("properties", {})
         
         task_info = {
@@ -191,32 +458,14 @@ class NotionTaskManager(BaseTool):
             "task_id": response["id"],
             "created_time": response.get("created_time", ""),
             "last_edited_time": response.get("last_edited_time", ""),
-            "data": {
-                "status": self._extract_select(props.get("Status")),
-                "title": self._extract_title(props.get("Name")),
-                "command": self._extract_text(props.get("Command Used")),
-                "parameters": self._extract_text(props.get("Parameters")),
-                "content": self._extract_text(props.get("Content")),
-                "error": self._extract_text(props.get("Error"))
-            }
+            "source": "notion",
+            "data": {name: property_value(props.get(TASK_FIELDS[name][0])) for name in GET_FIELDS}
         }
         
-        return json.dumps(task_info)
-    
-    def _extract_title(self, prop):
-        """Extract title property."""
-        if prop and prop.get("title"):
-            return prop["title"][0]["text"]["content"] if prop["title"] else ""
-        return ""
-    
-    def _extract_text(self, prop):
-        """Extract rich text property."""
-        if prop and prop.get("rich_text"):
-            return prop["rich_text"][0]["text"]["content"] if prop["rich_text"] else ""
-        return ""
-    
-    def _extract_select(self, prop):
-        """Extract select property."""
-        if prop and prop.get("select"):
-            return prop["select"]["name"] if prop["select"] else ""
-        return ""
\ No newline at end of file
+        return dumps(task_info)
+    
+    def _validate_properties(self, properties: Dict[str, Any]) -> None:
+        """Check properties against the cached database schema."""
+        schema = get_database_schema()
+        if schema is not None:
+            schema.validate(properties)
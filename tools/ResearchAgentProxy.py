@@ -5,16 +5,45 @@ MCP Tool: ResearchAgentProxy - Calls backend Research Agent via API
 from agency_swarm import BaseTool
 from pydantic import Field
 from typing import Optional, Dict, Any
-import json
-import httpx
-import os
 import asyncio
+import httpx
+
+from tools.NotionTaskManager import NotionTaskManager
+from tools.utils.backend_client import get_backend_client
+from tools.utils.deadline import DeadlineExceeded
+from tools.utils.fast_json import dumps, loads, response_fields
+from tools.utils.jobs import register_job_kind, submit_tool_job
+from tools.utils.mcp_context import ProgressForwarder
+from tools.utils.notion_writer import is_pending_id, resolve_task_id
+from tools.utils.retry import CircuitOpenError
+from tools.utils.research_cache import cache_key, get_research_cache, load_research, store_research
+
+
+# Fields of the backend's research response that are kept, with their defaults
+RESEARCH_DEFAULTS = {
+    "summary": "",
+    "key_findings": [],
+    "sources": [],
+    "trends": [],
+    "platform_insights": {}
+}
+
+
+class ResearchAPIError(Exception):
+    """Non-200 response from the research endpoint."""
+    
+    def __init__(self, status_code: int, details: str):
+        super().__init__(f"Research API error: {status_code}")
+        self.status_code = status_code
+        self.details = details
 
 
 class ResearchAgentProxy(BaseTool):
     """
     Proxy tool that calls the backend Research Agent API.
     Handles research requests for content creation.
+    The full result stays on the server: the response carries a research_handle
+    plus a summary, and CopywriterAgentProxy takes the handle.
     """
     
     topic: str = Field(
@@ -36,22 +65,34 @@ class ResearchAgentProxy(BaseTool):
         default=None,
         description="Notion task ID for tracking"
     )
+    
+    include_research_data: bool = Field(
+        default=False,
+        description="Also return the full research data (sources, trends, insights for every platform) inline"
+    )
+    
+    run_as_job: bool = Field(
+        default=False,
+        description="Return a job_id immediately and run the research in the background; "
+                    "poll AgentJobStatus for the result (also saved to the Notion task when task_id is set)"
+    )
 
-    def run(self) -> str:
+    async def run(self) -> str:
         """
         Call the Research Agent API and return results.
         
         Returns:
-            JSON string with research data or error
+            JSON string with research data or error (or a job handle in job mode)
         """
+        if self.task_id:
+            # The backend and the job's Notion hook need the page ID, not a provisional one
+            self.task_id = await resolve_task_id(self.task_id)
+        
+        if self.run_as_job:
+            return dumps(submit_tool_job("research", self))
+        
         try:
-            # Get backend configuration
-            backend_url = os.getenv("BACKEND_API_URL", "http://localhost:8000")
-            api_key = os.getenv("BACKEND_API_KEY", "")
-            
             # Prepare request
-            endpoint = f"{backend_url}/api/v1/agents/research"
-            
             payload = {
                 "topic": self.topic,
                 "platform": self.platform,
@@ -61,52 +102,71 @@ class ResearchAgentProxy(BaseTool):
             if self.additional_context:
                 payload["additional_context"] = self.additional_context
             
-            if self.task_id:
+            if self.task_id and not is_pending_id(self.task_id):
                 payload["task_id"] = self.task_id
             
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
+            async def fetch_research() -> Dict[str, Any]:
+                # Await the backend on the server's event loop (Agency Swarm awaits
+                # async run() directly), so no worker thread is held for the call.
+                # Streamed progress is relayed to the client as it arrives.
+                response = await get_backend_client().astream(
+                    "research", payload, on_event=ProgressForwarder("Research")
+                )
+                
+                if response.status_code != 200:
+                    raise ResearchAPIError(response.status_code, response.text)
+                
+                # Decode only the fields kept, with defaults for any the backend left out
+                return {**RESEARCH_DEFAULTS, **response_fields(response, RESEARCH_DEFAULTS)}
             
-            # Make synchronous request (Agency Swarm doesn't support async in run())
-            response = httpx.post(
-                endpoint,
-                json=payload,
-                headers=headers,
-                timeout=60.0  # 60 second timeout for research
+            # Identical requests are served from cache, and concurrent ones share one backend call
+            research_data, cached = await get_research_cache().get_or_fetch(
+                cache_key(payload), fetch_research
             )
             
-            if response.status_code == 200:
-                research_data = response.json()
-                
-                # Format response
-                return json.dumps({
-                    "status": "success",
-                    "research_data": {
-                        "summary": research_data.get("summary", ""),
-                        "key_findings": research_data.get("key_findings", []),
-                        "sources": research_data.get("sources", []),
-                        "trends": research_data.get("trends", []),
-                        "platform_insights": research_data.get("platform_insights", {})
-                    }
-                })
-            else:
-                return json.dumps({
-                    "status": "error",
-                    "error": f"Research API error: {response.status_code}",
-                    "details": response.text
-                })
-                
-        except httpx.TimeoutException:
-            return json.dumps({
+            # Format response: a handle and a digest rather than the whole result
+            response = {
+                "status": "success",
+                "cached": cached,
+                "research_handle": store_research(research_data),
+                "summary": research_data["summary"],
+                "key_findings": research_data["key_findings"][:5],
+                "counts": {
+                    "key_findings": len(research_data["key_findings"]),
+                    "sources": len(research_data["sources"]),
+                    "trends": len(research_data["trends"]),
+                    "platforms": sorted(research_data["platform_insights"])
+                }
+            }
+            if self.include_research_data:
+                response["research_data"] = research_data
+            return dumps(response)
+            
+        except ResearchAPIError as e:
+            return dumps({
+                "status": "error",
+                "error": f"Research API error: {e.status_code}",
+                "error_type": "ResearchAPIError",
+                "details": e.details
+            })
+        except CircuitOpenError as e:
+            return dumps({
+                "status": "error",
+                "error": "Research backend is temporarily unavailable. Please retry later.",
+                "error_type": "CircuitOpenError",
+                "retry_after": round(e.retry_after, 1)
+            })
+        except (httpx.TimeoutException, DeadlineExceeded) as e:
+            return dumps({
                 "status": "error",
-                "error": "Research request timed out. Please try again."
+                "error": "Research request timed out. Please try again.",
+                "error_type": type(e).__name__
             })
         except Exception as e:
-            return json.dumps({
+            return dumps({
                 "status": "error",
-                "error": f"Failed to call Research Agent: {str(e)}"
+                "error": f"Failed to call Research Agent: {str(e)}",
+                "error_type": type(e).__name__
             })
     
     def _format_research_summary(self, research_data: Dict[str, Any]) -> str:
@@ -140,4 +200,24 @@ class ResearchAgentProxy(BaseTool):
                     for practice in insights["best_practices"][:3]:
                         summary += f"• {practice}\n"
         
-        return summary
\ No newline at end of file
+        return summary
+
+
+async def _save_research_to_notion(job: Dict[str, Any]) -> None:
+    """Record a finished research job on its Notion task."""
+    if job["status"] == "succeeded":
+        result = loads(job["result"])
+        # The job result only carries the handle; the full research is still in the local store
+        task_data = {"research_data": result.get("research_data") or load_research(result["research_handle"])}
+    else:
+        task_data = {"status": "Failed", "error": job["error"] or "Research job failed"}
+    await asyncio.to_thread(
+        NotionTaskManager(action="update", task_id=job["task_id"], task_data=task_data).run
+    )
+
+
+register_job_kind(
+    "research",
+    lambda params: ResearchAgentProxy(**params).run(),
+    on_complete=_save_research_to_notion
+)
@@ -3,5 +3,8 @@ __all__ = [
     "CommandProcessor",
     "NotionTaskManager", 
     "ResearchAgentProxy",
-    "CopywriterAgentProxy"
+    "CopywriterAgentProxy",
+    "ContentPipeline",
+    "AgentJobStatus",
+    "ContentScheduler"
 ]
\ No newline at end of file
@@ -0,0 +1 @@
+# Shared runtime helpers used by the MCP tools (not tools themselves)
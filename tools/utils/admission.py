@@ -0,0 +1,272 @@
+"""
+Admission control - per-tool and per-client concurrency limits for MCP tool calls, with a bounded
+wait queue, wait deadlines and fast rejection carrying a retry hint
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from tools.utils.deadline import remaining
+from tools.utils.metrics import counter, gauge, histogram
+
+# Concurrent calls per tool (per worker) unless ADMISSION_<TOOL>_MAX_CONCURRENCY is set; 0 means
+# only the global and per-client limits apply
+DEFAULT_TOOL_LIMITS = {
+    "ResearchAgentProxy": 8,
+    "CopywriterAgentProxy": 8,
+    "ContentPipeline": 4,
+}
+
+# Status and read-only calls that bypass admission: AgentJobStatus long-polls for up to a minute,
+# and holding slots while waiting would starve the calls doing the work
+EXEMPT_TOOLS = {"AgentJobStatus"}
+EXEMPT_ACTIONS = {"NotionTaskManager": {"get", "query"}}
+
+# Retry hint when a tool has no completed calls to estimate from yet
+DEFAULT_RETRY_AFTER = 5.0
+
+ADMISSION_WAIT = histogram("admission_wait_seconds", "Time admitted tool calls waited for a slot", ("tool",))
+ADMISSION_REJECTED = counter("admission_rejections", "Tool calls turned away by admission control",
+                             ("tool", "reason"))
+
+
+def is_exempt(tool: str, arguments: Dict[str, object]) -> bool:
+    """Whether a call runs without taking an admission slot."""
+    return tool in EXEMPT_TOOLS or arguments.get("action") in EXEMPT_ACTIONS.get(tool, ())
+
+
+class AdmissionRejected(Exception):
+    """The call was not admitted: the wait queue is full or its wait deadline passed."""
+
+    def __init__(self, tool: str, reason: str, retry_after: float):
+        super().__init__(f"{tool} rejected ({reason}), retry in {retry_after:.0f}s")
+        self.tool = tool
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def response(self) -> Dict[str, object]:
+        """The tool response for the rejected call."""
+        if self.reason == "queue_full":
+            error = f"Server is busy: too many {self.tool} calls are waiting. Please retry later."
+        else:
+            error = f"Server is busy: {self.tool} waited too long for a free slot. Please retry later."
+        return {
+            "status": "error",
+            "error": error,
+            "error_type": "AdmissionRejected",
+            "reason": self.reason,
+            "retry_after": round(self.retry_after, 1)
+        }
+
+
+class _Waiter:
+    __slots__ = ("tool", "client", "future")
+
+    def __init__(self, tool: str, client: str, future: asyncio.Future):
+        self.tool = tool
+        self.client = client
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Admits a tool call once the worker, its tool and its client each have a
+    free slot. Calls that can't start wait in one FIFO queue, bounded overall
+    and per client, for at most max_wait seconds (less if the client's deadline
+    is sooner). A freed slot goes to the oldest waiter that fits, so a client
+    at its limit doesn't hold up others.
+    Calls beyond the queue bounds, or still waiting at their deadline, are
+    rejected with a retry hint from the tool's recent call durations.
+    State belongs to the server's event loop and is not thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        client_max_concurrency: int,
+        max_queue: int,
+        client_max_queue: int,
+        max_wait: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.client_max_concurrency = client_max_concurrency
+        self.max_queue = max_queue
+        self.client_max_queue = client_max_queue
+        self.max_wait = max_wait
+
+        self._running = 0
+        self._running_by_tool: Dict[str, int] = {}
+        self._running_by_client: Dict[str, int] = {}
+        self._queue: Deque[_Waiter] = deque()
+        self._queued_by_client: Dict[str, int] = {}
+        self._tool_limits: Dict[str, int] = {}
+        # Smoothed call duration per tool, for retry hints
+        self._durations: Dict[str, float] = {}
+
+    def tool_limit(self, tool: str) -> int:
+        limit = self._tool_limits.get(tool)
+        if limit is None:
+            limit = self._tool_limits[tool] = int(os.getenv(f"ADMISSION_{tool.upper()}_MAX_CONCURRENCY",
+                                                            str(DEFAULT_TOOL_LIMITS.get(tool, 0))))
+        return limit
+
+    @contextlib.asynccontextmanager
+    async def admit(self, tool: str, client: str) -> AsyncIterator[float]:
+        """Hold a slot for the block; yields the seconds waited. Raises AdmissionRejected."""
+        waited = await self._acquire(tool, client)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._record_duration(tool, time.monotonic() - started)
+            self._release(tool, client)
+
+    def retry_after(self, tool: str) -> float:
+        return min(60.0, max(1.0, self._durations.get(tool, DEFAULT_RETRY_AFTER)))
+
+    def snapshot(self) -> Dict[str, object]:
+        """Running and queued calls, for /stats."""
+        return {
+            "running": self._running,
+            "queued": len(self._queue),
+            "running_by_tool": {tool: count for tool, count in self._running_by_tool.items() if count},
+            "queued_by_tool": self.queued_by_tool(),
+            "clients": sum(1 for count in self._running_by_client.values() if count),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+    def queued_by_tool(self) -> Dict[str, int]:
+        queued: Dict[str, int] = {}
+        for waiter in list(self._queue):
+            queued[waiter.tool] = queued.get(waiter.tool, 0) + 1
+        return queued
+
+    async def _acquire(self, tool: str, client: str) -> float:
+        if self._fits(tool, client):
+            self._take(tool, client)
+            ADMISSION_WAIT.observe(0.0, tool=tool)
+            return 0.0
+
+        if len(self._queue) >= self.max_queue or self._queued_by_client.get(client, 0) >= self.client_max_queue:
+            ADMISSION_REJECTED.inc(tool=tool, reason="queue_full")
+            raise AdmissionRejected(tool, "queue_full", self.retry_after(tool))
+
+        waiter = _Waiter(tool, client, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self._queued_by_client[client] = self._queued_by_client.get(client, 0) + 1
+        started = time.monotonic()
+        wait = self.max_wait
+        left = remaining()
+        if left is not None:
+            wait = min(wait, max(left, 0.0))
+        try:
+            # asyncio.wait leaves the future alone on timeout, so a slot handed over
+            # at the deadline is kept rather than lost
+            await asyncio.wait((waiter.future,), timeout=wait)
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            ADMISSION_REJECTED.inc(tool=tool, reason="timeout")
+            raise AdmissionRejected(tool, "timeout", self.retry_after(tool))
+
+        waited = time.monotonic() - started
+        ADMISSION_WAIT.observe(waited, tool=tool)
+        return waited
+
+    def _fits(self, tool: str, client: str) -> bool:
+        tool_limit = self.tool_limit(tool)
+        return (
+            self._running < self.max_concurrency
+            and (not tool_limit or self._running_by_tool.get(tool, 0) < tool_limit)
+            and self._running_by_client.get(client, 0) < self.client_max_concurrency
+        )
+
+    def _take(self, tool: str, client: str) -> None:
+        self._running += 1
+        self._running_by_tool[tool] = self._running_by_tool.get(tool, 0) + 1
+        self._running_by_client[client] = self._running_by_client.get(client, 0) + 1
+
+    def _release(self, tool: str, client: str) -> None:
+        self._running -= 1
+        self._running_by_tool[tool] -= 1
+        self._running_by_client[client] -= 1
+        if not self._running_by_client[client]:
+            del self._running_by_client[client]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the oldest waiters that fit."""
+        if not self._queue or self._running >= self.max_concurrency:
+            return
+        for waiter in list(self._queue):
+            if self._running >= self.max_concurrency:
+                break
+            if self._fits(waiter.tool, waiter.client):
+                self._dequeue(waiter)
+                self._take(waiter.tool, waiter.client)
+                waiter.future.set_result(None)
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        self._queue.remove(waiter)
+        self._queued_by_client[waiter.client] -= 1
+        if not self._queued_by_client[waiter.client]:
+            del self._queued_by_client[waiter.client]
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Drop a waiter that gave up, returning its slot if one was handed over meanwhile."""
+        if waiter.future.done():
+            self._release(waiter.tool, waiter.client)
+        else:
+            waiter.future.cancel()
+            self._dequeue(waiter)
+
+    def _record_duration(self, tool: str, seconds: float) -> None:
+        previous = self._durations.get(tool)
+        self._durations[tool] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Process-wide admission controller; None when ADMISSION is off."""
+    global _admission
+    if _admission is None and os.getenv("ADMISSION", "true").lower() == "true":
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController(
+                    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32")),
+                    client_max_concurrency=int(os.getenv("ADMISSION_CLIENT_MAX_CONCURRENCY", "8")),
+                    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+                    client_max_queue=int(os.getenv("ADMISSION_CLIENT_MAX_QUEUE", "16")),
+                    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "20")),
+                )
+    return _admission
+
+
+def _admission_queue() -> Dict[Tuple[str, ...], float]:
+    controller = _admission
+    if controller is None:
+        return {}
+    return {(tool,): count for tool, count in controller.queued_by_tool().items()}
+
+
+def _admission_running() -> Dict[Tuple[str, ...], float]:
+    controller = _admission
+    if controller is None:
+        return {}
+    return {(tool,): count for tool, count in list(controller._running_by_tool.items())}
+
+
+gauge("admission_queue_depth", "Tool calls waiting for an admission slot", ("tool",), function=_admission_queue)
+gauge("admission_running", "Tool calls holding an admission slot", ("tool",), function=_admission_running)
@@ -0,0 +1,424 @@
+"""
+Shared backend client - one pooled httpx client per process for the backend agent API
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from tools.utils.deadline import DeadlineExceeded, deadline_headers, deadline_passed, outbound_timeout
+from tools.utils.fast_json import loads
+from tools.utils.metrics import BACKEND_DURATION, BACKEND_IN_FLIGHT, BACKEND_WASTED, gauge, pool_usage
+from tools.utils.retry import classify_http, get_retry_engine, host_of, non_idempotent
+from tools.utils.tracing import TRACEPARENT_HEADER, get_tracer
+
+# Backend endpoints called by the proxy tools
+ENDPOINTS = {
+    "research": "/api/v1/agents/research",
+    "copywriter": "/api/v1/agents/copywriter",
+}
+
+# Default read timeouts per endpoint (seconds), overridable via BACKEND_<NAME>_TIMEOUT
+DEFAULT_TIMEOUTS = {
+    "research": 60.0,
+    "copywriter": 45.0,
+}
+
+
+# Asked of the backend when streaming; a plain JSON answer is handled the same way
+STREAM_ACCEPT = "text/event-stream, application/json"
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _classifier(idempotent: bool):
+    return classify_http if idempotent else non_idempotent(classify_http)
+
+
+class BackendClient:
+    """
+    Long-lived connection pool to BACKEND_API_URL.
+    Keeps TCP/TLS connections alive between tool calls instead of paying
+    a fresh handshake on every request.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        http2: Optional[bool] = None,
+    ):
+        self.base_url = (base_url or os.getenv("BACKEND_API_URL", "http://localhost:8000")).rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("BACKEND_API_KEY", "")
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections or _env_int("BACKEND_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=max_keepalive_connections or _env_int("BACKEND_MAX_KEEPALIVE", 20),
+            keepalive_expiry=keepalive_expiry or _env_float("BACKEND_KEEPALIVE_EXPIRY", 30.0),
+        )
+        self.connect_timeout = connect_timeout or _env_float("BACKEND_CONNECT_TIMEOUT", 5.0)
+
+        if http2 is None:
+            http2 = _env_bool("BACKEND_HTTP2", True)
+        self.http2 = http2 and _http2_available()
+
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def url_for(self, endpoint: str) -> str:
+        """Full URL for a named endpoint ('research', 'copywriter')."""
+        return f"{self.base_url}{ENDPOINTS[endpoint]}"
+
+    def timeout_for(self, endpoint: str) -> httpx.Timeout:
+        """Per-endpoint timeout: short connect, endpoint-specific read."""
+        read = _env_float(f"BACKEND_{endpoint.upper()}_TIMEOUT", DEFAULT_TIMEOUTS.get(endpoint, 30.0))
+        return httpx.Timeout(read, connect=self.connect_timeout)
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        headers=self.headers,
+                        limits=self.limits,
+                        http2=self.http2,
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Async pool for tools running on the server's event loop."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = httpx.AsyncClient(
+                        headers=self.headers,
+                        limits=self.limits,
+                        http2=self.http2,
+                    )
+        return self._async_client
+
+    def _timeout(self, endpoint: str, timeout: Optional[float]) -> httpx.Timeout:
+        """The call's timeout, cut down to the client's deadline; raises DeadlineExceeded once it has passed."""
+        read = outbound_timeout(timeout or self.timeout_for(endpoint).read)
+        return httpx.Timeout(read, connect=min(self.connect_timeout, read))
+
+    @staticmethod
+    def _body(payload: Optional[Dict[str, Any]], content: Optional[bytes]) -> Dict[str, Any]:
+        return {"content": content} if content is not None else {"json": payload}
+
+    def _start_span(self, endpoint: str) -> Tuple[Any, Dict[str, str]]:
+        """Client span for one attempt, and the headers that carry it and the client's deadline to the backend."""
+        url = self.url_for(endpoint)
+        span = get_tracer().start_span(f"POST {ENDPOINTS[endpoint]}", kind="client", attributes={
+            "http.request.method": "POST",
+            "url.full": url,
+            "server.address": host_of(url),
+            "backend.endpoint": endpoint,
+        })
+        headers = deadline_headers()
+        if span.recording:
+            headers[TRACEPARENT_HEADER] = span.traceparent
+        return span, headers
+
+    @staticmethod
+    def _record(endpoint: str, started: float, outcome: Any, span: Any) -> None:
+        """Observe one backend attempt: its HTTP status, or the exception class if it failed."""
+        if isinstance(outcome, httpx.Response):
+            status = outcome.status_code
+            span.set_attribute("http.response.status_code", status)
+            if status >= 400:
+                span.set_status("ERROR", f"HTTP {status}")
+        else:
+            status = type(outcome).__name__
+            span.record_exception(outcome)
+        span.end()
+        elapsed = time.perf_counter() - started
+        BACKEND_DURATION.observe(elapsed, endpoint=ENDPOINTS[endpoint], status=status)
+        wasted = _wasted(outcome)
+        if wasted:
+            BACKEND_WASTED.inc(elapsed, endpoint=ENDPOINTS[endpoint], reason=wasted)
+
+    def post(self, endpoint: str, payload: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+             content: Optional[bytes] = None, idempotent: bool = False) -> httpx.Response:
+        """
+        POST a JSON payload (or pre-encoded JSON `content`) to a named backend endpoint.
+        Backend runs aren't safe to repeat, so by default only failures where the
+        backend certainly didn't start (429, 503 with Retry-After, no connection)
+        are retried; idempotent=True also retries 5xx and dropped connections.
+        Raises CircuitOpenError while the backend is considered unhealthy.
+        """
+        url = self.url_for(endpoint)
+        body = self._body(payload, content)
+
+        def attempt() -> httpx.Response:
+            request_timeout = self._timeout(endpoint, timeout)
+            started = time.perf_counter()
+            span, headers = self._start_span(endpoint)
+            with BACKEND_IN_FLIGHT.track(endpoint=ENDPOINTS[endpoint]):
+                try:
+                    response = self.client.post(url, headers=headers, timeout=request_timeout, **body)
+                except Exception as e:
+                    self._record(endpoint, started, e, span)
+                    _raise_for_deadline(e)
+                    raise
+            self._record(endpoint, started, response, span)
+            return response
+
+        return get_retry_engine().call(host_of(url), attempt, _classifier(idempotent))
+
+    async def apost(self, endpoint: str, payload: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                    content: Optional[bytes] = None, idempotent: bool = False) -> httpx.Response:
+        """Async variant of post(); awaits the backend without holding a worker thread."""
+        url = self.url_for(endpoint)
+        body = self._body(payload, content)
+
+        async def attempt() -> httpx.Response:
+            request_timeout = self._timeout(endpoint, timeout)
+            started = time.perf_counter()
+            span, headers = self._start_span(endpoint)
+            with BACKEND_IN_FLIGHT.track(endpoint=ENDPOINTS[endpoint]):
+                try:
+                    response = await self.async_client.post(url, headers=headers, timeout=request_timeout, **body)
+                except BaseException as e:
+                    self._record(endpoint, started, e, span)
+                    _raise_for_deadline(e)
+                    raise
+            self._record(endpoint, started, response, span)
+            return response
+
+        return await get_retry_engine().acall(host_of(url), attempt, _classifier(idempotent))
+
+    async def astream(
+        self,
+        endpoint: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        content: Optional[bytes] = None,
+        on_event: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+        idempotent: bool = False,
+    ) -> httpx.Response:
+        """
+        POST asking the backend to stream its answer as server-sent events.
+
+        `progress`/`delta` events are passed to on_event as they arrive; the
+        `result` event (or a plain JSON body from a non-streaming backend) comes
+        back as the returned Response, so callers handle both the same way.
+        Retries only happen before the stream starts, under the same rules as
+        post(). If the caller is cancelled,
+        the upstream connection is closed, which stops the backend run.
+        """
+        if not _env_bool("BACKEND_STREAMING", True):
+            return await self.apost(endpoint, payload, timeout=timeout, content=content, idempotent=idempotent)
+
+        url = self.url_for(endpoint)
+        body = self._body(payload, content)
+        path = ENDPOINTS[endpoint]
+        started, span = 0.0, None
+
+        async def attempt() -> httpx.Response:
+            nonlocal started, span
+            request_timeout = self._timeout(endpoint, timeout)
+            started = time.perf_counter()
+            span, headers = self._start_span(endpoint)
+            request = self.async_client.build_request(
+                "POST", url, headers={"Accept": STREAM_ACCEPT, **headers}, timeout=request_timeout, **body
+            )
+            BACKEND_IN_FLIGHT.inc(endpoint=path)
+            try:
+                response = await self.async_client.send(request, stream=True)
+            except BaseException as e:
+                BACKEND_IN_FLIGHT.dec(endpoint=path)
+                self._record(endpoint, started, e, span)
+                _raise_for_deadline(e)
+                raise
+            if response.status_code != 200 or not _is_event_stream(response):
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+                    BACKEND_IN_FLIGHT.dec(endpoint=path)
+                self._record(endpoint, started, response, span)
+            return response
+
+        response = await get_retry_engine().acall(host_of(url), attempt, _classifier(idempotent))
+        if response.is_closed:
+            return response
+
+        # The streamed attempt stays in flight until its result (or failure) arrives
+        outcome: Any = None
+        span.set_attribute("backend.streamed", True)
+        try:
+            async for event, data in iter_sse_events(response):
+                if event == "result":
+                    outcome = _synthetic_response(response, 200, data)
+                    return outcome
+                if event == "error":
+                    error = _parse_json(data)
+                    status = error.get("status_code", 502) if isinstance(error, dict) else 502
+                    outcome = _synthetic_response(response, status, data)
+                    return outcome
+                if on_event is not None:
+                    await on_event(event, _parse_json(data))
+            outcome = _synthetic_response(response, 502, "Backend stream ended without a result")
+            return outcome
+        except BaseException as e:
+            outcome = e
+            _raise_for_deadline(e)
+            raise
+        finally:
+            await response.aclose()
+            BACKEND_IN_FLIGHT.dec(endpoint=path)
+            self._record(endpoint, started, outcome, span)
+
+    def close(self) -> None:
+        """Close the sync pool and drop the async pool (its event loop may be gone)."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._async_client = None
+
+    async def aclose(self) -> None:
+        """Close both pools from within the running event loop."""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.aclose()
+        self.close()
+
+
+def _wasted(outcome: Any) -> Optional[str]:
+    """Why the backend's work on an attempt went unused, if it did."""
+    if isinstance(outcome, asyncio.CancelledError):
+        # The caller stopped waiting: its client disconnected or its deadline passed
+        return "deadline" if deadline_passed() else "cancelled"
+    if isinstance(outcome, httpx.ReadTimeout):
+        return "deadline" if deadline_passed() else "timeout"
+    if isinstance(outcome, httpx.Response) and deadline_passed():
+        return "late"
+    return None
+
+
+def _raise_for_deadline(error: BaseException) -> None:
+    """A timeout cut short by the client's deadline is the caller's, not a backend failure for the circuit breaker."""
+    if isinstance(error, httpx.TimeoutException) and deadline_passed():
+        raise DeadlineExceeded("The client's deadline passed while waiting for the backend") from error
+
+
+def _is_event_stream(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith("text/event-stream")
+
+
+def _parse_json(data: str) -> Any:
+    try:
+        return loads(data)
+    except ValueError:
+        return data
+
+
+def _synthetic_response(stream: httpx.Response, status_code: int, body: str) -> httpx.Response:
+    """A complete Response carrying a streamed result or error."""
+    return httpx.Response(
+        status_code,
+        content=body.encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        request=stream.request,
+    )
+
+
+async def iter_sse_events(response: httpx.Response) -> AsyncIterator[Tuple[str, str]]:
+    """Parse a text/event-stream body into (event, data) pairs."""
+    event, data = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data:
+        yield event, "\n".join(data)
+
+
+_backend_client: Optional[BackendClient] = None
+_backend_lock = threading.Lock()
+
+
+def _backend_pool_usage() -> Dict[Tuple[str, ...], float]:
+    client = _backend_client
+    if client is None or client._async_client is None:
+        return {}
+    return pool_usage(client._async_client)
+
+
+gauge("backend_pool_connections", "Connections in the async backend pool by state", ("state",),
+      function=_backend_pool_usage)
+
+
+def get_backend_client() -> BackendClient:
+    """Process-wide backend client shared by all proxy tools."""
+    global _backend_client
+    if _backend_client is None:
+        with _backend_lock:
+            if _backend_client is None:
+                _backend_client = BackendClient()
+    return _backend_client
+
+
+def close_backend_client() -> None:
+    """Close pooled connections. Called when the server shuts down."""
+    global _backend_client
+    with _backend_lock:
+        client, _backend_client = _backend_client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_backend_client() -> None:
+    """Close pooled connections from the server's event loop."""
+    global _backend_client
+    with _backend_lock:
+        client, _backend_client = _backend_client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,173 @@
+"""
+Command parser - single-pass tokenizer and typed validation for /create-content-post commands
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Tokens, in one findall: key:"quoted value", key:bare_value, key: (no value) or stray text (all groups
+# empty). Quoted values allow \" and \\ escapes; the closing-quote group is empty when it is missing.
+# Stray text stops before a key, so a parameter glued to punctuation (x,topic:"AI") still parses.
+_TOKEN = re.compile(r'(\w+):(?:(")([^"\\]*(?:\\.[^"\\]*)*)("?)|([^\s"]\S*))?|[^\s\w]+|\w+(?!:)', re.S)
+_ESCAPE = re.compile(r'\\(["\\])')
+
+# lookups entry of parameters outside the schema
+_UNKNOWN = object()
+
+_BOOLEANS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+_RELATIVE = re.compile(r"\+(\d+(?:\.\d+)?)([smhd])")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_time(value: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    An ISO 8601 time (UTC unless it carries an offset) or a relative one such
+    as +30m, +2h, +1d. Returns an aware UTC datetime, or None if unreadable.
+    """
+    relative = _RELATIVE.fullmatch(value.strip())
+    if relative:
+        offset = float(relative.group(1)) * _UNITS[relative.group(2)]
+        return (now or datetime.now(timezone.utc)) + timedelta(seconds=offset)
+    try:
+        moment = datetime.fromisoformat(value.strip().upper().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def format_time(moment: datetime) -> str:
+    """UTC ISO 8601 with a Z suffix, as echoed back to clients."""
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _time_value(value: str) -> Optional[str]:
+    moment = parse_time(value)
+    return format_time(moment) if moment is not None else None
+
+
+class CommandParseError(ValueError):
+    """The command is not a valid /create-content-post command."""
+
+
+class Param:
+    """
+    One typed command parameter: 'str', 'bool', 'choice' (matched
+    case-insensitively and returned in its canonical spelling) or 'time'
+    (see parse_time; returned as UTC ISO 8601).
+    """
+
+    def __init__(self, name: str, kind: str = "str", choices: Tuple[str, ...] = (), default: Any = None,
+                 required: bool = False):
+        self.name = name
+        self.kind = kind
+        self.choices = choices
+        self.default = default
+        self.required = required
+
+    def lookup(self) -> Optional[Tuple[Callable[[str], Any], str]]:
+        """(converter of the lowercased input returning None if invalid, error message); None for strings."""
+        if self.kind == "bool":
+            return _BOOLEANS.get, f"Invalid {self.name}. Must be true or false"
+        if self.kind == "choice":
+            return ({choice.lower(): choice for choice in self.choices}.get,
+                    f"Invalid {self.name}. Must be one of: {', '.join(self.choices)}")
+        if self.kind == "time":
+            return _time_value, f"Invalid {self.name}. Use an ISO 8601 time or +30m / +2h / +1d"
+        return None
+
+
+class CommandParser:
+    """
+    Parser for one command and its parameter schema, built once and reused.
+    Parameters are tokenized, converted and validated in a single pass over
+    the command; parameters outside the schema are passed through, with
+    'true'/'false' read as booleans.
+    """
+
+    def __init__(self, command: str, params: Iterable[Param]):
+        self.command = command
+        self.params = {param.name: param for param in params}
+        # Everything the hot loop needs, precomputed as plain dict lookups
+        self._lookups = {name: param.lookup() for name, param in self.params.items()}
+        self._defaults = {name: param.default for name, param in self.params.items()
+                          if not param.required and param.default is not None}
+        self._required = [name for name, param in self.params.items() if param.required]
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        """Parameters of one command; raises CommandParseError if it is invalid."""
+        command = self.command
+        start = 0 if text.startswith(command) else len(text) - len(text.lstrip())
+        end = start + len(command)
+        # The command must lead, followed by whitespace or nothing (not e.g. /create-content-posts)
+        if not text.startswith(command, start) or (end < len(text) and not text[end].isspace()):
+            raise CommandParseError(f"Invalid command. Only {command} is supported")
+
+        params = self._defaults.copy()
+        lookups = self._lookups
+        for key, opened, quoted, closed, bare in _TOKEN.findall(text, end):
+            if not key:
+                # Free text between parameters is ignored
+                continue
+            if opened:
+                if not closed:
+                    raise CommandParseError(f"Unterminated quote in parameter {key}")
+                value = _ESCAPE.sub(r"\1", quoted) if "\\" in quoted else quoted
+            elif bare:
+                value = bare
+            else:
+                raise CommandParseError(f"Missing value for parameter {key}")
+
+            lookup = lookups.get(key, _UNKNOWN)
+            if lookup is None:
+                params[key] = value
+            elif lookup is not _UNKNOWN:
+                converted = lookup[0](value.lower())
+                if converted is None:
+                    raise CommandParseError(lookup[1])
+                params[key] = converted
+            elif value.lower() in ("true", "false"):
+                params[key] = value.lower() == "true"
+            else:
+                params[key] = value
+
+        for name in self._required:
+            if not params.get(name):
+                raise CommandParseError(f"Missing required parameter: {name}")
+        return params
+
+    def result(self, text: str) -> Dict[str, Any]:
+        """CommandProcessor's response for one command."""
+        try:
+            params = self.parse(text)
+        except CommandParseError as e:
+            return {"error": str(e), "status": "error"}
+        result = {
+            "status": "success",
+            "command": self.command,
+            "parameters": params,
+            "execution_mode": "instant"
+        }
+        if params.get("schedule"):
+            result["execution_mode"] = "scheduled"
+            result["scheduled_for"] = params["schedule"]
+        return result
+
+    def parse_many(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """Responses for many commands (e.g. a bulk import), in order; one bad command doesn't fail the rest."""
+        result = self.result
+        return [result(text) for text in texts]
+
+
+CREATE_CONTENT_POST = CommandParser("/create-content-post", (
+    Param("topic", required=True),
+    Param("platform", "choice", choices=("Twitter", "LinkedIn", "Instagram"), default="Twitter"),
+    Param("tone", "choice", choices=("professional", "casual", "humorous", "educational"), default="professional"),
+    Param("include_hashtags", "bool", default=True),
+    Param("additional_context"),
+    Param("additional_requirements"),
+    Param("schedule", "time"),
+))
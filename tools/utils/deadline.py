@@ -0,0 +1,135 @@
+"""
+Deadlines - how long a tool call's client is still waiting, and whether it is still connected, carried
+through contextvars to every outbound call made for it
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import time
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Sent to the backend with the milliseconds left before the client gives up
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# Absolute deadline on the time.monotonic() clock
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+# Set once the client connection the call arrived on is gone
+_disconnected: contextvars.ContextVar[Optional[asyncio.Event]] = contextvars.ContextVar(
+    "client_disconnected", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """The client's deadline passed before the call could be made or finished."""
+
+
+class ClientGone(Exception):
+    """The tool call was abandoned: its client disconnected or its deadline passed."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Tool call abandoned ({reason})")
+        self.reason = reason
+
+
+def deadline_from_meta(meta: Dict[str, Any]) -> Optional[float]:
+    """
+    Seconds the client is still waiting, from a tool call's _meta: 'timeout'
+    (seconds from now) or 'deadline' (Unix time). None if neither is usable.
+    """
+    try:
+        if meta.get("timeout") is not None:
+            return float(meta["timeout"])
+        if meta.get("deadline") is not None:
+            return float(meta["deadline"]) - time.time()
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline `seconds` from now, never later than an enclosing one."""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current call's deadline (negative once passed), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_passed() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def outbound_timeout(configured: float) -> float:
+    """The configured timeout cut down to the time left; raises DeadlineExceeded if none is left."""
+    left = remaining()
+    if left is None:
+        return configured
+    if left <= 0:
+        raise DeadlineExceeded("The client's deadline has passed")
+    return min(configured, left)
+
+
+def deadline_headers() -> Dict[str, str]:
+    """Headers telling an upstream how long the client is still waiting."""
+    left = remaining()
+    return {DEADLINE_HEADER: str(max(0, int(left * 1000)))} if left is not None else {}
+
+
+def bind_connection(disconnected: asyncio.Event) -> contextvars.Token:
+    """Make `disconnected` the disconnect signal for every task started from this context."""
+    return _disconnected.set(disconnected)
+
+
+def unbind_connection(token: contextvars.Token) -> None:
+    _disconnected.reset(token)
+
+
+async def run_for_client(call: Awaitable[T]) -> T:
+    """
+    Await a tool call while its client is still there: it is cancelled as soon
+    as the client disconnects or its deadline passes, and ClientGone is raised.
+    Cancellation reaches the upstream calls it is awaiting, which close their
+    connections.
+    """
+    disconnected = _disconnected.get()
+    left = remaining()
+    if disconnected is None and left is None:
+        return await call
+
+    task = asyncio.ensure_future(call)
+    waiters = {task}
+    watcher = asyncio.ensure_future(disconnected.wait()) if disconnected is not None else None
+    if watcher is not None:
+        waiters.add(watcher)
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=max(left, 0) if left is not None else None,
+                                     return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+    raise ClientGone("disconnected" if disconnected is not None and disconnected.is_set() else "deadline")
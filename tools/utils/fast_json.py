@@ -0,0 +1,68 @@
+"""
+Fast JSON - orjson-backed encoding and decoding with a stdlib fallback, and partial decoding of backend responses
+"""
+
+import json
+from typing import Any, Dict, Iterable, Union
+
+import httpx
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Which encoder is in use (reported by the JSON benchmark)
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps_bytes(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    Compact UTF-8 JSON. Values orjson can't encode (integers beyond 64 bits,
+    non-string keys) go through the stdlib encoder, which raises as before
+    if they can't be encoded at all.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            pass
+    return json.dumps(value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(value: Any, sort_keys: bool = False) -> str:
+    """Compact JSON text, e.g. a tool response."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode JSON text or UTF-8 bytes; raises ValueError if it is invalid."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def loads_fields(data: Union[str, bytes], fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Only the named top-level fields of a JSON object (missing ones are left
+    out), so the rest of the document is dropped as soon as it is decoded.
+    Anything other than an object decodes to an empty dict.
+    """
+    document = loads(data)
+    if not isinstance(document, dict):
+        return {}
+    return {field: document[field] for field in fields if field in document}
+
+
+def response_fields(response: httpx.Response, fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    The named top-level fields of a JSON response body. orjson parses the body
+    bytes directly; response.json() goes through the stdlib decoder, which
+    first copies the whole body into a str.
+    """
+    return loads_fields(response.content, fields)
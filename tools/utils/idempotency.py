@@ -0,0 +1,116 @@
+"""
+Idempotency - collapse duplicate tool calls (same tool, task_id and arguments) onto one execution
+and replay its result for a short while
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from tools.utils.fast_json import dumps_bytes
+from tools.utils.metrics import counter
+from tools.utils.research_cache import ResearchCache, SingleFlight
+
+# Actions that only read, so repeating them must return fresh data
+READ_ONLY_ACTIONS = {"get", "query", "list"}
+
+# Tools that read state on every call
+READ_ONLY_TOOLS = {"AgentJobStatus", "TestTool", "CommandProcessor"}
+
+# Actions that make a new record and so have no task_id yet; they are keyed by their arguments alone
+CREATE_ACTIONS = {"create", "bulk_create"}
+
+# Result statuses worth replaying; failures are retried for real
+REPLAYED_STATUSES = ("success", "accepted")
+
+IDEMPOTENT_CALLS = counter("idempotent_calls", "Tool calls with an idempotency key, by how they were answered: "
+                           "executed, attached to an identical call in flight, or replayed", ("tool", "outcome"))
+
+
+def idempotency_key(tool: str, arguments: Dict[str, Any], client_key: Optional[str] = None) -> Optional[str]:
+    """
+    Key under which duplicates of a call are collapsed: the client's own key
+    (from _meta) when given, else the task_id plus a hash of the arguments.
+    None for calls that only read, or that carry no task_id and create nothing.
+    """
+    if tool in READ_ONLY_TOOLS or arguments.get("action") in READ_ONLY_ACTIONS:
+        return None
+    if client_key:
+        return f"{tool}:key:{client_key}"
+    task_id = arguments.get("task_id")
+    if not task_id and arguments.get("action") not in CREATE_ACTIONS:
+        return None
+    digest = hashlib.sha256(dumps_bytes({"tool": tool, "arguments": arguments}, sort_keys=True)).hexdigest()
+    return f"{tool}:{task_id or 'new'}:{digest[:32]}"
+
+
+class IdempotencyStore:
+    """
+    Runs each keyed call once. A duplicate that arrives while the call is in
+    flight waits for it and shares its result (if the leading call is cancelled,
+    a waiting duplicate takes over). Successful results are kept for the TTL and
+    replayed to later duplicates; failed ones are not, so a retry runs again.
+
+    Writes to one task are ordered: each task_id has a generation that changes
+    whenever a call with a different key runs for it, and results are stored
+    per generation. So in update A, update B, update A the second A runs again
+    instead of replaying the first, which B has since overwritten.
+    In-flight sharing is per worker; stored results and generations are shared
+    between workers through the shared state backend.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self._results = ResearchCache(ttl=ttl, max_bytes=max_bytes, db_path="", namespace="idempotency")
+        self._flight = SingleFlight()
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]],
+                  replayable: Callable[[Any], Optional[str]],
+                  task_id: Optional[str] = None) -> Tuple[Any, Optional[str], str]:
+        """
+        Returns (result, stored text, outcome). `replayable` gives the text to
+        store for a result, or None if it shouldn't be replayed; a replay
+        returns (None, stored text, "replayed").
+        """
+        if task_id:
+            key = f"{key}#{self._generation(task_id, key)}"
+        stored = self._results.get(key)
+        if stored is not None:
+            return None, stored["text"], "replayed"
+
+        async def execute() -> Tuple[Any, Optional[str]]:
+            result = await call()
+            text = replayable(result)
+            if text is not None:
+                self._results.set(key, {"text": text})
+            return result, text
+
+        (result, text), shared = await self._flight.do(key, execute)
+        return result, text, "attached" if shared else "executed"
+
+    def _generation(self, task_id: str, key: str) -> str:
+        """The task's current generation, starting a new one unless its last write had this same key."""
+        state = self._results.get(f"task:{task_id}")
+        if state is None or state["key"] != key:
+            # A fresh token rather than a counter, so a forgotten task can't reuse an old generation
+            state = {"key": key, "generation": uuid.uuid4().hex[:12]}
+        self._results.set(f"task:{task_id}", state)
+        return state["generation"]
+
+
+_idempotency: Optional[IdempotencyStore] = None
+_idempotency_lock = threading.Lock()
+
+
+def get_idempotency_store() -> Optional[IdempotencyStore]:
+    """Process-wide idempotency store; None when IDEMPOTENCY is off."""
+    global _idempotency
+    if _idempotency is None and os.getenv("IDEMPOTENCY", "true").lower() == "true":
+        with _idempotency_lock:
+            if _idempotency is None:
+                _idempotency = IdempotencyStore(
+                    ttl=float(os.getenv("IDEMPOTENCY_TTL", "600")),
+                    max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(16 * 1024 * 1024))),
+                )
+    return _idempotency
@@ -0,0 +1,288 @@
+"""
+Background jobs - run long backend calls outside the MCP request and keep their results locally
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from tools.utils.fast_json import dumps, loads
+from tools.utils.metrics import gauge
+from tools.utils.shared_state import worker_slot
+from tools.utils.storage import connect_sqlite, data_path
+from tools.utils.tracing import get_tracer
+
+# Job kind -> coroutine factory taking the tool parameters
+JobHandler = Callable[[Dict[str, Any]], Awaitable[str]]
+
+# Called with (job record) once a job finishes; used to write results to Notion
+CompletionHook = Callable[[Dict[str, Any]], Awaitable[None]]
+
+FINISHED = ("succeeded", "failed")
+
+_handlers: Dict[str, JobHandler] = {}
+_completion_hooks: Dict[str, CompletionHook] = {}
+
+
+def register_job_kind(kind: str, handler: JobHandler, on_complete: Optional[CompletionHook] = None) -> None:
+    """Register how to run (and optionally post-process) jobs of a kind."""
+    _handlers[kind] = handler
+    if on_complete is not None:
+        _completion_hooks[kind] = on_complete
+
+
+class JobQueueFullError(Exception):
+    """Too many jobs are already waiting to run."""
+
+
+class JobStore:
+    """
+    SQLite-backed job records, so results outlive the request (and the process).
+    Worker processes share the file; each job is owned by the worker slot that
+    runs it, and only that slot resumes it after a restart.
+    """
+
+    COLUMNS = ("job_id", "kind", "status", "params", "task_id", "result", "error",
+               "created_at", "started_at", "finished_at", "owner")
+
+    def __init__(self, path: str, owner: int = 0):
+        self.owner = owner
+        self._db = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "task_id TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "owner INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def create(self, kind: str, params: Dict[str, Any], task_id: Optional[str]) -> Dict[str, Any]:
+        job = {
+            "job_id": uuid.uuid4().hex, "kind": kind, "status": "queued", "params": params,
+            "task_id": task_id, "result": None, "error": None,
+            "created_at": time.time(), "started_at": None, "finished_at": None, "owner": self.owner,
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, task_id, created_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], kind, "queued", dumps(params), task_id, job["created_at"], self.owner),
+            )
+        return job
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["params"] = loads(job["params"])
+        return job
+
+    def unfinished(self) -> list:
+        """Queued or running jobs owned by this worker slot."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id FROM jobs WHERE status IN ('queued', 'running') AND owner = ? ORDER BY created_at",
+                (self.owner,),
+            ).fetchall()
+        return [self.get(job_id) for (job_id,) in rows]
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (time.time() - older_than,),
+            )
+
+
+class JobRunner:
+    """
+    Bounded worker pool on the server's event loop. At most `max_workers` jobs
+    run at once; up to `max_queued` more wait for a slot, beyond that submits
+    are rejected.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int, max_queued: int, retention: float):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, kind: str, params: Dict[str, Any], task_id: Optional[str] = None) -> Dict[str, Any]:
+        """Record a job and schedule it; returns the job record immediately."""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if len(self._tasks) >= self.max_workers + self.max_queued:
+            raise JobQueueFullError(f"Job queue is full ({len(self._tasks)} jobs pending)")
+        job = self.store.create(kind, params, task_id)
+        self._schedule(job)
+        return job
+
+    def resume_unfinished(self) -> int:
+        """Re-queue jobs that were queued or running when the process last stopped."""
+        self.store.purge(self.retention)
+        jobs = [job for job in self.store.unfinished() if job["kind"] in _handlers]
+        for job in jobs:
+            self.store.update(job["job_id"], status="queued", started_at=None)
+            self._schedule(job)
+        return len(jobs)
+
+    def _schedule(self, job: Dict[str, Any]) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        self._done[job["job_id"]] = asyncio.Event()
+        # A fresh context detaches the job from the submitting request (its MCP
+        # context, deadlines) so it keeps running after that request ends
+        task = asyncio.get_running_loop().create_task(self._run(job), context=contextvars.Context())
+        self._tasks[job["job_id"]] = task
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        try:
+            with get_tracer().span(f"job {job['kind']}", attributes={
+                "job.id": job_id, "job.kind": job["kind"], "task_id": job.get("task_id"),
+            }) as span:
+                await self._execute(job, span)
+        finally:
+            self._tasks.pop(job_id, None)
+            event = self._done.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def _execute(self, job: Dict[str, Any], span: Any) -> None:
+        job_id = job["job_id"]
+        async with self._slots:
+            started = time.time()
+            span.set_attribute("job.queued_ms", round((started - job["created_at"]) * 1000, 1))
+            self.store.update(job_id, status="running", started_at=started)
+            try:
+                result = await _handlers[job["kind"]](job["params"])
+                succeeded = loads(result).get("status") in ("success", "partial")
+                fields = {"result": result, "error": None if succeeded else "Job finished with an error result"}
+            except Exception as e:
+                succeeded, fields = False, {"result": None, "error": str(e)}
+                span.record_exception(e)
+
+            status = "succeeded" if succeeded else "failed"
+            span.set_attribute("job.status", status)
+            self.store.update(job_id, status=status, finished_at=time.time(), **fields)
+
+        hook = _completion_hooks.get(job["kind"])
+        if hook is not None and job.get("task_id"):
+            try:
+                await hook(self.store.get(job_id))
+            except Exception as e:
+                print(f"Job {job_id} completion hook failed: {e}")
+
+    async def stop(self) -> None:
+        """Cancel unfinished jobs; they stay queued/running in the store and resume on next start."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once finished or when the timeout expires."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            event = self._done.get(job_id)
+            try:
+                # Jobs run by another process have no local event; poll the store instead
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+                else:
+                    await asyncio.sleep(min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+
+_job_runner: Optional[JobRunner] = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Process-wide job runner."""
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                _job_runner = JobRunner(
+                    JobStore(os.getenv("JOB_STORE_DB") or data_path("jobs.db"), owner=worker_slot() or 0),
+                    max_workers=int(os.getenv("JOB_MAX_WORKERS", "8")),
+                    max_queued=int(os.getenv("JOB_MAX_QUEUED", "500")),
+                    retention=float(os.getenv("JOB_RETENTION", "86400")),
+                )
+    return _job_runner
+
+
+def _job_usage() -> Dict[Tuple[str, ...], float]:
+    runner = _job_runner
+    if runner is None:
+        return {}
+    running = min(runner.active, runner.max_workers)
+    return {("running",): running, ("queued",): runner.active - running}
+
+
+gauge("background_jobs", "Background jobs in this process", ("state",), function=_job_usage)
+
+
+def submit_tool_job(kind: str, tool: Any) -> Dict[str, Any]:
+    """Queue a tool's own run as a job; returns the tool response carrying the job handle."""
+    params = tool.model_dump(exclude={"run_as_job"})
+    try:
+        job = get_job_runner().submit(kind, params, task_id=params.get("task_id"))
+    except JobQueueFullError as e:
+        return {"status": "error", "error": str(e), "retry_after": 5}
+    return {
+        "status": "accepted",
+        "job_id": job["job_id"],
+        "job_status": job["status"],
+        "task_id": job["task_id"],
+        "message": "Job queued. Poll AgentJobStatus with this job_id (set wait_seconds to long-poll)."
+    }
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job record as returned to MCP clients."""
+    view = {
+        "job_id": job["job_id"],
+        "kind": job["kind"],
+        "job_status": job["status"],
+        "task_id": job.get("task_id"),
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+    if job.get("result"):
+        view["result"] = loads(job["result"])
+    if job.get("error"):
+        view["error"] = job["error"]
+    return view
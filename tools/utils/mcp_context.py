@@ -0,0 +1,47 @@
+"""
+MCP request context helpers - access the calling client's context from inside a tool run
+"""
+
+from typing import Any, Optional
+
+
+def current_context() -> Optional[Any]:
+    """The FastMCP Context of the tool call being served, or None outside a request."""
+    try:
+        from fastmcp.server.dependencies import get_context
+        return get_context()
+    except (ImportError, RuntimeError):
+        return None
+
+
+class ProgressForwarder:
+    """
+    Relays backend stream events to the MCP client as progress notifications.
+    `progress` events carry the backend's own message; `delta` events carry
+    partial content as the notification message. The progress value is a
+    step counter so it always increases, whatever mix of events arrives.
+    Does nothing when the client didn't ask for progress (no progressToken).
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.context = current_context()
+        self.step = 0
+
+    async def __call__(self, event: str, data: Any) -> None:
+        if event == "delta":
+            message = data.get("text", "") if isinstance(data, dict) else str(data)
+        elif event == "progress":
+            message = data.get("message") if isinstance(data, dict) else str(data)
+            message = message or f"{self.label} in progress"
+        else:
+            return
+
+        if self.context is None:
+            return
+        self.step += 1
+        try:
+            await self.context.report_progress(self.step, None, message)
+        except Exception:
+            # A client that went away mid-stream shouldn't fail the call itself
+            pass
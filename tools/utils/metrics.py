@@ -0,0 +1,247 @@
+"""
+Metrics - counters, gauges and histograms rendered in the Prometheus text format
+"""
+
+import contextlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Latency buckets (seconds) spanning fast local tools up to multi-minute backend runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# (sample name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [("_total", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """A settable gauge, or one read at scrape time from a callback returning {labels tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextlib.contextmanager
+    def track(self, **labels: Any) -> Iterator[None]:
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[Sample]:
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [("", self._labels(key), value) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Observe the block's duration; labels can be filled in inside the block via the yielded dict."""
+        started = time.perf_counter()
+        labels = dict(labels)
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        for key, (counts, total, count) in values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append(("_bucket", dict(labels, le="+Inf"), count))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def collect(self, extra_labels: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """JSON-serializable snapshot of every metric family."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [
+            {
+                "name": metric.name,
+                "kind": metric.kind,
+                "documentation": metric.documentation,
+                "samples": [(suffix, dict(labels, **(extra_labels or {})), value)
+                            for suffix, labels, value in metric.samples()],
+            }
+            for metric in metrics
+        ]
+
+
+def render(families: List[Dict[str, Any]]) -> str:
+    """Prometheus text exposition of collected families; families with the same name are merged."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for family in families:
+        target = merged.setdefault(family["name"], dict(family, samples=[]))
+        target["samples"].extend(family["samples"])
+
+    lines = []
+    for family in merged.values():
+        lines.append(f"# HELP {family['name']} {family['documentation']}")
+        lines.append(f"# TYPE {family['name']} {family['kind']}")
+        for suffix, labels, value in family["samples"]:
+            label_text = ",".join(f'{name}="{_escape(value_)}"' for name, value_ in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{family['name']}{suffix}{label_text} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+          function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def pool_usage(client: Any) -> Dict[Tuple[str, ...], float]:
+    """Active/idle connection counts of an httpx client's pool (empty if it can't be read)."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {("active",): len(connections) - idle, ("idle",): idle}
+
+
+# Tool calls (recorded by the server's tool middleware)
+TOOL_CALLS = counter("mcp_tool_calls", "Tool calls by tool and result status", ("tool", "status"))
+TOOL_ERRORS = counter("mcp_tool_errors", "Failed tool calls by tool and error class", ("tool", "error_class"))
+TOOL_DURATION = histogram("mcp_tool_duration_seconds", "Tool call latency", ("tool",))
+TOOL_IN_FLIGHT = gauge("mcp_tool_calls_in_flight", "Tool calls currently running", ("tool",))
+
+# Upstream backend (per HTTP attempt; streamed answers are timed to the end of the stream)
+BACKEND_DURATION = histogram("backend_request_duration_seconds", "Backend agent API request latency",
+                             ("endpoint", "status"))
+BACKEND_IN_FLIGHT = gauge("backend_requests_in_flight", "Backend agent API requests in progress", ("endpoint",))
+BACKEND_WASTED = counter("backend_wasted_seconds", "Backend time spent on requests whose answer nobody used: "
+                         "cancelled, timed out, or answered after the client's deadline", ("endpoint", "reason"))
+
+# Notion API (per HTTP attempt, excluding time spent waiting for a rate-limit token)
+NOTION_DURATION = histogram("notion_request_duration_seconds", "Notion API request latency",
+                            ("operation", "status"))
+NOTION_RATE_LIMIT_WAIT = histogram("notion_rate_limit_wait_seconds", "Time spent waiting for a Notion rate-limit token")
+NOTION_IN_FLIGHT = gauge("notion_requests_in_flight", "Notion API requests in progress")
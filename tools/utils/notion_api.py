@@ -0,0 +1,383 @@
+"""
+Shared Notion access - one pooled client per process and a cached database schema
+"""
+
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import httpx
+from notion_client import APIResponseError, Client
+from notion_client.errors import RequestTimeoutError
+from notion_client.client import ClientOptions
+
+from tools.utils.metrics import NOTION_DURATION, NOTION_IN_FLIGHT, NOTION_RATE_LIMIT_WAIT, gauge, pool_usage
+from tools.utils.rate_limit import TokenBucket, get_notion_rate_limiter
+from tools.utils.retry import (
+    RETRYABLE_STATUS,
+    Classification,
+    classify_http,
+    get_retry_engine,
+    non_idempotent,
+    parse_retry_after,
+)
+from tools.utils.tracing import get_tracer
+
+NOTION_HOST = "api.notion.com"
+
+# Task fields -> (Notion property, property type) of the task database
+TASK_FIELDS = {
+    "title": ("Name", "title"),
+    "status": ("Status", "select"),
+    "execution_mode": ("Execution Mode", "select"),
+    "command": ("Command Used", "rich_text"),
+    "parameters": ("Parameters", "rich_text"),
+    "description": ("Task Description", "rich_text"),
+    "webhook_url": ("Webhook URL", "url"),
+    "content": ("Content", "rich_text"),
+    "research_data": ("Research Data", "rich_text"),
+    "error": ("Error", "rich_text"),
+}
+
+# Notion caps one rich_text object at 2000 characters and a property at 100 objects
+RICH_TEXT_CHUNK = 2000
+RICH_TEXT_MAX_PARTS = 100
+
+T = TypeVar("T")
+
+
+class NotionSchemaError(ValueError):
+    """Properties don't match the task database schema."""
+
+
+def classify_notion(outcome: Any) -> Classification:
+    """Retry classifier for notion_client errors (falls back to plain httpx rules)."""
+    if isinstance(outcome, APIResponseError):
+        if outcome.status in RETRYABLE_STATUS:
+            headers = getattr(outcome, "headers", None) or {}
+            return True, parse_retry_after(headers.get("retry-after")), True
+        return False, None, False
+    if isinstance(outcome, RequestTimeoutError):
+        # notion_client's wrapper around httpx timeouts
+        return False, None, True
+    return classify_http(outcome)
+
+
+def call_notion(fn: Callable[..., T], *args: Any, rate_limiter: Optional[TokenBucket] = None,
+                idempotent: bool = True, **kwargs: Any) -> T:
+    """
+    Call a notion_client method under the shared rate limit and retry engine.
+    Each attempt (including retries) spends one rate-limit token. Pass
+    idempotent=False for calls that mustn't run twice (pages.create): they are
+    only retried when Notion certainly didn't act on them.
+    """
+    limiter = rate_limiter or get_notion_rate_limiter()
+    operation = _operation_name(fn)
+
+    def attempt():
+        waited = time.perf_counter()
+        limiter.acquire()
+        waited = time.perf_counter() - waited
+        NOTION_RATE_LIMIT_WAIT.observe(waited)
+        with get_tracer().span(f"notion {operation}", kind="client", attributes={
+            "notion.operation": operation,
+            "notion.page_id": kwargs.get("page_id"),
+            "notion.rate_limit_wait_ms": round(waited * 1000, 1),
+            "server.address": NOTION_HOST,
+        }) as span, NOTION_IN_FLIGHT.track(), NOTION_DURATION.time(operation=operation, status="ok") as labels:
+            try:
+                return fn(*args, **kwargs)
+            except APIResponseError as e:
+                labels["status"] = str(e.status)
+                span.set_attribute("http.response.status_code", e.status)
+                raise
+            except Exception as e:
+                labels["status"] = type(e).__name__
+                raise
+
+    return get_retry_engine().call(NOTION_HOST, attempt,
+                                   classify_notion if idempotent else non_idempotent(classify_notion))
+
+
+def _operation_name(fn: Callable[..., Any]) -> str:
+    """Metric label for a notion_client method, e.g. pages.update."""
+    endpoint = getattr(fn, "__self__", None)
+    if endpoint is None:
+        return getattr(fn, "__name__", "call")
+    return f"{type(endpoint).__name__.replace('Endpoint', '').lower()}.{fn.__name__}"
+
+
+class NotionSchema:
+    """
+    Cached property schema (name -> type) of the task database.
+    Fetched once, then refreshed in a background thread once it is older than
+    the TTL, so validation never waits on Notion after the first fetch.
+    """
+
+    # Don't re-fetch on unknown properties more often than this (seconds)
+    MIN_FORCED_REFRESH_INTERVAL = 30.0
+
+    def __init__(self, notion: Client, database_id: str, ttl: Optional[float] = None):
+        self.notion = notion
+        self.database_id = database_id
+        self.ttl = ttl if ttl is not None else float(os.getenv("NOTION_SCHEMA_TTL", "300"))
+
+        self._properties: Optional[Dict[str, str]] = None
+        self._ids: Dict[str, str] = {}
+        # Set when the API version keeps the schema on a data source (queries go there too)
+        self.data_source_id: Optional[str] = None
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        database = call_notion(self.notion.databases.retrieve, database_id=self.database_id)
+        props = database.get("properties")
+        data_source_id = None
+        if props is None and database.get("data_sources"):
+            # Newer Notion API versions keep the schema on the database's data source
+            data_source_id = database["data_sources"][0]["id"]
+            props = call_notion(self.notion.data_sources.retrieve, data_source_id=data_source_id).get("properties", {})
+        return props or {}, data_source_id
+
+    def refresh(self) -> Dict[str, str]:
+        """Fetch the schema now (blocking)."""
+        props, data_source_id = self._fetch()
+        properties = {name: prop.get("type", "") for name, prop in props.items()}
+        with self._lock:
+            self._properties = properties
+            self._ids = {name: prop["id"] for name, prop in props.items() if prop.get("id")}
+            self.data_source_id = data_source_id
+            self._fetched_at = time.monotonic()
+        return properties
+
+    def property_ids(self, names: Iterable[str]) -> Optional[List[str]]:
+        """Notion property IDs for the names (as query filter_properties), or None if any is unknown."""
+        self.properties  # fetch the schema (and IDs) if not done yet
+        ids = [self._ids.get(name) for name in names]
+        return None if None in ids else ids
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def worker():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Notion schema refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=worker, name="notion-schema-refresh", daemon=True).start()
+
+    @property
+    def properties(self) -> Dict[str, str]:
+        if self._properties is None:
+            return self.refresh()
+        if time.monotonic() - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+        return self._properties
+
+    def validate(self, properties: Dict[str, Any]) -> None:
+        """
+        Check property names and value types against the schema locally.
+        Raises NotionSchemaError instead of letting Notion answer with a 400.
+        """
+        if self._properties is None and time.monotonic() - self._failed_at < self.MIN_FORCED_REFRESH_INTERVAL:
+            return
+        try:
+            schema = self.properties
+        except Exception as e:
+            # Without a schema we can't check locally; let Notion validate instead
+            self._failed_at = time.monotonic()
+            print(f"Notion schema unavailable, skipping local validation: {e}")
+            return
+        unknown = [name for name in properties if name not in schema]
+
+        # A column may have been added since the last fetch; re-check once
+        if unknown and time.monotonic() - self._fetched_at > self.MIN_FORCED_REFRESH_INTERVAL:
+            schema = self.refresh()
+            unknown = [name for name in properties if name not in schema]
+
+        if unknown:
+            raise NotionSchemaError(f"Unknown properties for database {self.database_id}: {', '.join(unknown)}")
+
+        for name, value in properties.items():
+            expected = schema[name]
+            if isinstance(value, dict) and expected and expected not in value:
+                raise NotionSchemaError(
+                    f"Property '{name}' is of type '{expected}', got '{', '.join(value) or 'empty'}'"
+                )
+
+
+_notion_client: Optional[Client] = None
+_notion_schema: Optional[NotionSchema] = None
+_notion_lock = threading.Lock()
+
+
+def get_notion_client() -> Client:
+    """Process-wide Notion client over a pooled httpx transport."""
+    global _notion_client
+    if _notion_client is None:
+        with _notion_lock:
+            if _notion_client is None:
+                transport = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("NOTION_MAX_CONNECTIONS", "10")),
+                        max_keepalive_connections=int(os.getenv("NOTION_MAX_CONNECTIONS", "10")),
+                    ),
+                )
+                # The SDK sets its own per-request timeout over the transport's, so configure it there
+                options = {"auth": os.getenv("NOTION_TOKEN"),
+                           "timeout_ms": int(float(os.getenv("NOTION_TIMEOUT", "30")) * 1000)}
+                if os.getenv("NOTION_API_BASE_URL"):
+                    # e.g. a local stand-in for benchmarks
+                    options["base_url"] = os.environ["NOTION_API_BASE_URL"]
+                if "retry" in getattr(ClientOptions, "__dataclass_fields__", {}):
+                    # Retries go through our engine; don't stack the SDK's own on top
+                    options["retry"] = False
+                _notion_client = Client(client=transport, **options)
+    return _notion_client
+
+
+def _notion_pool_usage() -> Dict[Tuple[str, ...], float]:
+    client = _notion_client
+    return pool_usage(client.client) if client is not None else {}
+
+
+gauge("notion_pool_connections", "Connections in the Notion HTTP pool", ("state",), function=_notion_pool_usage)
+
+
+@functools.lru_cache(maxsize=1)
+def get_database_id() -> Optional[str]:
+    return os.getenv("NOTION_DATABASE_ID")
+
+
+def get_database_schema() -> Optional[NotionSchema]:
+    """Cached schema of NOTION_DATABASE_ID, or None when no database is configured."""
+    global _notion_schema
+    database_id = get_database_id()
+    if not database_id:
+        return None
+    if _notion_schema is None:
+        notion = get_notion_client()
+        with _notion_lock:
+            if _notion_schema is None:
+                _notion_schema = NotionSchema(notion, database_id)
+    return _notion_schema
+
+
+def rich_text(value: str) -> List[Dict[str, Any]]:
+    """A rich_text value for long text, split into as many 2000-character parts as Notion allows."""
+    value = value[:RICH_TEXT_CHUNK * RICH_TEXT_MAX_PARTS]
+    return [{"text": {"content": value[i:i + RICH_TEXT_CHUNK]}}
+            for i in range(0, len(value), RICH_TEXT_CHUNK)] or [{"text": {"content": ""}}]
+
+
+def property_value(prop: Optional[Dict[str, Any]]) -> str:
+    """Plain value of a title, rich_text, select or url property; text parts are joined in full."""
+    if not prop:
+        return ""
+    kind = prop.get("type") or next((key for key in ("title", "rich_text", "select", "url") if key in prop), "")
+    value = prop.get(kind)
+    if kind in ("title", "rich_text"):
+        return "".join(part.get("plain_text") or (part.get("text") or {}).get("content", "")
+                       for part in value or [])
+    if kind == "select":
+        return (value or {}).get("name", "")
+    return value if isinstance(value, str) else ""
+
+
+def task_fields(properties: Dict[str, Any]) -> Dict[str, str]:
+    """Task field values present in a page's (or a write's) Notion properties."""
+    return {name: property_value(properties[prop]) for name, (prop, _) in TASK_FIELDS.items() if prop in properties}
+
+
+def _query_target(notion: Client, database_id: str) -> Tuple[Callable[..., Any], Dict[str, str]]:
+    """databases.query on older Notion API versions, else the database's data source."""
+    if hasattr(notion.databases, "query"):
+        return notion.databases.query, {"database_id": database_id}
+    schema = get_database_schema()
+    if schema is not None and schema.database_id == database_id:
+        schema.properties  # the schema fetch also finds the data source
+        data_source_id = schema.data_source_id
+    else:
+        sources = call_notion(notion.databases.retrieve, database_id=database_id).get("data_sources") or []
+        data_source_id = sources[0]["id"] if sources else None
+    return notion.data_sources.query, {"data_source_id": data_source_id or database_id}
+
+
+class DatabaseQuery:
+    """
+    Pages of a database matching `filter`, fetched one cursor page at a time as
+    the caller iterates: nothing is requested ahead, and stopping early skips
+    the remaining pages. Each request takes a rate-limit token.
+
+    has_more and next_cursor are those of the last response. With `limit` the
+    last request asks for only the pages still wanted, so once iteration ends
+    they tell exactly whether more pages match and where to resume.
+    """
+
+    def __init__(self, notion: Client, database_id: str, filter: Optional[Dict[str, Any]] = None,
+                 filter_properties: Optional[List[str]] = None, page_size: int = 100,
+                 sorts: Optional[List[Dict[str, Any]]] = None, start_cursor: Optional[str] = None,
+                 limit: Optional[int] = None):
+        self.has_more = True
+        self.next_cursor = start_cursor
+        self._pages = self._fetch(notion, database_id, filter, filter_properties, page_size, sorts, limit)
+
+    def __iter__(self) -> "DatabaseQuery":
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        return next(self._pages)
+
+    def _fetch(self, notion: Client, database_id: str, filter: Optional[Dict[str, Any]],
+               filter_properties: Optional[List[str]], page_size: int, sorts: Optional[List[Dict[str, Any]]],
+               limit: Optional[int]) -> Iterator[Dict[str, Any]]:
+        query, target = _query_target(notion, database_id)
+        wanted = limit
+        while wanted is None or wanted > 0:
+            kwargs = dict(target, page_size=page_size if wanted is None else min(page_size, wanted))
+            if filter:
+                kwargs["filter"] = filter
+            if filter_properties:
+                kwargs["filter_properties"] = filter_properties
+            if sorts:
+                kwargs["sorts"] = sorts
+            if self.next_cursor:
+                kwargs["start_cursor"] = self.next_cursor
+            response = call_notion(query, **kwargs)
+            results = response.get("results", [])
+            self.next_cursor = response.get("next_cursor")
+            self.has_more = bool(response.get("has_more") and self.next_cursor)
+            yield from results
+            if not self.has_more:
+                return
+            if wanted is not None:
+                wanted -= len(results)
+
+
+def iter_database_query(notion: Client, database_id: str, filter: Optional[Dict[str, Any]] = None,
+                        filter_properties: Optional[List[str]] = None, page_size: int = 100,
+                        sorts: Optional[List[Dict[str, Any]]] = None, start_cursor: Optional[str] = None,
+                        limit: Optional[int] = None) -> DatabaseQuery:
+    """Lazily query a database; see DatabaseQuery."""
+    return DatabaseQuery(notion, database_id, filter, filter_properties, page_size, sorts, start_cursor, limit)
+
+
+def close_notion_client() -> None:
+    """Close the pooled Notion transport. Called when the server shuts down."""
+    global _notion_client, _notion_schema
+    with _notion_lock:
+        client, _notion_client = _notion_client, None
+        _notion_schema = None
+    if client is not None:
+        client.close()
@@ -0,0 +1,327 @@
+"""
+Notion mirror - local SQLite copy of the task database, kept current by polling last_edited_time
+and by writing our own changes through, so task reads don't go to Notion
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from notion_client import Client
+
+from tools.utils.metrics import gauge
+from tools.utils.notion_api import TASK_FIELDS, get_database_id, get_notion_client, iter_database_query, task_fields
+from tools.utils.shared_state import worker_slot
+from tools.utils.storage import connect_sqlite, data_path
+
+COLUMNS = ("page_id", "created_time", "last_edited_time", "url", *TASK_FIELDS)
+
+# Notion reports last_edited_time to the minute; re-read this much before the
+# high-water mark so edits made within the same minute are not missed
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def _parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class NotionMirror:
+    """
+    Task pages keyed by page ID, one column per task field (rich text already
+    joined), in a SQLite file shared by the worker processes.
+
+    sync() fetches only pages edited since the last high-water mark, and
+    every `full_sync_interval` re-reads the whole database to drop pages
+    deleted in Notion. Our own writes are applied locally right away
+    (apply_properties) and replaced by the page Notion returns once the write
+    lands (record_page). Rows with local changes still on their way to Notion
+    are not overwritten by polling.
+    """
+
+    def __init__(self, notion: Client, database_id: str, path: str, poll_interval: float,
+                 full_sync_interval: float, max_staleness: float):
+        self.notion = notion
+        self.database_id = database_id
+        self.poll_interval = poll_interval
+        self.full_sync_interval = full_sync_interval
+        self.max_staleness = max_staleness
+
+        self._db = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        field_columns = ", ".join(f"{name} TEXT" for name in TASK_FIELDS)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks (page_id TEXT PRIMARY KEY, created_time TEXT, last_edited_time TEXT, "
+            f"url TEXT, {field_columns}, local_pending INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tasks_execution_mode ON tasks (execution_mode)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # Reads
+
+    def get(self, page_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE page_id = ?", (page_id,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def query(self, filters: Dict[str, List[str]], fields: List[str], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Rows matching every field's values (any of), newest edit first; returns (rows, has_more)."""
+        clauses, args = [], []
+        for name, values in filters.items():
+            clauses.append(f"{name} IN ({', '.join('?' for _ in values)})")
+            args.extend(values)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        columns = ("page_id", "last_edited_time", *fields)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(columns)} FROM tasks {where}ORDER BY last_edited_time DESC LIMIT ?",
+                (*args, limit + 1),
+            ).fetchall()
+        return [dict(zip(columns, row)) for row in rows[:limit]], len(rows) > limit
+
+    @property
+    def ready(self) -> bool:
+        """Whether reads can be served locally: a full sync has completed and polling is recent."""
+        last_sync = self._meta("last_sync_at")
+        return (self._meta("full_sync_at") is not None and last_sync is not None
+                and time.time() - float(last_sync) < self.max_staleness)
+
+    # Writes
+
+    def record_page(self, page: Dict[str, Any], local_id: Optional[str] = None, settled: bool = True) -> None:
+        """
+        Store a page Notion returned for one of our writes. local_id is its
+        provisional ID, if any; unsettled means more of our writes to it are
+        still queued, so only its identity and timestamps are taken.
+        """
+        with self._lock:
+            if local_id:
+                self._db.execute("DELETE FROM tasks WHERE page_id = ? AND EXISTS "
+                                 "(SELECT 1 FROM tasks WHERE page_id = ?)", (local_id, page["id"]))
+                self._db.execute("UPDATE tasks SET page_id = ? WHERE page_id = ?", (page["id"], local_id))
+            if settled:
+                self._upsert_locked([page], force=True)
+            else:
+                self._db.execute(
+                    "UPDATE tasks SET created_time = ?, last_edited_time = ?, url = ? WHERE page_id = ?",
+                    (page.get("created_time", ""), page.get("last_edited_time", ""), page.get("url", ""), page["id"]),
+                )
+
+    def apply_properties(self, page_id: str, properties: Dict[str, Any], create: bool = False) -> None:
+        """Apply a write we are about to send (or have queued) to the local row."""
+        fields = task_fields(properties)
+        if not fields:
+            return
+        names = list(fields)
+        with self._lock:
+            if create:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO tasks (page_id, {', '.join(names)}, local_pending) "
+                    f"VALUES (?, {', '.join('?' for _ in names)}, 1)",
+                    (page_id, *fields.values()),
+                )
+            else:
+                # Pages not mirrored yet are left alone rather than stored half-filled
+                self._db.execute(
+                    f"UPDATE tasks SET {', '.join(f'{name} = ?' for name in names)}, local_pending = 1 "
+                    "WHERE page_id = ?",
+                    (*fields.values(), page_id),
+                )
+
+    def release(self, page_id: str, page: Optional[Dict[str, Any]] = None, provisional: bool = False) -> None:
+        """
+        Drop local changes whose write was given up on: take `page` (Notion's
+        current copy) if given, else delete a provisional row (a create that
+        never landed) or mark a real one as no longer pending, so polling and
+        full syncs overwrite it again.
+        """
+        with self._lock:
+            if page is not None:
+                self._upsert_locked([page], force=True)
+            elif provisional:
+                self._db.execute("DELETE FROM tasks WHERE page_id = ?", (page_id,))
+            else:
+                self._db.execute("UPDATE tasks SET local_pending = 0 WHERE page_id = ?", (page_id,))
+
+    def _upsert_locked(self, pages: Iterable[Dict[str, Any]], force: bool = False) -> int:
+        rows = []
+        for page in pages:
+            if page.get("archived") or page.get("in_trash"):
+                self._db.execute("DELETE FROM tasks WHERE page_id = ?", (page["id"],))
+                continue
+            fields = task_fields(page.get("properties", {}))
+            rows.append((page["id"], page.get("created_time", ""), page.get("last_edited_time", ""),
+                         page.get("url", ""), *(fields.get(name, "") for name in TASK_FIELDS)))
+        if not rows:
+            return 0
+        keep_local = "" if force else " WHERE tasks.local_pending = 0"
+        self._db.executemany(
+            f"INSERT INTO tasks ({', '.join(COLUMNS)}, local_pending) VALUES ({', '.join('?' for _ in COLUMNS)}, 0) "
+            f"ON CONFLICT (page_id) DO UPDATE SET "
+            f"{', '.join(f'{name} = excluded.{name}' for name in COLUMNS[1:])}, local_pending = 0{keep_local}",
+            rows,
+        )
+        return len(rows)
+
+    # Sync
+
+    def sync(self, full: bool = False) -> int:
+        """Pull pages edited since the last sync (or all of them); returns how many were stored."""
+        with self._sync_lock:
+            full_sync_at = self._meta("full_sync_at")
+            full = full or full_sync_at is None or time.time() - float(full_sync_at) > self.full_sync_interval
+            watermark = None if full else self._meta("watermark")
+            query_filter = None
+            if watermark:
+                since = (_parse_iso(watermark) - SYNC_OVERLAP).isoformat()
+                query_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+
+            started = time.time()
+            newest, seen, stored, batch = watermark, set(), 0, []
+            pages = iter_database_query(self.notion, self.database_id, filter=query_filter,
+                                        sorts=[{"timestamp": "last_edited_time", "direction": "ascending"}])
+            for page in pages:
+                seen.add(page["id"])
+                batch.append(page)
+                edited = page.get("last_edited_time")
+                if edited and (newest is None or edited > newest):
+                    newest = edited
+                if len(batch) >= 100:
+                    stored += self._store(batch)
+                    batch = []
+            stored += self._store(batch)
+
+            with self._lock:
+                if full:
+                    # Pages no longer in the database were deleted in Notion (pending local creates stay)
+                    existing = [row[0] for row in self._db.execute("SELECT page_id FROM tasks WHERE local_pending = 0")]
+                    self._db.executemany("DELETE FROM tasks WHERE page_id = ?",
+                                         [(page_id,) for page_id in existing if page_id not in seen])
+                    self._set_meta_locked("full_sync_at", str(started))
+                if newest:
+                    self._set_meta_locked("watermark", newest)
+                self._set_meta_locked("last_sync_at", str(time.time()))
+            return stored
+
+    def _store(self, pages: List[Dict[str, Any]]) -> int:
+        if not pages:
+            return 0
+        with self._lock:
+            return self._upsert_locked(pages)
+
+    def start(self) -> None:
+        """Poll Notion in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._poll_loop, name="notion-mirror", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _poll_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Notion mirror sync failed: {e}")
+            self._stopping.wait(self.poll_interval)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def _meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta_locked(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+_mirror: Optional[NotionMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def mirror_enabled() -> bool:
+    return (os.getenv("NOTION_MIRROR", "true").lower() in ("1", "true", "yes")
+            and bool(get_database_id()) and bool(os.getenv("NOTION_TOKEN")))
+
+
+def get_notion_mirror() -> Optional[NotionMirror]:
+    """
+    Process-wide mirror of NOTION_DATABASE_ID, or None when disabled. Worker
+    processes share the file; only one of them (slot 0) polls Notion.
+    """
+    global _mirror
+    if not mirror_enabled():
+        return None
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                poll_interval = float(os.getenv("NOTION_MIRROR_POLL_INTERVAL", "30"))
+                _mirror = NotionMirror(
+                    get_notion_client(), get_database_id(),
+                    os.getenv("NOTION_MIRROR_DB") or data_path("notion_mirror.db"),
+                    poll_interval=poll_interval,
+                    full_sync_interval=float(os.getenv("NOTION_MIRROR_FULL_SYNC_INTERVAL", "3600")),
+                    max_staleness=float(os.getenv("NOTION_MIRROR_MAX_STALENESS", str(poll_interval * 4))),
+                )
+                if (worker_slot() or 0) == 0:
+                    _mirror.start()
+    return _mirror
+
+
+def stop_notion_mirror() -> None:
+    global _mirror
+    with _mirror_lock:
+        mirror, _mirror = _mirror, None
+    if mirror is not None:
+        mirror.stop()
+
+
+def record_written(page: Dict[str, Any], local_id: Optional[str] = None, settled: bool = True) -> None:
+    """Write-through for a page Notion returned from one of our creates/updates."""
+    try:
+        mirror = get_notion_mirror()
+        if mirror is not None and page.get("id"):
+            mirror.record_page(page, local_id, settled)
+    except Exception as e:
+        # The write itself succeeded; polling catches the mirror up
+        print(f"Notion mirror write-through failed: {e}")
+
+
+def record_pending(page_id: str, properties: Dict[str, Any], create: bool = False) -> None:
+    """Write-through for a write that was queued or is being sent."""
+    try:
+        mirror = get_notion_mirror()
+        if mirror is not None:
+            mirror.apply_properties(page_id, properties, create)
+    except Exception as e:
+        print(f"Notion mirror write-through failed: {e}")
+
+
+def record_dropped(page_id: str, page: Optional[Dict[str, Any]] = None, provisional: bool = False) -> None:
+    """Write-through for a queued write that was dropped: local changes give way to Notion's copy."""
+    try:
+        mirror = get_notion_mirror()
+        if mirror is not None:
+            mirror.release(page_id, page, provisional)
+    except Exception as e:
+        print(f"Notion mirror write-through failed: {e}")
+
+
+def _mirror_usage() -> Dict[Tuple[str, ...], float]:
+    mirror = _mirror
+    return {(): mirror.count()} if mirror is not None else {}
+
+
+gauge("notion_mirror_tasks", "Task pages in the local Notion mirror", function=_mirror_usage)
@@ -0,0 +1,498 @@
+"""
+Notion write-behind queue - merges task writes per page and flushes them at a controlled rate
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+from notion_client import APIResponseError, Client
+
+from tools.utils.deadline import remaining
+from tools.utils.fast_json import dumps, loads
+from tools.utils.metrics import gauge
+from tools.utils.notion_api import call_notion, get_notion_client, iter_database_query, property_value
+from tools.utils.notion_mirror import record_dropped, record_pending, record_written
+from tools.utils.rate_limit import TokenBucket, get_notion_rate_limiter
+from tools.utils.retry import RETRYABLE_STATUS, CircuitOpenError
+from tools.utils.shared_state import get_shared_state, worker_data_path
+from tools.utils.storage import connect_sqlite
+
+# Provisional IDs handed out for creates that haven't reached Notion yet
+PENDING_PREFIX = "pending-"
+
+# Shared-state namespace mapping provisional IDs to pages, so every worker can resolve them
+ID_MAP_NAMESPACE = "notion_id_map"
+
+
+def is_pending_id(page_id: Optional[str]) -> bool:
+    return bool(page_id) and page_id.startswith(PENDING_PREFIX)
+
+
+class CreatePendingError(Exception):
+    """An update targets a provisional ID whose create (possibly in another worker) hasn't landed yet."""
+
+
+class PendingWrite:
+    """One queued create or (merged) update, mirrored by a journal row."""
+
+    __slots__ = ("row_id", "op", "key", "database_id", "properties", "attempts", "enqueued_at", "maybe_sent",
+                 "not_before")
+
+    def __init__(self, row_id: int, op: str, key: str, database_id: Optional[str],
+                 properties: Dict[str, Any], attempts: int = 0, enqueued_at: Optional[float] = None):
+        self.row_id = row_id
+        self.op = op
+        self.key = key
+        self.database_id = database_id
+        self.properties = properties
+        self.attempts = attempts
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        # An earlier attempt may have reached Notion without us seeing the response
+        self.maybe_sent = False
+        # Monotonic time before which a write backing off after a failure isn't sent
+        self.not_before = 0.0
+
+
+class NotionWriteQueue:
+    """
+    Write-behind queue in front of pages.create / pages.update.
+
+    Callers return immediately. Successive updates to the same page are merged
+    (later values win per property) until a single flusher thread sends them,
+    one token-bucket token per Notion call (retries included). Every queued write is journaled in
+    SQLite first, so writes still pending after a crash are replayed on start.
+    The Notion mirror is updated under the queue's lock, both when a write is
+    queued and when it lands, so the two always agree on which writes are pending.
+    """
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, notion: Client, journal_path: str, rate_limiter: TokenBucket):
+        self.notion = notion
+        self.rate_limiter = rate_limiter
+
+        self._db = connect_sqlite(journal_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending_writes ("
+            "row_id INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, key TEXT NOT NULL, "
+            "database_id TEXT, properties TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "enqueued_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS id_map ("
+            "local_id TEXT PRIMARY KEY, page_id TEXT NOT NULL, url TEXT, created_time TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS failed_writes ("
+            "row_id INTEGER PRIMARY KEY, op TEXT, key TEXT, properties TEXT, error TEXT, failed_at REAL)"
+        )
+
+        # key (page id or provisional id) -> write not yet picked up by the flusher
+        self._pending: "OrderedDict[str, PendingWrite]" = OrderedDict()
+        self._inflight: Optional[PendingWrite] = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._replay_journal()
+
+    def _replay_journal(self) -> None:
+        rows = self._db.execute(
+            "SELECT row_id, op, key, database_id, properties, attempts, enqueued_at FROM pending_writes ORDER BY row_id"
+        ).fetchall()
+        for row_id, op, key, database_id, properties, attempts, enqueued_at in rows:
+            existing = self._pending.get(key)
+            if existing is not None:
+                # The older row was in flight when we stopped; applying both in order
+                # is the same as one merged write
+                existing.properties.update(loads(properties))
+                self._db.execute(
+                    "UPDATE pending_writes SET properties = ? WHERE row_id = ?",
+                    (dumps(existing.properties), existing.row_id),
+                )
+                self._db.execute("DELETE FROM pending_writes WHERE row_id = ?", (row_id,))
+                continue
+            write = PendingWrite(row_id, op, key, database_id, loads(properties), attempts, enqueued_at)
+            # We may have stopped between Notion creating the page and the journal recording it
+            write.maybe_sent = op == "create"
+            self._pending[key] = write
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._flush_loop, name="notion-write-behind", daemon=True)
+                self._thread.start()
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending) + (1 if self._inflight else 0)
+
+    def enqueue_create(self, database_id: str, properties: Dict[str, Any]) -> str:
+        """Queue a page create; returns a provisional ID usable for later updates/gets."""
+        local_id = f"{PENDING_PREFIX}{uuid.uuid4().hex}"
+        with self._cond:
+            record_pending(local_id, properties, create=True)
+            row_id = self._journal_insert("create", local_id, database_id, properties)
+            self._pending[local_id] = PendingWrite(row_id, "create", local_id, database_id, dict(properties))
+            self._cond.notify_all()
+        self.start()
+        return local_id
+
+    def enqueue_update(self, page_id: str, properties: Dict[str, Any]) -> str:
+        """Queue a page update, merging into any write for that page still waiting."""
+        with self._cond:
+            page_id = self._resolve_locked(page_id)
+            record_pending(page_id, properties)
+            existing = self._pending.get(page_id)
+            if existing is not None:
+                existing.properties.update(properties)
+                self._db.execute(
+                    "UPDATE pending_writes SET properties = ? WHERE row_id = ?",
+                    (dumps(existing.properties), existing.row_id),
+                )
+            else:
+                row_id = self._journal_insert("update", page_id, None, properties)
+                self._pending[page_id] = PendingWrite(row_id, "update", page_id, None, dict(properties))
+            self._cond.notify_all()
+        self.start()
+        return page_id
+
+    def resolve(self, page_id: str) -> str:
+        """Map a provisional ID to the real Notion page ID once its create has flushed."""
+        with self._cond:
+            return self._resolve_locked(page_id)
+
+    def lookup_created(self, local_id: str) -> Optional[Dict[str, Any]]:
+        """Notion's response fields for a flushed create, if known (creates by other workers included)."""
+        with self._cond:
+            row = self._db.execute(
+                "SELECT page_id, url, created_time FROM id_map WHERE local_id = ?", (local_id,)
+            ).fetchone()
+        if row is None:
+            shared = get_shared_state().cache_get(ID_MAP_NAMESPACE, local_id)
+            return loads(shared) if shared is not None else None
+        return {"id": row[0], "url": row[1] or "", "created_time": row[2] or ""}
+
+    def wait_for(self, page_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until no queued or in-flight write touches page_id (read-your-writes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._touches(page_id):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until the queue is drained. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flush what we can within the timeout; anything left stays in the journal."""
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _touches(self, page_id: str) -> bool:
+        keys = {page_id, self._resolve_locked(page_id)}
+        if self._inflight is not None and self._inflight.key in keys:
+            return True
+        return any(key in self._pending for key in keys)
+
+    def _resolve_locked(self, page_id: str) -> str:
+        if not is_pending_id(page_id):
+            return page_id
+        row = self._db.execute("SELECT page_id FROM id_map WHERE local_id = ?", (page_id,)).fetchone()
+        if row:
+            return row[0]
+        # Created through another worker
+        shared = get_shared_state().cache_get(ID_MAP_NAMESPACE, page_id)
+        return loads(shared)["id"] if shared is not None else page_id
+
+    def _journal_insert(self, op: str, key: str, database_id: Optional[str], properties: Dict[str, Any]) -> int:
+        cursor = self._db.execute(
+            "INSERT INTO pending_writes (op, key, database_id, properties, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+            (op, key, database_id, dumps(properties), time.time()),
+        )
+        return cursor.lastrowid
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    # Whatever is still queued at shutdown stays journaled for the next start
+                    if self._stopping:
+                        return
+                    write, wait = self._next_due()
+                    if write is not None:
+                        break
+                    self._cond.wait(wait)
+                del self._pending[write.key]
+                self._inflight = write
+
+            try:
+                self._send(write)
+            except Exception as e:
+                self._handle_failure(write, e)
+            finally:
+                with self._cond:
+                    self._inflight = None
+                    self._cond.notify_all()
+
+    def _next_due(self) -> Tuple[Optional[PendingWrite], Optional[float]]:
+        """The oldest write not backing off, else how long until the first one is due."""
+        now = time.monotonic()
+        earliest = None
+        for write in self._pending.values():
+            if write.not_before <= now:
+                return write, None
+            earliest = write.not_before if earliest is None else min(earliest, write.not_before)
+        return None, None if earliest is None else earliest - now
+
+    def _send(self, write: PendingWrite) -> None:
+        if write.op == "create":
+            self._send_create(write)
+            return
+
+        page_id = self.resolve(write.key)
+        if is_pending_id(page_id):
+            with self._cond:
+                dropped = self._db.execute("SELECT 1 FROM failed_writes WHERE op = 'create' AND key = ?",
+                                           (page_id,)).fetchone()
+            if dropped:
+                raise ValueError(f"Create for {page_id} never reached Notion")
+            # Queued by another worker; retried with backoff until it lands
+            raise CreatePendingError(f"Create for {page_id} hasn't reached Notion yet")
+        response = call_notion(self.notion.pages.update, page_id=page_id, properties=write.properties,
+                               rate_limiter=self.rate_limiter)
+        with self._cond:
+            # Settled unless another update to the page was queued meanwhile
+            record_written(response, settled=page_id not in self._pending)
+            self._db.execute("DELETE FROM pending_writes WHERE row_id = ?", (write.row_id,))
+
+    def _send_create(self, write: PendingWrite) -> None:
+        """
+        Create the page unless an earlier attempt already did. Replaying a create
+        must not make a second page, so a create that may have reached Notion
+        (journal replay, or a retry after a transient failure) is first looked up
+        in the ID map and then in the database.
+        """
+        response, recorded = self.lookup_created(write.key), True
+        if response is None and write.maybe_sent:
+            response, recorded = self._find_created(write), False
+        if response is None:
+            response, recorded = call_notion(
+                self.notion.pages.create,
+                parent={"database_id": write.database_id},
+                properties=write.properties,
+                rate_limiter=self.rate_limiter,
+                # A failed attempt is requeued and goes through _find_created first
+                idempotent=False,
+            ), False
+
+        created = {"id": response["id"], "url": response.get("url", ""),
+                   "created_time": response.get("created_time", "")}
+        # Published before the journal row goes; a crash in between is caught by the lookup on replay
+        get_shared_state().cache_set(ID_MAP_NAMESPACE, write.key, dumps(created),
+                                     float(os.getenv("NOTION_ID_MAP_TTL", "604800")))
+        with self._cond:
+            # The mapping and the journal row go together, so a crash can't leave the
+            # create both done and still queued
+            with self._transaction():
+                self._db.execute(
+                    "INSERT OR REPLACE INTO id_map (local_id, page_id, url, created_time) VALUES (?, ?, ?, ?)",
+                    (write.key, response["id"], response.get("url", ""), response.get("created_time", "")),
+                )
+                self._db.execute("DELETE FROM pending_writes WHERE row_id = ?", (write.row_id,))
+            # Updates queued against the provisional ID now target the real page
+            follow_up = self._pending.pop(write.key, None)
+            if follow_up is not None:
+                follow_up.key = response["id"]
+                self._pending[response["id"]] = follow_up
+                self._pending.move_to_end(response["id"], last=False)
+            # Created before a restart, we only know the page's ID: move the mirror row
+            # over to it, and take Notion's copy below
+            record_written(response, local_id=write.key, settled=follow_up is None and not recorded)
+        if recorded and follow_up is None:
+            self._refresh_mirror(response["id"])
+
+    def _find_created(self, write: PendingWrite) -> Optional[Dict[str, Any]]:
+        """
+        A page in the database matching a create whose response we never saw:
+        same title, created no earlier than the minute the write was queued, and
+        not already mapped to another provisional ID.
+        """
+        title = property_value(write.properties.get("Name"))
+        if not title:
+            return None
+        # Notion rounds created_time down to the minute
+        since = datetime.fromtimestamp(write.enqueued_at, timezone.utc) - timedelta(minutes=1)
+        pages = iter_database_query(self.notion, write.database_id, filter={"and": [
+            {"property": "Name", "title": {"equals": title}},
+            {"timestamp": "created_time", "created_time": {"on_or_after": since.isoformat()}},
+        ]}, sorts=[{"timestamp": "created_time", "direction": "ascending"}])
+        with self._cond:
+            mapped = {row[0] for row in self._db.execute("SELECT page_id FROM id_map")}
+        return next((page for page in pages if page["id"] not in mapped), None)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """One SQLite transaction over the journal; callers hold the condition lock."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _handle_failure(self, write: PendingWrite, error: Exception) -> None:
+        with self._cond:
+            stopping = self._stopping
+        if stopping:
+            # Most likely the Notion client was closed under the in-flight write;
+            # it is not a verdict on the write, so leave it journaled for the next start
+            self._requeue(write)
+            return
+
+        # The retry engine already retried this call; re-queue while Notion is
+        # unhealthy instead of dropping the write
+        transient = isinstance(error, (httpx.HTTPError, CircuitOpenError, CreatePendingError)) or (
+            isinstance(error, APIResponseError) and error.status in RETRYABLE_STATUS
+        )
+        write.attempts += 1
+        if write.op == "create" and not isinstance(error, CircuitOpenError):
+            # A timed-out or failed create may still have been carried out by Notion
+            write.maybe_sent = True
+        if transient and write.attempts < self.MAX_ATTEMPTS:
+            # Back off without holding up the flusher: other writes go out meanwhile,
+            # and this one is retried ahead of them once it is due
+            delay = error.retry_after if isinstance(error, CircuitOpenError) else 2 ** write.attempts
+            write.not_before = time.monotonic() + min(30.0, delay)
+            with self._cond:
+                self._db.execute("UPDATE pending_writes SET attempts = ? WHERE row_id = ?", (write.attempts, write.row_id))
+            self._requeue(write)
+            return
+
+        print(f"Dropping Notion {write.op} for {write.key} after {write.attempts} attempt(s): {error}")
+        with self._cond:
+            self._db.execute(
+                "INSERT OR REPLACE INTO failed_writes (row_id, op, key, properties, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (write.row_id, write.op, write.key, dumps(write.properties), str(error), time.time()),
+            )
+            self._db.execute("DELETE FROM pending_writes WHERE row_id = ?", (write.row_id,))
+        # The mirror still shows the write; put it back to what Notion has
+        self._refresh_mirror(write.key if write.op == "create" else self.resolve(write.key))
+
+    def _refresh_mirror(self, page_id: str) -> None:
+        """
+        Replace the mirror's local copy of a page (or provisional page) with
+        Notion's, unless more of our writes to it are queued. If Notion can't be
+        reached the row is just released, so the next full sync corrects it.
+        """
+        page = None
+        if not is_pending_id(page_id):
+            try:
+                page = call_notion(self.notion.pages.retrieve, page_id=page_id, rate_limiter=self.rate_limiter)
+            except Exception as e:
+                print(f"Couldn't refetch Notion page {page_id}: {e}")
+        with self._cond:
+            if page_id not in self._pending:
+                record_dropped(page_id, page, provisional=is_pending_id(page_id))
+
+    def _requeue(self, write: PendingWrite) -> None:
+        """Put a write back at the front, merging in anything queued for its page meanwhile."""
+        with self._cond:
+            merged = self._pending.pop(write.key, None)
+            if merged is not None:
+                write.properties.update(merged.properties)
+                self._db.execute("DELETE FROM pending_writes WHERE row_id = ?", (merged.row_id,))
+                self._db.execute(
+                    "UPDATE pending_writes SET properties = ? WHERE row_id = ?",
+                    (dumps(write.properties), write.row_id),
+                )
+            self._pending[write.key] = write
+            self._pending.move_to_end(write.key, last=False)
+
+
+_write_queue: Optional[NotionWriteQueue] = None
+_write_queue_lock = threading.Lock()
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("NOTION_WRITE_BEHIND", "true").strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_write_queue() -> NotionWriteQueue:
+    """Process-wide Notion write-behind queue (replays its journal when first created)."""
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                # One journal per worker, so each worker replays only its own pending writes
+                journal = os.getenv("NOTION_WRITE_JOURNAL") or worker_data_path("notion_write_journal.db")
+                _write_queue = NotionWriteQueue(get_notion_client(), journal, get_notion_rate_limiter())
+                _write_queue.start()
+    return _write_queue
+
+
+async def resolve_task_id(task_id: Optional[str], timeout: Optional[float] = None) -> Optional[str]:
+    """
+    The Notion page ID behind a task ID that may be provisional, waiting up to
+    `timeout` seconds (default NOTION_WRITE_WAIT, never past the client's
+    deadline) for its create to land in whichever worker queued it. Returns
+    the provisional ID if the create is still pending after that.
+    """
+    if not task_id or not is_pending_id(task_id) or not write_behind_enabled():
+        return task_id
+    queue = get_write_queue()
+    wait = timeout if timeout is not None else float(os.getenv("NOTION_WRITE_WAIT", "30"))
+    left = remaining()
+    if left is not None:
+        wait = min(wait, max(left, 0.0))
+    deadline = time.monotonic() + wait
+    while True:
+        page_id = queue.resolve(task_id)
+        left = deadline - time.monotonic()
+        if not is_pending_id(page_id) or left <= 0:
+            return page_id
+        await asyncio.sleep(min(0.25, left))
+
+
+def _pending_writes() -> Dict[Tuple[str, ...], float]:
+    queue = _write_queue
+    return {(): queue.pending_count} if queue is not None else {}
+
+
+gauge("notion_write_queue_pending", "Notion writes waiting to be flushed", function=_pending_writes)
+
+
+def stop_write_queue(timeout: Optional[float] = None) -> None:
+    """Drain queued writes on shutdown; whatever doesn't make it stays journaled."""
+    global _write_queue
+    with _write_queue_lock:
+        queue, _write_queue = _write_queue, None
+    if queue is not None:
+        queue.stop(timeout if timeout is not None else float(os.getenv("NOTION_WRITE_FLUSH_TIMEOUT", "10")))
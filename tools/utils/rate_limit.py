@@ -0,0 +1,69 @@
+"""
+Rate limiting - token bucket shared by everything that talks to a rate-limited API
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursting up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available. Returns 0 on success, else seconds until they would be."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until tokens are available. Returns False if the timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+_notion_bucket: Optional[TokenBucket] = None
+_notion_bucket_lock = threading.Lock()
+
+
+def get_notion_rate_limiter() -> TokenBucket:
+    """
+    Budget for Notion API calls (Notion allows ~3 req/s per integration). With a
+    shared state backend the bucket is shared by every worker process.
+    """
+    global _notion_bucket
+    if _notion_bucket is None:
+        with _notion_bucket_lock:
+            if _notion_bucket is None:
+                from tools.utils.shared_state import get_shared_state
+                rate = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+                burst = float(os.getenv("NOTION_RATE_BURST", str(rate)))
+                _notion_bucket = get_shared_state().token_bucket("notion", rate, burst)
+    return _notion_bucket
@@ -0,0 +1,242 @@
+"""
+Research cache - content-addressed TTL/LRU cache with an optional SQLite tier and single-flight,
+plus the store behind research handles
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from tools.utils.fast_json import dumps, dumps_bytes, loads
+from tools.utils.shared_state import SQLiteState, get_shared_state
+
+# Payload fields that identify the request but don't change the research result
+IGNORED_KEY_FIELDS = ("task_id",)
+
+# Research results are handed to clients as "research:<content hash>"
+HANDLE_PREFIX = "research:"
+
+
+def _normalize(value: Any) -> Any:
+    """Collapse whitespace and case so trivially different requests share a key."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Stable SHA-256 of the normalized request payload."""
+    normalized = _normalize({k: v for k, v in payload.items() if k not in IGNORED_KEY_FIELDS})
+    return hashlib.sha256(dumps_bytes(normalized, sort_keys=True)).hexdigest()
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one in-flight coroutine."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn once per key; returns (result, shared) where shared means we joined another call."""
+        future = self._inflight.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leading call was cancelled (its client went away); take over
+                future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure doesn't log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._inflight.pop(key, None)
+
+
+class ResearchCache:
+    """
+    Two-tier cache for research results.
+    Memory tier is LRU bounded by total encoded size; the optional second tier
+    is a SQLite file (RESEARCH_CACHE_DB) that survives restarts, or the shared
+    state backend when several workers serve. Entries expire after the TTL.
+    The namespace separates caches sharing a second tier.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        db_path: Optional[str] = None,
+        namespace: str = "research",
+    ):
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESEARCH_CACHE_TTL", "21600"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("RESEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.db_path = db_path if db_path is not None else os.getenv("RESEARCH_CACHE_DB", "")
+        self.namespace = namespace
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+        if self.db_path:
+            self._tier = SQLiteState(self.db_path)
+        else:
+            state = get_shared_state()
+            self._tier = state if state.shared else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, encoded = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return loads(encoded)
+                self._evict(key)
+
+        if self._tier is not None:
+            entry = self._tier.cache_entry(self.namespace, key)
+            if entry is not None:
+                encoded, left = entry
+                # Promote second-tier hits into memory for the time the entry has left
+                with self._lock:
+                    self._store(key, encoded, now + min(left, self.ttl))
+                return loads(encoded)
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        encoded = dumps(value)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, encoded, expires_at)
+        if self._tier is not None:
+            self._tier.cache_set(self.namespace, key, encoded, self.ttl)
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (value, cached). On a miss, concurrent callers for the same key
+        share a single fetch; only successful results are stored.
+        """
+        if not self.enabled:
+            return await fetch(), False
+
+        value = self.get(key)
+        if value is not None:
+            return value, True
+
+        async def fetch_and_store():
+            result = await fetch()
+            self.set(key, result)
+            return result
+
+        value, shared = await self._flight.do(key, fetch_and_store)
+        return value, shared
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self._tier is not None:
+            self._tier.cache_clear(self.namespace)
+
+    def _store(self, key: str, encoded: str, expires_at: float) -> None:
+        self._evict(key)
+        if len(encoded) > self.max_bytes:
+            return
+        self._entries[key] = (expires_at, encoded)
+        self._size += len(encoded)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+_research_cache: Optional[ResearchCache] = None
+_research_cache_lock = threading.Lock()
+
+
+def get_research_cache() -> ResearchCache:
+    """Process-wide research cache."""
+    global _research_cache
+    if _research_cache is None:
+        with _research_cache_lock:
+            if _research_cache is None:
+                _research_cache = ResearchCache()
+    return _research_cache
+
+
+_research_store: Optional[ResearchCache] = None
+
+
+def get_research_store() -> ResearchCache:
+    """Process-wide store of research results by content hash, behind research handles."""
+    global _research_store
+    if _research_store is None:
+        with _research_cache_lock:
+            if _research_store is None:
+                _research_store = ResearchCache(
+                    ttl=float(os.getenv("RESEARCH_STORE_TTL", "86400")),
+                    max_bytes=int(os.getenv("RESEARCH_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    namespace="research_store",
+                )
+    return _research_store
+
+
+def store_research(research_data: Dict[str, Any]) -> str:
+    """Keep a research result server-side and return its handle; identical results share one."""
+    digest = hashlib.sha256(dumps_bytes(research_data, sort_keys=True)).hexdigest()[:32]
+    get_research_store().set(digest, research_data)
+    return HANDLE_PREFIX + digest
+
+
+def load_research(handle: str) -> Optional[Dict[str, Any]]:
+    """The research result behind a handle, or None if it is unknown or has expired."""
+    handle = handle.strip()
+    if not handle.startswith(HANDLE_PREFIX):
+        return None
+    return get_research_store().get(handle[len(HANDLE_PREFIX):])
+
+
+def project_research(research_data: Dict[str, Any], platform: str) -> Dict[str, Any]:
+    """Research cut down to what copy for one platform needs: only that platform's insights."""
+    insights = research_data.get("platform_insights") or {}
+    wanted = platform.casefold()
+    return {
+        **research_data,
+        "platform_insights": {name: value for name, value in insights.items() if name.casefold() == wanted}
+        if isinstance(insights, dict) else insights
+    }
@@ -0,0 +1,354 @@
+"""
+Retry engine - Retry-After aware, jittered exponential backoff with per-host budgets and circuit breakers
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+from tools.utils.deadline import DeadlineExceeded
+
+T = TypeVar("T")
+
+# (retryable, retry_after_seconds, is_failure); is_failure None means the outcome says nothing about the host
+Classification = Tuple[bool, Optional[float], Optional[bool]]
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Transport failures where the request can't have been processed (or was cut off mid-flight);
+# read timeouts are deliberately absent - repeating a 60 s backend run rarely helps
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+# Failures that leave no doubt the request was never sent, so even a call that
+# isn't safe to repeat (a create, a backend run) can be retried
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the host while its circuit breaker is open."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is temporarily unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds (accepts delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of first attempts per host, so retries can't
+    multiply load on a struggling host. Each first attempt deposits `ratio`
+    tokens, each retry withdraws one; `min_tokens` allows retries at low volume.
+    """
+
+    def __init__(self, ratio: float, min_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = min_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open rejects calls for
+    `reset_timeout` seconds; then half-open lets one probe through, which closes
+    the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> Optional[float]:
+        """None if the call may proceed, else seconds until the next probe is allowed."""
+        with self._lock:
+            if self.state == "closed":
+                return None
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining > 0:
+                return remaining
+            now = time.monotonic()
+            # A probe that never reported back (e.g. cancelled) doesn't block forever
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return max(remaining, 1.0)
+            self.state = "half_open"
+            self._probe_started = now
+            return None
+
+    def release(self) -> None:
+        """End a call without a verdict (e.g. cut short by the caller), freeing the half-open probe slot."""
+        with self._lock:
+            self._probe_started = None
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            self._probe_started = None
+            if success:
+                self.state = "closed"
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class RetryStats:
+    """Per-host counters showing how much work and latency retries add."""
+
+    FIELDS = ("calls", "attempts", "retries", "retry_wait_seconds", "budget_exhausted",
+              "circuit_rejections", "gave_up", "failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, float] = {name: 0 for name in self.FIELDS}
+
+    def add(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[name] += amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class HostState:
+    def __init__(self, budget: RetryBudget, breaker: CircuitBreaker):
+        self.budget = budget
+        self.breaker = breaker
+        self.stats = RetryStats()
+
+
+class RetryEngine:
+    """
+    Runs a callable with retries on retryable outcomes.
+
+    `classify` maps an outcome (a result or an exception) to
+    (retryable, retry_after_seconds, is_failure); is_failure None marks a
+    neutral outcome (deadline passed, call cancelled) that neither the circuit
+    breaker nor the retry budget sees. When retries run out, the last
+    result is returned or the last exception re-raised, so callers keep their
+    existing status-code/exception handling.
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        budget_ratio: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ):
+        self.max_attempts = max_attempts or int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+        self.base_delay = base_delay or float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay or float(os.getenv("RETRY_MAX_DELAY", "20"))
+        self.budget_ratio = budget_ratio or float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+        self.failure_threshold = failure_threshold or int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = reset_timeout or float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+        self._hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    def host(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            with self._lock:
+                state = self._hosts.get(host)
+                if state is None:
+                    state = HostState(
+                        RetryBudget(self.budget_ratio),
+                        CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                    )
+                    self._hosts[host] = state
+        return state
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) retry."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def _next_delay(self, state: HostState, attempt: int, outcome: Any,
+                    classify: Callable[[Any], Classification]) -> Optional[float]:
+        """Record the outcome; return how long to wait before retrying, or None to stop."""
+        retryable, retry_after, failure = classify(outcome)
+        if failure is None:
+            state.breaker.release()
+            return None
+        state.breaker.record(not failure)
+        if failure:
+            state.stats.add("failures")
+        if not retryable:
+            return None
+        if attempt >= self.max_attempts or (retry_after is not None and retry_after > self.max_delay):
+            state.stats.add("gave_up")
+            return None
+        if state.breaker.state == "open":
+            state.stats.add("gave_up")
+            return None
+        if not state.budget.withdraw():
+            state.stats.add("budget_exhausted")
+            return None
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        state.stats.add("retries")
+        state.stats.add("retry_wait_seconds", delay)
+        return delay
+
+    def _admit(self, host: str, state: HostState) -> None:
+        wait = state.breaker.before_call()
+        if wait is not None:
+            state.stats.add("circuit_rejections")
+            raise CircuitOpenError(host, wait)
+
+    def call(self, host: str, fn: Callable[[], T],
+             classify: Callable[[Any], Classification]) -> T:
+        state = self.host(host)
+        state.stats.add("calls")
+        state.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit(host, state)
+            state.stats.add("attempts")
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._next_delay(state, attempt, e, classify)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(state, attempt, result, classify)
+                if delay is None:
+                    return result
+            time.sleep(delay)
+
+    async def acall(self, host: str, fn: Callable[[], Awaitable[T]],
+                    classify: Callable[[Any], Classification]) -> T:
+        state = self.host(host)
+        state.stats.add("calls")
+        state.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit(host, state)
+            state.stats.add("attempts")
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                state.breaker.release()
+                raise
+            except Exception as e:
+                delay = self._next_delay(state, attempt, e, classify)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(state, attempt, result, classify)
+                if delay is None:
+                    return result
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Counters and breaker state per host."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            host: dict(state.stats.snapshot(), circuit=state.breaker.state)
+            for host, state in hosts.items()
+        }
+
+
+def classify_http(outcome: Any) -> Classification:
+    """Classifier for httpx responses/exceptions; anything else is neutral."""
+    if isinstance(outcome, httpx.Response):
+        if outcome.status_code in RETRYABLE_STATUS:
+            return True, parse_retry_after(outcome.headers.get("Retry-After")), True
+        return False, None, False
+    if isinstance(outcome, RETRYABLE_ERRORS):
+        return True, None, True
+    if isinstance(outcome, httpx.TransportError):
+        return False, None, True
+    if isinstance(outcome, (DeadlineExceeded, asyncio.CancelledError)):
+        # Cut short by the caller, not by the host
+        return False, None, None
+    # Local errors (e.g. a closed client) say nothing about the host either
+    return False, None, None
+
+
+def _not_processed(outcome: Any) -> bool:
+    """Whether the host certainly didn't act on the request: 429, 503 with Retry-After, or no connection made."""
+    if isinstance(outcome, UNSENT_ERRORS):
+        return True
+    # httpx responses carry status_code, notion_client's APIResponseError carries status
+    status = outcome.status_code if isinstance(outcome, httpx.Response) else getattr(outcome, "status", None)
+    if status == 429:
+        return True
+    headers = getattr(outcome, "headers", None) or {}
+    return status == 503 and headers.get("retry-after") is not None
+
+
+def non_idempotent(classify: Callable[[Any], Classification]) -> Callable[[Any], Classification]:
+    """
+    The classifier narrowed for calls that aren't safe to repeat. A 500/502/504
+    or a dropped connection may come after the host already acted (e.g. made
+    the page), so only outcomes where it certainly didn't are retried. Failures
+    still count against the circuit breaker as usual.
+    """
+    def classify_once(outcome: Any) -> Classification:
+        retryable, retry_after, failure = classify(outcome)
+        return retryable and _not_processed(outcome), retry_after, failure
+
+    return classify_once
+
+
+_retry_engine: Optional[RetryEngine] = None
+_retry_engine_lock = threading.Lock()
+
+
+def get_retry_engine() -> RetryEngine:
+    """Process-wide retry engine shared by the backend proxies and Notion calls."""
+    global _retry_engine
+    if _retry_engine is None:
+        with _retry_engine_lock:
+            if _retry_engine is None:
+                _retry_engine = RetryEngine()
+    return _retry_engine
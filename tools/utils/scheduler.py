@@ -0,0 +1,377 @@
+"""
+Scheduler - persist batches of commands in a local queue and run them at their scheduled times,
+paced so the backend and Notion see an even load instead of bursts
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tools.utils.command_parser import format_time
+from tools.utils.fast_json import dumps, loads
+from tools.utils.metrics import gauge, histogram
+from tools.utils.shared_state import get_shared_state, worker_slot
+from tools.utils.storage import connect_sqlite, data_path
+from tools.utils.tracing import get_tracer
+
+# Command (e.g. "/create-content-post") -> coroutine running one scheduled command, given
+# the command text and the options stored with it; returns the tool's JSON response
+CommandHandler = Callable[[str, Dict[str, Any]], Awaitable[str]]
+
+STATES = ("scheduled", "running", "succeeded", "failed", "cancelled")
+
+_handlers: Dict[str, CommandHandler] = {}
+
+
+def register_command_handler(command: str, handler: CommandHandler) -> None:
+    """Register how scheduled commands starting with `command` are run."""
+    _handlers[command] = handler
+
+
+def _handler_for(text: str) -> Optional[CommandHandler]:
+    stripped = text.lstrip()
+    for command, handler in _handlers.items():
+        if stripped.startswith(command):
+            return handler
+    return None
+
+
+class ScheduleStore:
+    """
+    SQLite-backed queue of scheduled commands, shared by the worker processes.
+    A worker claims a due item by flipping it to running in one UPDATE, so each
+    item runs once; items a worker was running when it stopped are re-queued by
+    that worker slot on its next start.
+    """
+
+    COLUMNS = ("item_id", "batch_id", "command", "options", "run_at", "status", "task_id", "result", "error",
+               "created_at", "started_at", "finished_at", "owner")
+
+    def __init__(self, path: str, owner: int = 0):
+        self.owner = owner
+        self._db = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scheduled_commands ("
+            "item_id TEXT PRIMARY KEY, batch_id TEXT NOT NULL, command TEXT NOT NULL, options TEXT NOT NULL, "
+            "run_at REAL NOT NULL, status TEXT NOT NULL, task_id TEXT, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS scheduled_due ON scheduled_commands (status, run_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scheduled_batch ON scheduled_commands (batch_id)")
+
+    def add_batch(self, items: List[Tuple[str, float]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Queue (command, run_at) pairs as one batch; returns the item records."""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        records = [{
+            "item_id": uuid.uuid4().hex, "batch_id": batch_id, "command": command, "options": options,
+            "run_at": run_at, "status": "scheduled", "task_id": None, "result": None, "error": None,
+            "created_at": now, "started_at": None, "finished_at": None, "owner": None,
+        } for command, run_at in items]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO scheduled_commands (item_id, batch_id, command, options, run_at, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'scheduled', ?)",
+                [(r["item_id"], batch_id, r["command"], dumps(options), r["run_at"], now) for r in records],
+            )
+        return records
+
+    def claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to `limit` due items as running for this worker, earliest first."""
+        claimed = []
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT item_id FROM scheduled_commands WHERE status = 'scheduled' AND run_at <= ? "
+                "ORDER BY run_at LIMIT ?", (now, limit),
+            ).fetchall()
+            for (item_id,) in rows:
+                cursor = self._db.execute(
+                    "UPDATE scheduled_commands SET status = 'running', started_at = ?, owner = ? "
+                    "WHERE item_id = ? AND status = 'scheduled'", (now, self.owner, item_id),
+                )
+                # Another worker may have claimed it between the SELECT and the UPDATE
+                if cursor.rowcount:
+                    claimed.append(item_id)
+        return [self.get(item_id) for item_id in claimed]
+
+    def next_run_at(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(run_at) FROM scheduled_commands WHERE status = 'scheduled'"
+            ).fetchone()
+        return row[0]
+
+    def update(self, item_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE scheduled_commands SET {assignments} WHERE item_id = ?",
+                             (*fields.values(), item_id))
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM scheduled_commands WHERE item_id = ?", (item_id,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def list(self, batch_id: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        clauses, args = [], []
+        if batch_id:
+            clauses.append("batch_id = ?")
+            args.append(batch_id)
+        if status:
+            clauses.append("status = ?")
+            args.append(status)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM scheduled_commands {where}ORDER BY run_at LIMIT ?",
+                (*args, limit),
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def cancel(self, item_ids: Optional[List[str]] = None, batch_id: Optional[str] = None) -> int:
+        """Cancel items that haven't started yet; returns how many were cancelled."""
+        clause, args = ("batch_id = ?", [batch_id]) if batch_id else (
+            f"item_id IN ({', '.join('?' for _ in item_ids or [])})", list(item_ids or []))
+        if not args:
+            return 0
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE scheduled_commands SET status = 'cancelled', finished_at = ? "
+                f"WHERE status = 'scheduled' AND {clause}", (time.time(), *args),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM scheduled_commands GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def requeue_interrupted(self) -> int:
+        """Put items this worker slot was running when it stopped back in the queue."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE scheduled_commands SET status = 'scheduled', started_at = NULL, owner = NULL "
+                "WHERE status = 'running' AND owner = ?", (self.owner,),
+            )
+        return cursor.rowcount
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM scheduled_commands WHERE status IN ('succeeded', 'failed', 'cancelled') "
+                "AND finished_at < ?", (time.time() - older_than,),
+            )
+
+    def _record(self, row: tuple) -> Dict[str, Any]:
+        record = dict(zip(self.COLUMNS, row))
+        record["options"] = loads(record["options"])
+        return record
+
+
+START_DELAY = histogram("scheduler_start_delay_seconds", "How late scheduled commands started after their run time",
+                        buckets=(1, 5, 15, 30, 60, 300, 900, 3600))
+
+
+class Scheduler:
+    """
+    Dispatch loop on the server's event loop. Due items start one at a time,
+    at least `min_interval` seconds apart (a token bucket shared by every
+    worker process), with at most `max_concurrency` running in this process.
+    Dispatch also holds off while Notion writes are backed up or an upstream
+    circuit is open, so a burst of due items drains at a steady pace.
+    """
+
+    def __init__(self, store: ScheduleStore, max_concurrency: int, min_interval: float,
+                 poll_interval: float, max_notion_backlog: int, retention: float):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.poll_interval = poll_interval
+        self.max_notion_backlog = max_notion_backlog
+        self.retention = retention
+
+        self._pacer = get_shared_state().token_bucket("scheduler", 1.0 / min_interval, 1.0) \
+            if min_interval > 0 else None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def schedule(self, items: List[Tuple[str, float]], options: Optional[Dict[str, Any]] = None
+                 ) -> List[Dict[str, Any]]:
+        """Queue a batch of (command, run_at) pairs; returns the item records."""
+        for command, _ in items:
+            if _handler_for(command) is None:
+                raise ValueError(f"No handler for scheduled command: {command[:60]}")
+        records = self.store.add_batch(items, options or {})
+        # Sync tools call this from a worker thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return records
+
+    def start(self) -> int:
+        """Start dispatching; returns how many interrupted items were re-queued."""
+        self.store.purge(self.retention)
+        requeued = self.store.requeue_interrupted()
+        if self._loop_task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._loop_task = self._loop.create_task(self._dispatch_loop(), context=contextvars.Context())
+        return requeued
+
+    async def stop(self) -> None:
+        """Stop dispatching and cancel running items; they are re-queued on next start."""
+        tasks = [task for task in (self._loop_task, *self._running.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = self._loop = None
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            try:
+                started = await self._dispatch_one() if self.active < self.max_concurrency else False
+            except Exception as e:
+                print(f"Scheduler dispatch failed: {e}")
+                started = False
+            if not started:
+                await self._sleep(self._idle_wait())
+
+    async def _dispatch_one(self) -> bool:
+        """Start the next due item if the load allows; returns whether one started."""
+        if self._held_back():
+            return False
+        next_at = self.store.next_run_at()
+        if next_at is None or next_at > time.time():
+            return False
+        if self._pacer is not None:
+            wait = self._pacer.try_acquire()
+            if wait:
+                await self._sleep(wait)
+                return True
+        claimed = self.store.claim_due(1)
+        if not claimed:
+            return False
+        item = claimed[0]
+        START_DELAY.observe(max(item["started_at"] - item["run_at"], 0.0))
+        self._running[item["item_id"]] = asyncio.get_running_loop().create_task(
+            self._run(item), context=contextvars.Context())
+        return True
+
+    def _held_back(self) -> bool:
+        from tools.utils import notion_writer
+        from tools.utils.retry import get_retry_engine
+        queue = notion_writer._write_queue
+        if queue is not None and queue.pending_count > self.max_notion_backlog:
+            return True
+        return any(host["circuit"] == "open" for host in get_retry_engine().snapshot().values())
+
+    def _idle_wait(self) -> float:
+        next_at = self.store.next_run_at()
+        if next_at is None:
+            return self.poll_interval
+        return min(max(next_at - time.time(), 0.05), self.poll_interval)
+
+    async def _sleep(self, seconds: float) -> None:
+        """Sleep, waking early when a batch is scheduled or a running item finishes."""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self, item: Dict[str, Any]) -> None:
+        item_id = item["item_id"]
+        try:
+            with get_tracer().span("scheduled command", attributes={
+                "schedule.item_id": item_id, "schedule.batch_id": item["batch_id"],
+            }) as span:
+                try:
+                    handler = _handler_for(item["command"])
+                    if handler is None:
+                        raise ValueError("No handler registered for this command")
+                    result = await handler(item["command"], item["options"])
+                    payload = loads(result)
+                    succeeded = payload.get("status") == "success"
+                    fields = {"result": result, "task_id": payload.get("task_id"),
+                              "error": None if succeeded else payload.get("error") or "Command failed"}
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    succeeded, fields = False, {"result": None, "error": str(e)}
+                    span.record_exception(e)
+                status = "succeeded" if succeeded else "failed"
+                span.set_attribute("schedule.status", status)
+                span.set_attribute("task_id", fields.get("task_id"))
+                self.store.update(item_id, status=status, finished_at=time.time(), **fields)
+        finally:
+            self._running.pop(item_id, None)
+            if self._wake is not None:
+                self._wake.set()
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Process-wide scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler(
+                    ScheduleStore(os.getenv("SCHEDULER_DB") or data_path("schedule.db"), owner=worker_slot() or 0),
+                    max_concurrency=int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "2")),
+                    min_interval=float(os.getenv("SCHEDULER_MIN_INTERVAL", "10")),
+                    poll_interval=float(os.getenv("SCHEDULER_POLL_INTERVAL", "5")),
+                    max_notion_backlog=int(os.getenv("SCHEDULER_MAX_NOTION_BACKLOG", "20")),
+                    retention=float(os.getenv("SCHEDULER_RETENTION", "604800")),
+                )
+    return _scheduler
+
+
+def _schedule_usage() -> Dict[Tuple[str, ...], float]:
+    scheduler = _scheduler
+    if scheduler is None:
+        return {}
+    counts = scheduler.store.counts()
+    return {(state,): counts.get(state, 0) for state in STATES}
+
+
+gauge("scheduled_commands", "Scheduled commands in the shared queue", ("state",), function=_schedule_usage)
+
+
+def item_view(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Scheduled item as returned to MCP clients."""
+    view = {
+        "item_id": item["item_id"],
+        "batch_id": item["batch_id"],
+        "command": item["command"],
+        "run_at": format_time(datetime.fromtimestamp(item["run_at"], timezone.utc)),
+        "schedule_status": item["status"],
+        "task_id": item.get("task_id"),
+        "started_at": item.get("started_at"),
+        "finished_at": item.get("finished_at"),
+    }
+    if item.get("result"):
+        view["result"] = loads(item["result"])
+    if item.get("error"):
+        view["error"] = item["error"]
+    return view
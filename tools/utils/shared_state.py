@@ -0,0 +1,265 @@
+"""
+Shared state - rate-limit buckets and cache tiers that several server processes can share
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from tools.utils.rate_limit import TokenBucket
+from tools.utils.storage import connect_sqlite, data_path
+
+
+def worker_count() -> int:
+    return max(1, int(os.getenv("MCP_WORKERS", "1")))
+
+
+_worker_slot: Optional[int] = None
+_worker_slot_lock = threading.Lock()
+_slot_file = None
+
+
+def worker_slot() -> Optional[int]:
+    """
+    This process's worker number when serving with several workers, else None.
+    Slots are claimed with a lock file held for the process lifetime, so a
+    restarted worker takes over the slot (and the journals) of the one it replaces.
+    """
+    global _worker_slot, _slot_file
+    if worker_count() == 1:
+        return None
+    if _worker_slot is None:
+        with _worker_slot_lock:
+            if _worker_slot is None:
+                import fcntl
+                slot = 0
+                while True:
+                    handle = open(data_path(f"worker-{slot}.lock"), "w")
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        handle.close()
+                        slot += 1
+                        continue
+                    _slot_file, _worker_slot = handle, slot
+                    break
+    return _worker_slot
+
+
+def worker_data_path(filename: str) -> str:
+    """data_path for state owned by one worker (journals); slot 0 keeps the plain name."""
+    slot = worker_slot()
+    if not slot:
+        return data_path(filename)
+    stem, ext = os.path.splitext(filename)
+    return data_path(f"{stem}-{slot}{ext}")
+
+
+class LocalState:
+    """Single process: buckets live in memory and there is no shared cache tier."""
+
+    shared = False
+
+    def token_bucket(self, name: str, rate: float, capacity: float) -> TokenBucket:
+        return TokenBucket(rate, capacity)
+
+    def cache_get(self, namespace: str, key: str) -> Optional[str]:
+        return None
+
+    def cache_entry(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        return None
+
+    def cache_set(self, namespace: str, key: str, value: str, ttl: float) -> None:
+        pass
+
+    def cache_clear(self, namespace: str) -> None:
+        pass
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """Token bucket whose level is kept in SQLite, shared by every process using the file."""
+
+    def __init__(self, state: "SQLiteState", name: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.state = state
+        self.name = name
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        with self.state.transaction() as db:
+            now = time.time()
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            level, updated = row if row else (self.capacity, now)
+            level = min(self.capacity, level + max(0.0, now - updated) * self.rate)
+            wait = 0.0
+            if level >= tokens:
+                level -= tokens
+            else:
+                wait = (tokens - level) / self.rate
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, level, now),
+            )
+        return wait
+
+
+class SQLiteState:
+    """State shared by the processes of one host through a SQLite file (put it on tmpfs for shared memory speed)."""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self._db = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self._lock:
+            # Take the write lock up front so concurrent read-modify-writes serialize
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def token_bucket(self, name: str, rate: float, capacity: float) -> TokenBucket:
+        return SQLiteTokenBucket(self, name, rate, capacity)
+
+    def cache_get(self, namespace: str, key: str) -> Optional[str]:
+        entry = self.cache_entry(namespace, key)
+        return entry[0] if entry is not None else None
+
+    def cache_entry(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        """(value, seconds until it expires) for a live entry."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row and row[1] > time.time():
+            return row[0], row[1] - time.time()
+        return None
+
+    def cache_set(self, namespace: str, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, time.time() + ttl),
+            )
+
+    def cache_clear(self, namespace: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+
+# Refill and take atomically on the Redis server, using its clock so hosts with skewed clocks agree
+_REDIS_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local level = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+level = math.min(capacity, level + math.max(0, now - updated) * rate)
+local wait = 0
+if level >= tokens then
+    level = level - tokens
+else
+    wait = (tokens - level) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(level), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket kept in Redis, shared by every process and host using the server."""
+
+    def __init__(self, state: "RedisState", name: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.key = f"{state.prefix}bucket:{name}"
+        self._script = state.redis.register_script(_REDIS_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        return float(self._script(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+
+
+class RedisState:
+    """State shared through a Redis-compatible server (requires the `redis` package)."""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the 'redis' package is not installed") from e
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def token_bucket(self, name: str, rate: float, capacity: float) -> TokenBucket:
+        return RedisTokenBucket(self, name, rate, capacity)
+
+    def cache_get(self, namespace: str, key: str) -> Optional[str]:
+        value = self.redis.get(f"{self.prefix}{namespace}:{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    def cache_entry(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        """(value, seconds until it expires) for a live entry, read together from the server."""
+        pipe = self.redis.pipeline()
+        pipe.get(f"{self.prefix}{namespace}:{key}")
+        pipe.pttl(f"{self.prefix}{namespace}:{key}")
+        value, ttl_ms = pipe.execute()
+        # PTTL is -2 once the key is gone; entries are always set with an expiry
+        if value is None or ttl_ms == -2:
+            return None
+        return value.decode("utf-8"), ttl_ms / 1000 if ttl_ms >= 0 else float("inf")
+
+    def cache_set(self, namespace: str, key: str, value: str, ttl: float) -> None:
+        self.redis.set(f"{self.prefix}{namespace}:{key}", value, px=max(1, int(ttl * 1000)))
+
+    def cache_clear(self, namespace: str) -> None:
+        keys = list(self.redis.scan_iter(match=f"{self.prefix}{namespace}:*"))
+        if keys:
+            self.redis.delete(*keys)
+
+
+def open_state(url: str):
+    """Backend for a SHARED_STATE_URL: 'local', 'sqlite', 'sqlite:///path' or 'redis://...'."""
+    if url in ("", "local"):
+        return LocalState()
+    if url == "sqlite":
+        return SQLiteState(data_path("shared_state.db"))
+    if url.startswith("sqlite:///"):
+        return SQLiteState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url, os.getenv("SHARED_STATE_PREFIX", "mcp:"))
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """Process-wide shared state backend; SQLite by default when serving with several workers."""
+    global _shared_state
+    if _shared_state is None:
+        with _shared_state_lock:
+            if _shared_state is None:
+                default = "sqlite" if worker_count() > 1 else "local"
+                _shared_state = open_state(os.getenv("SHARED_STATE_URL", default).strip())
+    return _shared_state
@@ -0,0 +1,23 @@
+"""
+Local storage helpers - where server-side state (journals, queues, stores) lives on disk
+"""
+
+import os
+import sqlite3
+
+
+def data_path(filename: str) -> str:
+    """Path under MCP_DATA_DIR (default ./.mcp_data), creating the directory if needed."""
+    data_dir = os.getenv("MCP_DATA_DIR", os.path.join(os.getcwd(), ".mcp_data"))
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """SQLite connection usable from several threads (callers serialize with their own lock)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,251 @@
+"""
+Tracing - OpenTelemetry-style spans with W3C trace context, exported in process or to a JSONL file
+"""
+
+import contextlib
+import contextvars
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from tools.utils.fast_json import dumps
+from tools.utils.storage import data_path
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """trace_id/span_id of a W3C traceparent header, or None if it is missing or malformed."""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "ff" or set(match.group(2)) == {"0"} or set(match.group(3)) == {"0"}:
+        return None
+    return {"trace_id": match.group(2), "span_id": match.group(3)}
+
+
+class Span:
+    """One timed operation; finished spans are handed to the tracer's exporter."""
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = "UNSET"
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        for key, value in (attributes or {}).items():
+            self.set_attribute(key, value)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value if isinstance(value, (str, bool, int, float)) else str(value)
+
+    def set_status(self, status: str, message: str = "") -> None:
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, error: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "time_unix_nano": time.time_ns(),
+            "attributes": {"exception.type": type(error).__name__, "exception.message": str(error)},
+        })
+        self.set_status("ERROR", f"{type(error).__name__}: {error}")
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+            "resource": {"service.name": self.tracer.service_name},
+        }
+
+
+class NonRecordingSpan:
+    """Stand-in returned while tracing is off; every operation is a no-op."""
+
+    recording = False
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_status(self, status: str, message: str = "") -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NON_RECORDING_SPAN = NonRecordingSpan()
+
+
+class MemoryExporter:
+    """Keeps the most recent finished spans in process (served by the server's /traces route)."""
+
+    def __init__(self, max_spans: int):
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = list(self._spans)
+        return [span for span in spans if trace_id is None or span["trace_id"] == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans as JSON lines; worker processes can share one file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        line = dumps(span) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(line)
+
+
+class Tracer:
+    """
+    Creates spans parented on the span active in the current context (or on
+    a remote traceparent), and hands finished ones to the exporter. Without
+    an exporter every span is a NonRecordingSpan.
+    """
+
+    def __init__(self, exporter: Any = None, service_name: str = "social-media-mcp"):
+        self.exporter = exporter
+        self.service_name = service_name
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None) -> Any:
+        """Start a span without making it current; the caller ends it."""
+        if not self.enabled:
+            return NON_RECORDING_SPAN
+        remote = parse_traceparent(traceparent)
+        parent = _current_span.get()
+        if remote is not None:
+            trace_id, parent_id = remote["trace_id"], remote["span_id"]
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        return Span(self, name, kind, trace_id, parent_id, attributes)
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+             traceparent: Optional[str] = None) -> Iterator[Any]:
+        """Run the block inside a new current span; an escaping exception marks it as failed."""
+        span = self.start_span(name, kind, attributes, traceparent)
+        if not span.recording:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def export(self, span: Span) -> None:
+        try:
+            self.exporter.export(span.to_dict())
+        except Exception as e:
+            print(f"Span export failed: {e}")
+
+
+def current_span() -> Any:
+    """The span active in this context, or a NonRecordingSpan."""
+    return _current_span.get() or NON_RECORDING_SPAN
+
+
+def open_exporter(name: str) -> Any:
+    """Exporter for a TRACING_EXPORTER value: 'none', 'memory' or 'file'."""
+    if name in ("", "none"):
+        return None
+    if name == "memory":
+        return MemoryExporter(int(os.getenv("TRACING_MEMORY_SPANS", "2000")))
+    if name == "file":
+        return FileExporter(os.getenv("TRACING_FILE") or data_path("traces.jsonl"))
+    raise ValueError(f"Unsupported TRACING_EXPORTER: {name}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from TRACING_EXPORTER (off by default)."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(
+                    open_exporter(os.getenv("TRACING_EXPORTER", "none").strip().lower()),
+                    os.getenv("OTEL_SERVICE_NAME", "social-media-mcp"),
+                )
+    return _tracer
+
+
+def tool_span(tool_name: str, arguments: Optional[Dict[str, Any]] = None,
+              traceparent: Optional[str] = None) -> contextlib.AbstractContextManager:
+    """Span around one tool run, tagged with the Notion task it works on."""
+    arguments = arguments or {}
+    return get_tracer().span(f"{tool_name}.run", attributes={
+        "tool.name": tool_name,
+        "task_id": arguments.get("task_id"),
+        "notion.action": arguments.get("action"),
+    }, traceparent=traceparent)